@@ -1,21 +1,93 @@
+import asyncio
+import concurrent.futures
+import copy
+import io
+import itertools
 import json
 import os
 import re
 import queue
 import platform
+import random
 import shutil
 import sys
 import threading
 import time
 import signal
-from typing import Any, Dict, List, Optional, Union, Tuple, Pattern
+import sqlite3
+from collections import OrderedDict, deque
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Union,
+    Tuple,
+    Pattern,
+)
 from datetime import datetime, timezone, timedelta
 
-import jmcomic
+# jmcomic 与 PIL 导入较慢，按需加载（见 _load_jmcomic），不在模块加载时导入
+_import_started = time.perf_counter()
 import websocket
 from dotenv import load_dotenv
 from loguru import logger as loguru_logger  # type: ignore[import]
 
+# 模块加载时导入第三方库的耗时（秒），启动日志中报告
+_EAGER_IMPORT_SECONDS: float = time.perf_counter() - _import_started
+
+
+def _backoff_delay(attempt: int, base: float = 1.0, maximum: float = 60.0) -> float:
+    """
+    带随机抖动的指数退避时间
+
+    Args:
+        attempt: 已连续失败的次数（从0开始）
+        base: 首次等待时间（秒）
+        maximum: 最长等待时间（秒）
+
+    Returns:
+        float: 本次应等待的秒数，在 [0.5, 1] × min(maximum, base × 2^attempt) 之间
+    """
+    delay = min(maximum, base * (2 ** min(attempt, 16)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+# 运行所需的第三方模块 {模块名: pip包名}，启动时检查是否已安装
+REQUIRED_MODULES: Dict[str, str] = {
+    "jmcomic": "jmcomic",
+    "PIL": "Pillow",
+    "websocket": "websocket-client",
+    "dotenv": "python-dotenv",
+    "loguru": "loguru",
+}
+
+_jmcomic_module: Any = None
+_jmcomic_lock = threading.Lock()
+
+
+def _load_jmcomic() -> Any:
+    """
+    按需导入jmcomic（首次调用时导入，之后直接返回已导入的模块）
+    启动后会在后台预热，下载任务一般不需要等待导入
+    """
+    global _jmcomic_module
+    if _jmcomic_module is None:
+        with _jmcomic_lock:
+            if _jmcomic_module is None:
+                import jmcomic
+
+                _jmcomic_module = jmcomic
+    return _jmcomic_module
+
+
+# 以数字漫画ID开头的文件或文件夹名
+_MANGA_ID_PREFIX: Pattern[str] = re.compile(r"^(\d+)")
+
 
 class CommandParser:
     """
@@ -36,6 +108,8 @@ class CommandParser:
             "progress": ["下载进度", "漫画进度", "进度"],
             "test_id": ["测试id"],
             "test_file": ["测试文件"],
+            "weight": ["队列权重", "群权重"],
+            "status": ["运行状态"],
         }
 
         # 参数验证规则
@@ -43,6 +117,7 @@ class CommandParser:
             "download": re.compile(r"^\d+$"),  # 下载命令需要纯数字ID
             "send": re.compile(r"^\d+$"),  # 发送命令需要纯数字ID
             "query": re.compile(r"^\d+$"),  # 查询命令需要纯数字ID
+            "weight": re.compile(r"^\d+\s+\d+$"),  # 群号与权重
         }
 
     def parse(self, message: str) -> Tuple[str, str]:
@@ -123,6 +198,7 @@ class CommandParser:
             "progress",
             "test_id",
             "test_file",
+            "status",
             "unknown",
         ]
 
@@ -166,15 +242,2278 @@ class CommandParser:
             "progress": "❌ 命令格式错误！'下载进度'命令不需要额外参数\n直接输入：下载进度",
             "test_id": "❌ 命令格式错误！'测试id'命令不需要额外参数\n直接输入：测试id",
             "test_file": "❌ 命令格式错误！'测试文件'命令不需要额外参数\n直接输入：测试文件",
+            "weight": "❌ 参数错误！请提供群号与权重（正整数）\n例如：队列权重 123456 3",
+            "status": "❌ 命令格式错误！'运行状态'命令不需要额外参数\n直接输入：运行状态",
             "unknown": "❓ 未知命令，请输入'漫画帮助'查看所有可用命令",
         }
 
         return error_messages.get(command, "❌ 命令格式错误，请检查输入")
 
 
+# 漫画图片文件的扩展名
+IMAGE_EXTENSIONS: Tuple[str, ...] = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+
+
+def _get_process_rss() -> Optional[int]:
+    """
+    获取当前进程的常驻内存（RSS），单位字节
+
+    优先使用psutil（可选依赖），不可用时在Linux上回退到/proc/self/statm
+
+    Returns:
+        Optional[int]: 当前RSS字节数，无法获取时返回None
+    """
+    try:
+        import psutil  # type: ignore[import]
+
+        return int(psutil.Process().memory_info().rss)
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _read_jpeg_info(jpeg_data: bytes) -> Optional[Tuple[int, int, int]]:
+    """
+    解析JPEG帧头（SOF标记），判断能否不经解码直接作为DCTDecode图像嵌入PDF
+
+    只接受8位精度、1或3通道的Huffman编码JPEG（基线、扩展、渐进式），
+    CMYK/YCCK（4通道）、算术编码与无损JPEG需要回退到解码路径
+
+    Args:
+        jpeg_data: 完整的JPEG字节流
+
+    Returns:
+        Optional[Tuple[int, int, int]]: (宽度, 高度, 通道数)，不可直接嵌入时返回None
+    """
+    if not jpeg_data.startswith(b"\xff\xd8"):
+        return None
+
+    position = 2
+    data_length = len(jpeg_data)
+    while position + 4 <= data_length:
+        if jpeg_data[position] != 0xFF:
+            return None
+        marker = jpeg_data[position + 1]
+        # 填充字节与无长度的标记直接跳过
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            position += 2
+            continue
+
+        segment_length = int.from_bytes(jpeg_data[position + 2 : position + 4], "big")
+        if marker in (0xC0, 0xC1, 0xC2):
+            if position + 10 > data_length:
+                return None
+            precision = jpeg_data[position + 4]
+            height = int.from_bytes(jpeg_data[position + 5 : position + 7], "big")
+            width = int.from_bytes(jpeg_data[position + 7 : position + 9], "big")
+            components = jpeg_data[position + 9]
+            if precision != 8 or components not in (1, 3) or not width or not height:
+                return None
+            return width, height, components
+        # 其余SOF标记（无损、算术编码等）不支持直接嵌入
+        if 0xC3 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return None
+        # 到达扫描数据仍未找到帧头，视为无效文件
+        if marker == 0xDA:
+            return None
+        position += 2 + segment_length
+
+    return None
+
+
+def _prepare_pdf_page(
+    img_path: str, quality: int, passthrough: bool = True, max_width: int = 0
+) -> Tuple[bytes, int, int, str, bool]:
+    """
+    将单张图片准备为可写入PDF的JPEG数据
+
+    兼容的JPEG文件直接原样嵌入，跳过解码与重新编码；
+    PNG、WebP、GIF、特殊颜色模式或需要缩放的图片才用Pillow解码并编码为JPEG
+    该函数定义在模块级别，以便在进程池中执行
+
+    Args:
+        img_path: 图片路径
+        quality: 需要重新编码时使用的JPEG质量
+        passthrough: 是否允许JPEG直通嵌入
+        max_width: 页面最大宽度（像素），超过时等比缩小，0表示不限制
+
+    Returns:
+        Tuple[bytes, int, int, str, bool]: (JPEG数据, 宽度, 高度, 颜色空间, 是否直通)
+    """
+    if passthrough and img_path.lower().endswith((".jpg", ".jpeg")):
+        with open(img_path, "rb") as f:
+            jpeg_data = f.read()
+        jpeg_info = _read_jpeg_info(jpeg_data)
+        if jpeg_info is not None and (not max_width or jpeg_info[0] <= max_width):
+            width, height, components = jpeg_info
+            color_space = "DeviceGray" if components == 1 else "DeviceRGB"
+            return jpeg_data, width, height, color_space, True
+        del jpeg_data
+
+    from PIL import Image
+
+    with Image.open(img_path) as img:
+        # PDF中只使用灰度或RGB，其余模式（RGBA、P、CMYK等）统一转换为RGB
+        page = img if img.mode in ("RGB", "L") else img.convert("RGB")
+        if max_width and page.width > max_width:
+            new_height = max(1, round(page.height * max_width / page.width))
+            page = page.resize((max_width, new_height), Image.LANCZOS)
+        buffer = io.BytesIO()
+        page.save(buffer, format="JPEG", quality=quality)
+        color_space = "DeviceGray" if page.mode == "L" else "DeviceRGB"
+        return buffer.getvalue(), page.width, page.height, color_space, False
+
+
+class StreamingPdfWriter:
+    """
+    流式PDF写入器，逐页写入图片并立即释放
+    页面对象写入后只保留其字节偏移量，峰值内存只与单页大小有关，与漫画页数无关
+    先写入临时文件，全部页面完成后再原子替换为目标PDF，中途失败不会留下残缺PDF
+    """
+
+    # 对象1固定为Catalog，对象2固定为Pages，页面对象从3开始分配
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, pdf_path: str) -> None:
+        """
+        初始化写入器并写入PDF文件头
+
+        Args:
+            pdf_path: 目标PDF文件路径
+        """
+        self.pdf_path: str = pdf_path
+        self.temp_path: str = f"{pdf_path}.tmp"
+        self._file = open(self.temp_path, "wb")
+        self._offsets: Dict[int, int] = {}
+        self._page_ids: List[int] = []
+        self._next_id: int = 3
+        self._closed: bool = False
+        # 第二行的二进制注释用于告知阅读器文件包含二进制数据
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self) -> int:
+        """已写入的页数"""
+        return len(self._page_ids)
+
+    def _allocate_id(self) -> int:
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_object(
+        self, obj_id: int, header: bytes, stream: Optional[bytes] = None
+    ) -> None:
+        """写入一个间接对象，stream不为空时作为流对象写入"""
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(f"{obj_id} 0 obj\n".encode("ascii"))
+        self._file.write(header)
+        if stream is not None:
+            self._file.write(b"\nstream\n")
+            self._file.write(stream)
+            self._file.write(b"\nendstream")
+        self._file.write(b"\nendobj\n")
+
+    def add_jpeg_page(
+        self, jpeg_data: bytes, width: int, height: int, color_space: str
+    ) -> None:
+        """
+        以DCTDecode图像对象的形式追加一页，页面尺寸与图片像素尺寸一致（72 DPI）
+
+        Args:
+            jpeg_data: 完整的JPEG字节流
+            width: 图片宽度（像素）
+            height: 图片高度（像素）
+            color_space: PDF颜色空间，如DeviceRGB、DeviceGray
+        """
+        image_id = self._allocate_id()
+        content_id = self._allocate_id()
+        page_id = self._allocate_id()
+
+        self._write_object(
+            image_id,
+            (
+                f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                f"/ColorSpace /{color_space} /BitsPerComponent 8 "
+                f"/Filter /DCTDecode /Length {len(jpeg_data)} >>"
+            ).encode("ascii"),
+            jpeg_data,
+        )
+
+        content = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._write_object(
+            content_id, f"<< /Length {len(content)} >>".encode("ascii"), content
+        )
+
+        self._write_object(
+            page_id,
+            (
+                f"<< /Type /Page /Parent {self.PAGES_ID} 0 R "
+                f"/MediaBox [0 0 {width} {height}] "
+                f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> "
+                f"/Contents {content_id} 0 R >>"
+            ).encode("ascii"),
+        )
+        self._page_ids.append(page_id)
+
+    def close(self) -> None:
+        """写入页面树、交叉引用表和文件尾，并将临时文件替换为目标PDF"""
+        if self._closed:
+            return
+        if not self._page_ids:
+            self.abort()
+            raise ValueError("PDF中没有任何页面")
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(
+            self.PAGES_ID,
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode(
+                "ascii"
+            ),
+        )
+        self._write_object(
+            self.CATALOG_ID,
+            f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>".encode("ascii"),
+        )
+
+        xref_offset = self._file.tell()
+        self._file.write(f"xref\n0 {self._next_id}\n".encode("ascii"))
+        self._file.write(b"0000000000 65535 f \n")
+        for obj_id in range(1, self._next_id):
+            self._file.write(f"{self._offsets[obj_id]:010d} 00000 n \n".encode("ascii"))
+        self._file.write(
+            (
+                f"trailer\n<< /Size {self._next_id} /Root {self.CATALOG_ID} 0 R >>\n"
+                f"startxref\n{xref_offset}\n%%EOF\n"
+            ).encode("ascii")
+        )
+        self._file.close()
+        self._closed = True
+        os.replace(self.temp_path, self.pdf_path)
+
+    def abort(self) -> None:
+        """放弃写入，关闭并删除临时文件"""
+        if self._closed:
+            return
+        self._closed = True
+        self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self) -> "StreamingPdfWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class EventDispatcher:
+    """
+    有界的事件分发线程池
+    按会话键（群或私聊用户）哈希到固定的工作线程，同一会话的任务按提交顺序执行，
+    不同会话之间互不阻塞。工作线程队列满时提交方最多等待 backpressure_seconds 秒，
+    仍然满时丢弃该任务并返回False
+    """
+
+    # 队列占用超过该比例时记录过载日志
+    OVERLOAD_RATIO = 0.8
+    # 过载日志的最小间隔（秒）
+    OVERLOAD_LOG_INTERVAL = 10.0
+
+    def __init__(
+        self,
+        name: str,
+        workers: int,
+        queue_size: int,
+        backpressure_seconds: float,
+    ) -> None:
+        """
+        Args:
+            name: 线程池名称（用于线程名与日志）
+            workers: 工作线程数
+            queue_size: 每个工作线程的队列长度
+            backpressure_seconds: 队列满时提交方最长等待时间（秒）
+        """
+        self.name: str = name
+        self.queue_size: int = queue_size
+        self.backpressure_seconds: float = backpressure_seconds
+        self._queues: List[queue.Queue] = [
+            queue.Queue(maxsize=queue_size) for _ in range(workers)
+        ]
+        self._running: bool = True
+        self._lock = threading.Lock()
+        self._last_overload_log: float = 0.0
+        # 统计：已提交、因队列满被丢弃、曾经等待过的任务数
+        self.submitted: int = 0
+        self.dropped: int = 0
+        self.delayed: int = 0
+        for index, worker_queue in enumerate(self._queues):
+            threading.Thread(
+                target=self._run_worker,
+                args=(worker_queue,),
+                name=f"{name}-{index}",
+                daemon=True,
+            ).start()
+
+    def submit(self, key: str, func: Callable[..., Any], *args: Any) -> bool:
+        """
+        提交任务，同一key的任务按提交顺序串行执行
+
+        Args:
+            key: 会话键
+            func: 要执行的函数
+            *args: 函数参数
+
+        Returns:
+            bool: 是否已加入队列（队列持续满或已停止时返回False）
+        """
+        if not self._running:
+            return False
+        worker_queue = self._queues[hash(key) % len(self._queues)]
+        if worker_queue.qsize() >= self.queue_size * self.OVERLOAD_RATIO:
+            self._log_overload(key, worker_queue.qsize())
+        try:
+            worker_queue.put_nowait((func, args))
+        except queue.Full:
+            with self._lock:
+                self.delayed += 1
+            try:
+                worker_queue.put((func, args), timeout=self.backpressure_seconds)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                loguru_logger.warning(
+                    f"[{self.name}] 队列已满，丢弃会话 {key} 的任务 "
+                    f"（累计丢弃 {self.dropped} 个）"
+                )
+                return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _log_overload(self, key: str, depth: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_overload_log < self.OVERLOAD_LOG_INTERVAL:
+                return
+            self._last_overload_log = now
+        loguru_logger.warning(
+            f"[{self.name}] 队列过载 - 会话 {key} 所在队列积压 {depth}/{self.queue_size}，"
+            f"各队列积压: {self.depths()}"
+        )
+
+    def depths(self) -> List[int]:
+        """各工作线程的队列积压数"""
+        return [worker_queue.qsize() for worker_queue in self._queues]
+
+    def _run_worker(self, worker_queue: queue.Queue) -> None:
+        while True:
+            item = worker_queue.get()
+            if item is None:
+                return
+            func, args = item
+            try:
+                func(*args)
+            except Exception as e:
+                loguru_logger.error(f"[{self.name}] 执行任务 {func.__name__} 时出错: {e}")
+
+    def stop(self) -> None:
+        """停止接收新任务，工作线程处理完已排队的任务后退出"""
+        self._running = False
+        for worker_queue in self._queues:
+            try:
+                worker_queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+
+class RecentIdCache:
+    """
+    最近出现过的ID集合（容量与过期时间双重限制的LRU）
+    用于丢弃重连后NapCat重新投递的重复事件
+    """
+
+    def __init__(self, capacity: int, ttl_seconds: float) -> None:
+        """
+        Args:
+            capacity: 最多记录的ID数，超出时淘汰最早的
+            ttl_seconds: ID的有效时间（秒）
+        """
+        self.capacity: int = capacity
+        self.ttl_seconds: float = ttl_seconds
+        # {ID: 首次出现时间}，按出现顺序排列
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 统计：命中（重复）与未命中（首次出现）次数
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def check_and_add(self, key: str) -> bool:
+        """
+        检查ID是否最近出现过，没有出现过时记录下来
+
+        Args:
+            key: 事件ID
+
+        Returns:
+            bool: 是否为重复ID
+        """
+        now = time.monotonic()
+        with self._lock:
+            # 淘汰过期的ID（按出现顺序，遇到未过期的即停止）
+            while self._seen:
+                oldest_key, seen_at = next(iter(self._seen.items()))
+                if now - seen_at <= self.ttl_seconds:
+                    break
+                del self._seen[oldest_key]
+            if key in self._seen:
+                self.hits += 1
+                return True
+            self.misses += 1
+            self._seen[key] = now
+            if len(self._seen) > self.capacity:
+                self._seen.popitem(last=False)
+            return False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._seen)
+
+
+class ActionResult:
+    """OneBot动作（发送消息、发送文件等）的执行结果"""
+
+    def __init__(
+        self,
+        ok: bool,
+        retcode: Optional[int] = None,
+        message: str = "",
+        data: Any = None,
+        latency: float = 0.0,
+    ) -> None:
+        """
+        Args:
+            ok: 是否成功
+            retcode: NapCat返回的状态码，超时或未发送时为None
+            message: 失败原因
+            data: NapCat返回的数据
+            latency: 从发送到收到响应的耗时（秒）
+        """
+        self.ok: bool = ok
+        self.retcode: Optional[int] = retcode
+        self.message: str = message
+        self.data: Any = data
+        self.latency: float = latency
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def __repr__(self) -> str:
+        return (
+            f"ActionResult(ok={self.ok}, retcode={self.retcode}, "
+            f"message={self.message!r}, latency={self.latency:.3f})"
+        )
+
+
+class TokenBucket:
+    """
+    令牌桶限流器
+    以 rate 个/秒 的速度补充令牌，最多积累 capacity 个；rate 不大于0时不限流
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 令牌桶容量（允许的突发数量）
+        """
+        self.rate: float = rate
+        self.capacity: float = max(1.0, capacity)
+        self.tokens: float = self.capacity
+        self.updated: float = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        尝试取出令牌
+
+        Returns:
+            bool: 令牌足够时取出并返回True，否则不取出并返回False
+        """
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """距离令牌足够还需等待的秒数，令牌足够时返回0"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= tokens:
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        """令牌桶是否已满（长时间没有使用）"""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens >= self.capacity
+
+    def drain(self) -> None:
+        """清空令牌（收到对方限流响应时使用，让之后的发送放慢）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = 0.0
+
+
+class CommandRateLimiter:
+    """
+    命令限流器：每个用户、每个群与全局各有一个令牌桶，三者都有令牌时命令才会被处理
+    被限流的用户在下一次命令被放行前只收到一次提示，避免提示消息本身刷屏
+    """
+
+    SCOPE_USER = "user"
+    SCOPE_GROUP = "group"
+    SCOPE_GLOBAL = "global"
+    # 记录限流次数的用户/群数量上限，超过时只保留次数最多的一半
+    MAX_THROTTLED_KEYS = 1000
+
+    def __init__(
+        self,
+        user_limit: Tuple[float, float],
+        group_limit: Tuple[float, float],
+        global_limit: Tuple[float, float],
+    ) -> None:
+        """
+        Args:
+            user_limit: 每个用户的 (每秒令牌数, 突发数量)，速率不大于0时不限流
+            group_limit: 每个群的 (每秒令牌数, 突发数量)
+            global_limit: 全局的 (每秒令牌数, 突发数量)
+        """
+        self.user_limit: Tuple[float, float] = user_limit
+        self.group_limit: Tuple[float, float] = group_limit
+        self.global_bucket = TokenBucket(*global_limit)
+        self._buckets: Dict[str, TokenBucket] = {}
+        # 已提示过的被限流用户，放行一次命令后移除
+        self._notified: Set[str] = set()
+        # 各范围的限流次数与被限流最多的用户/群
+        self.throttled: Dict[str, int] = {
+            self.SCOPE_USER: 0,
+            self.SCOPE_GROUP: 0,
+            self.SCOPE_GLOBAL: 0,
+        }
+        self.throttled_keys: Dict[str, int] = {}
+        self.allowed: int = 0
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: str, limit: Tuple[float, float]) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            # 清理长时间未使用的令牌桶，令牌已回满的用户也不再处于限流提示状态
+            if len(self._buckets) > 1000:
+                for idle_key in [k for k, b in self._buckets.items() if b.is_full()]:
+                    del self._buckets[idle_key]
+                    scope, _, idle_id = idle_key.partition(":")
+                    if scope == self.SCOPE_USER:
+                        self._notified.discard(idle_id)
+            bucket = self._buckets[key] = TokenBucket(*limit)
+        return bucket
+
+    def check(
+        self, user_id: str, group_id: Optional[str] = None
+    ) -> Optional[Tuple[str, float, bool]]:
+        """
+        检查并消耗一次命令额度
+
+        Args:
+            user_id: 用户ID
+            group_id: 群组ID（群聊时提供）
+
+        Returns:
+            Optional[Tuple[str, float, bool]]: 放行时返回None；
+            被限流时返回 (限流范围, 需等待的秒数, 是否需要提示该用户)
+        """
+        with self._lock:
+            user_key = f"user:{user_id}"
+            buckets = [
+                (self.SCOPE_USER, user_key, self._bucket(user_key, self.user_limit))
+            ]
+            if group_id:
+                group_key = f"group:{group_id}"
+                buckets.append(
+                    (self.SCOPE_GROUP, group_key, self._bucket(group_key, self.group_limit))
+                )
+            buckets.append((self.SCOPE_GLOBAL, self.SCOPE_GLOBAL, self.global_bucket))
+
+            # 先确认所有令牌桶都有令牌再一起扣除，被限流的命令不消耗其他桶的令牌
+            for scope, key, bucket in buckets:
+                wait = bucket.wait_time()
+                if wait > 0:
+                    self.throttled[scope] += 1
+                    self.throttled_keys[key] = self.throttled_keys.get(key, 0) + 1
+                    if len(self.throttled_keys) > self.MAX_THROTTLED_KEYS:
+                        kept = sorted(self.throttled_keys.items(), key=lambda item: -item[1])
+                        self.throttled_keys = dict(kept[: self.MAX_THROTTLED_KEYS // 2])
+                    notify = user_id not in self._notified
+                    self._notified.add(user_id)
+                    return scope, wait, notify
+            for _, _, bucket in buckets:
+                bucket.try_acquire()
+            self._notified.discard(user_id)
+            self.allowed += 1
+            return None
+
+    def summary(self) -> str:
+        """限流统计，用于下载进度显示（不包含具体的用户或群）"""
+        with self._lock:
+            total = sum(self.throttled.values())
+            if not total:
+                return f"放行 {self.allowed} 个，未限流"
+            return (
+                f"放行 {self.allowed} 个，限流 {total} 个"
+                f"（用户 {self.throttled[self.SCOPE_USER]}，群 {self.throttled[self.SCOPE_GROUP]}，"
+                f"全局 {self.throttled[self.SCOPE_GLOBAL]}）"
+            )
+
+    def details(self, top: int = 3) -> str:
+        """被限流最多的用户与群，仅用于管理员查看运行状态"""
+        with self._lock:
+            top_keys = sorted(self.throttled_keys.items(), key=lambda item: -item[1])[:top]
+        if not top_keys:
+            return "无"
+        scope_names = {"user": "用户", "group": "群", "global": "全局"}
+        return "、".join(
+            f"{scope_names[key.partition(':')[0]]}{key.partition(':')[2]}×{count}"
+            for key, count in top_keys
+        )
+
+
+class OutboundMessage:
+    """发送队列中的一条待发送动作"""
+
+    def __init__(
+        self,
+        action: str,
+        params: Dict[str, Any],
+        text: Optional[str],
+        timeout: Optional[float],
+    ) -> None:
+        """
+        Args:
+            action: OneBot动作名称
+            params: 动作参数
+            text: 纯文本消息的内容（可与同一目标相邻的文本消息合并），文件等其他消息为None
+            timeout: 等待响应的超时时间（秒），None表示使用默认值
+        """
+        self.action: str = action
+        self.params: Dict[str, Any] = params
+        self.text: Optional[str] = text
+        self.timeout: Optional[float] = timeout
+        self.enqueued_at: float = time.monotonic()
+        self.ready_at: float = self.enqueued_at
+        self.attempts: int = 0
+        # 合并后的消息需要同时通知所有原始请求
+        self.futures: List[concurrent.futures.Future] = [concurrent.futures.Future()]
+
+
+class OutboundScheduler:
+    """
+    发送队列
+    - 每个发送目标（群或私聊用户）一个队列，目标内按顺序发送，同一时间只有一条在发送
+    - 全局与每个目标各一个令牌桶限流
+    - 同一目标相邻的文本消息在等待 coalesce_seconds 后合并为一条发送
+    - 对方返回限流类错误或连接未建立时按指数退避重试；等待响应超时的动作可能已被执行，不重试
+    """
+
+    # NapCat/QQ限流类错误的提示文字
+    RATE_LIMIT_PATTERN: Pattern[str] = re.compile(
+        r"频繁|频率|限流|风控|rate.?limit|too many", re.IGNORECASE
+    )
+
+    def __init__(
+        self,
+        send_action: Callable[[str, Dict[str, Any], Optional[float]], "ActionResult"],
+        global_bucket: TokenBucket,
+        target_rate: float,
+        target_burst: int,
+        coalesce_seconds: float,
+        max_retries: int,
+        senders: int,
+        max_text_length: int = 3000,
+        buffer_limit: int = 500,
+    ) -> None:
+        """
+        Args:
+            send_action: 实际发送动作并等待响应的函数 (action, params, timeout) -> ActionResult
+            global_bucket: 全局令牌桶
+            target_rate: 每个目标每秒可发送的消息数
+            target_burst: 每个目标允许的突发数量
+            coalesce_seconds: 文本消息等待合并的时间（秒）
+            max_retries: 限流或连接未建立时的最大重试次数
+            senders: 发送线程数
+            max_text_length: 合并后单条文本消息的最大长度
+            buffer_limit: 断线期间最多缓存的消息数
+        """
+        self.send_action = send_action
+        self.global_bucket: TokenBucket = global_bucket
+        self.target_rate: float = target_rate
+        self.target_burst: int = target_burst
+        self.coalesce_seconds: float = coalesce_seconds
+        self.max_retries: int = max_retries
+        self.max_text_length: int = max_text_length
+        self.buffer_limit: int = buffer_limit
+        # 断线期间暂停发送，消息留在队列中，重新连接后继续发送
+        self._connected: bool = False
+        self._queues: Dict[str, Deque[OutboundMessage]] = {}
+        # 轮询顺序，保证各目标公平发送
+        self._order: Deque[str] = deque()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: set = set()
+        self._cond = threading.Condition()
+        self._running: bool = True
+        # 统计：合并掉的消息数、重试次数
+        self.coalesced: int = 0
+        self.retried: int = 0
+        for index in range(senders):
+            threading.Thread(
+                target=self._run_sender, name=f"outbound-{index}", daemon=True
+            ).start()
+
+    def submit(
+        self,
+        target: str,
+        action: str,
+        params: Dict[str, Any],
+        text: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> concurrent.futures.Future:
+        """
+        加入发送队列
+
+        Args:
+            target: 发送目标键
+            action: OneBot动作名称
+            params: 动作参数
+            text: 纯文本消息内容，提供时可与相邻文本合并
+            timeout: 等待响应的超时时间（秒）
+
+        Returns:
+            concurrent.futures.Future: 发送完成后得到 ActionResult
+        """
+        item = OutboundMessage(action, params, text, timeout)
+        with self._cond:
+            if not self._running:
+                item.futures[0].set_result(ActionResult(False, message="发送队列已停止"))
+                return item.futures[0]
+            if not self._connected and (
+                sum(len(items) for items in self._queues.values()) >= self.buffer_limit
+            ):
+                item.futures[0].set_result(
+                    ActionResult(False, message="WebSocket连接未建立，断线缓存已满")
+                )
+                return item.futures[0]
+            if target not in self._queues:
+                self._queues[target] = deque()
+                self._order.append(target)
+            self._queues[target].append(item)
+            self._cond.notify()
+        return item.futures[0]
+
+    def cancel(self, future: concurrent.futures.Future, message: str) -> bool:
+        """
+        取消仍在队列中、尚未开始发送的消息（已在发送中的无法取消）
+
+        Args:
+            future: submit 返回的Future
+            message: 取消时写入结果的原因
+
+        Returns:
+            bool: 是否已从队列中移除
+        """
+        with self._cond:
+            for target, items in self._queues.items():
+                for item in items:
+                    if future in item.futures and len(item.futures) == 1:
+                        items.remove(item)
+                        if not items:
+                            del self._queues[target]
+                            self._order.remove(target)
+                        break
+                else:
+                    continue
+                break
+            else:
+                return False
+        if not future.done():
+            future.set_result(ActionResult(False, message=message))
+        return True
+
+    def set_connected(self, connected: bool) -> None:
+        """连接建立时恢复发送（发送断线期间缓存的消息），断开时暂停"""
+        with self._cond:
+            self._connected = connected
+            self._cond.notify_all()
+
+    def pending_count(self) -> int:
+        """队列中等待发送的消息数"""
+        with self._cond:
+            return sum(len(items) for items in self._queues.values())
+
+    def _target_bucket(self, target: str) -> TokenBucket:
+        bucket = self._buckets.get(target)
+        if bucket is None:
+            bucket = TokenBucket(self.target_rate, self.target_burst)
+            self._buckets[target] = bucket
+        return bucket
+
+    def _take_next(self) -> Optional[Tuple[str, OutboundMessage]]:
+        """取出下一条可以发送的消息（需持有self._cond），没有时返回None并等待"""
+        while self._running:
+            if not self._connected:
+                self._cond.wait()
+                continue
+            now = time.monotonic()
+            wait: Optional[float] = None
+            for _ in range(len(self._order)):
+                target = self._order[0]
+                self._order.rotate(-1)
+                if target in self._in_flight:
+                    continue
+                head = self._queues[target][0]
+                ready_at = head.ready_at
+                if head.text is not None and head.attempts == 0:
+                    ready_at = max(ready_at, head.enqueued_at + self.coalesce_seconds)
+                target_wait = max(ready_at - now, self._target_bucket(target).wait_time())
+                if target_wait > 0:
+                    wait = target_wait if wait is None else min(wait, target_wait)
+                    continue
+                global_wait = self.global_bucket.wait_time()
+                if global_wait > 0:
+                    wait = global_wait if wait is None else min(wait, global_wait)
+                    break
+                self._target_bucket(target).try_acquire()
+                self.global_bucket.try_acquire()
+                item = self._pop_coalesced(target)
+                self._in_flight.add(target)
+                return target, item
+            # 清理长时间未使用的目标令牌桶
+            if len(self._buckets) > 1000:
+                for target in [t for t, b in self._buckets.items() if b.is_full()]:
+                    if target not in self._queues:
+                        del self._buckets[target]
+            self._cond.wait(timeout=wait)
+        return None
+
+    def _pop_coalesced(self, target: str) -> OutboundMessage:
+        """取出目标队首的消息，并把紧随其后的文本消息合并进来"""
+        items = self._queues[target]
+        item = items.popleft()
+        if item.text is not None:
+            texts = [item.text]
+            length = len(item.text)
+            while items and items[0].text is not None:
+                next_text = items[0].text
+                if length + len(next_text) + 2 > self.max_text_length:
+                    break
+                merged = items.popleft()
+                texts.append(next_text)
+                length += len(next_text) + 2
+                item.futures.extend(merged.futures)
+                self.coalesced += 1
+            if len(texts) > 1:
+                item.text = "\n\n".join(texts)
+                item.params = dict(item.params, message=item.text)
+        if not items:
+            del self._queues[target]
+            self._order.remove(target)
+        return item
+
+    def _run_sender(self) -> None:
+        while True:
+            with self._cond:
+                taken = self._take_next()
+            if taken is None:
+                return
+            target, item = taken
+            try:
+                result = self.send_action(item.action, dict(item.params), item.timeout)
+            except Exception as e:
+                result = ActionResult(False, message=str(e))
+            retry = (
+                not result
+                and item.attempts < self.max_retries
+                # 等待响应超时的消息可能已经送达，重试会重复发送，因此不重试；
+                # 没有发出去（连接未建立）的消息都会在重新连接后重试
+                and (
+                    "连接未建立" in result.message
+                    or self.RATE_LIMIT_PATTERN.search(result.message)
+                )
+            )
+            with self._cond:
+                self._in_flight.discard(target)
+                if retry:
+                    item.attempts += 1
+                    item.ready_at = time.monotonic() + _backoff_delay(item.attempts - 1)
+                    self._target_bucket(target).drain()
+                    self.retried += 1
+                    if target not in self._queues:
+                        self._queues[target] = deque()
+                        self._order.append(target)
+                    self._queues[target].appendleft(item)
+                    loguru_logger.warning(
+                        f"发送到 {target} 失败（{result.message}），"
+                        f"第 {item.attempts} 次重试将在 {item.ready_at - time.monotonic():.1f}秒后进行"
+                    )
+                self._cond.notify_all()
+            if not retry:
+                for future in item.futures:
+                    if not future.done():
+                        future.set_result(result)
+
+    def stop(self) -> None:
+        """停止发送线程，队列中未发送的消息全部以失败结束"""
+        with self._cond:
+            self._running = False
+            pending = [item for items in self._queues.values() for item in items]
+            self._queues.clear()
+            self._order.clear()
+            self._cond.notify_all()
+        for item in pending:
+            for future in item.futures:
+                if not future.done():
+                    future.set_result(ActionResult(False, message="发送队列已停止"))
+
+
+class DownloadJob:
+    """
+    下载任务对象，在下载阶段与转换阶段之间传递，记录任务当前所处的阶段
+    """
+
+    # 任务阶段
+    STAGE_QUEUED = "queued"
+    STAGE_DOWNLOADING = "downloading"
+    STAGE_WAITING_CONVERT = "waiting_convert"
+    STAGE_CONVERTING = "converting"
+
+    # 阶段在下载进度中的显示名称
+    STAGE_LABELS: Dict[str, str] = {
+        STAGE_QUEUED: "排队中",
+        STAGE_DOWNLOADING: "下载中",
+        STAGE_WAITING_CONVERT: "等待转换",
+        STAGE_CONVERTING: "转换PDF中",
+    }
+
+    def __init__(
+        self, user_id: str, manga_id: str, group_id: Optional[str], private: bool
+    ) -> None:
+        """
+        初始化下载任务
+
+        Args:
+            user_id: 请求下载的用户ID
+            manga_id: 漫画ID
+            group_id: 群组ID（群聊时提供）
+            private: 是否为私聊
+        """
+        self.user_id: str = user_id
+        self.manga_id: str = manga_id
+        self.group_id: Optional[str] = group_id
+        self.private: bool = private
+        self.stage: str = self.STAGE_QUEUED
+        self.created_at: float = time.time()
+        # 等待该任务结果的所有请求者 [(user_id, group_id, private)]，第一个为发起者
+        self.subscribers: List[Tuple[str, Optional[str], bool]] = [
+            (user_id, group_id, private)
+        ]
+        # 资源预算分配给该任务的下载线程数
+        self.threads: int = 0
+        # 下载阶段从漫画详情中获取的标题与作者
+        self.title: str = ""
+        self.author: str = ""
+        # 入队后异步获取的章节数与总页数，获取前为None
+        self.chapters: Optional[int] = None
+        self.pages: Optional[int] = None
+        # 入队后获取的漫画详情，下载阶段直接使用，不再重复请求
+        self.album: Any = None
+        self.album_fetched_at: float = 0.0
+        # 开始下载的时间，用于估算每页的下载耗时
+        self.download_started: Optional[float] = None
+        # 下载阶段完成后填充，供转换阶段使用
+        self.manga_dir: Optional[str] = None
+        self.image_files: List[str] = []
+
+    @classmethod
+    def without_subscribers(cls, manga_id: str) -> "DownloadJob":
+        """
+        创建一个没有请求者的任务，用于自动继续中断的下载
+
+        Args:
+            manga_id: 漫画ID
+
+        Returns:
+            DownloadJob: 新任务，完成时不发送任何通知
+        """
+        job = cls("", manga_id, None, True)
+        job.subscribers = []
+        return job
+
+    def add_subscriber(
+        self, user_id: str, group_id: Optional[str], private: bool
+    ) -> bool:
+        """
+        添加一个等待该任务结果的请求者
+        同一个私聊用户或同一个群只记录一次，避免完成时重复通知
+
+        Args:
+            user_id: 用户ID
+            group_id: 群组ID（群聊时提供）
+            private: 是否为私聊
+
+        Returns:
+            bool: 是否为新的通知目标
+        """
+        for sub_user_id, sub_group_id, sub_private in self.subscribers:
+            if private and sub_private and sub_user_id == user_id:
+                return False
+            if not private and not sub_private and sub_group_id == group_id:
+                return False
+        self.subscribers.append((user_id, group_id, private))
+        return True
+
+    @property
+    def stage_label(self) -> str:
+        """当前阶段的显示名称"""
+        return self.STAGE_LABELS.get(self.stage, self.stage)
+
+
+class FairDownloadQueue:
+    """
+    多租户公平下载队列（替代先进先出的 queue.Queue）
+    群聊中的任务属于该群，私聊任务属于该用户，自动继续的任务属于系统；
+    各租户之间按权重轮流出队（步进调度：每出队一个任务，租户的进度增加 任务页数/权重，
+    总是从进度最小的租户取任务，进度相同时优先页数少的），同一租户内再按请求用户轮流出队。
+    每个用户的任务按页数从少到多出队（短任务优先），等待越久的任务计算时的页数越少，
+    大任务不会一直被后来的小任务插队
+    """
+
+    SYSTEM_TENANT = "system"
+    # 尚未获取到页数的任务按该页数估算
+    UNKNOWN_PAGES = 200
+    # 步进调度中每多少页计为一个任务
+    PAGES_PER_TURN = 100
+
+    def __init__(
+        self, weights: Optional[Dict[str, int]] = None, aging_pages_per_minute: int = 50
+    ) -> None:
+        """
+        Args:
+            weights: 群组权重 {group_id: 权重}，未配置的租户权重为1
+            aging_pages_per_minute: 任务每等待一分钟，排序时减少的页数
+        """
+        self.weights: Dict[str, int] = dict(weights or {})
+        self.aging_pages_per_minute: int = aging_pages_per_minute
+        # {租户: {用户ID: 该用户排队中的任务}}，字典保持用户的轮转顺序
+        self._tenants: Dict[str, Dict[str, Deque[DownloadJob]]] = {}
+        # 各租户的调度进度，新加入的租户从当前最小进度开始，不会补回空闲期间的份额
+        self._passes: Dict[str, float] = {}
+        self._virtual_time: float = 0.0
+        self._size: int = 0
+        self._condition = threading.Condition()
+
+    @classmethod
+    def tenant_of(cls, job: DownloadJob) -> str:
+        """任务所属的租户"""
+        if not job.user_id:
+            return cls.SYSTEM_TENANT
+        if not job.private and job.group_id:
+            return f"group:{job.group_id}"
+        return f"private:{job.user_id}"
+
+    def _weight(self, tenant: str) -> int:
+        if tenant.startswith("group:"):
+            return max(1, self.weights.get(tenant[len("group:"):], 1))
+        return 1
+
+    def set_weight(self, group_id: str, weight: int) -> None:
+        """设置群组权重，权重为1时恢复默认"""
+        with self._condition:
+            if weight <= 1:
+                self.weights.pop(group_id, None)
+            else:
+                self.weights[group_id] = weight
+
+    def weights_snapshot(self) -> Dict[str, int]:
+        """当前生效的群组权重（未列出的群权重为1）"""
+        with self._condition:
+            return dict(self.weights)
+
+    def put(self, job: DownloadJob) -> None:
+        """将任务加入所属租户与用户的队列末尾"""
+        tenant = self.tenant_of(job)
+        with self._condition:
+            users = self._tenants.get(tenant)
+            if users is None:
+                users = self._tenants[tenant] = {}
+                self._passes[tenant] = self._virtual_time
+            users.setdefault(job.user_id, deque()).append(job)
+            self._size += 1
+            self._condition.notify()
+
+    @classmethod
+    def estimated_pages(cls, job: DownloadJob) -> int:
+        """任务的页数，尚未获取时返回估算值"""
+        return job.pages if job.pages else cls.UNKNOWN_PAGES
+
+    def _effective_pages(self, job: DownloadJob, now: float) -> float:
+        """排序用的页数：实际页数减去等待时间带来的优先度"""
+        waited_minutes = max(0.0, now - job.created_at) / 60
+        return self.estimated_pages(job) - waited_minutes * self.aging_pages_per_minute
+
+    def _pick(
+        self,
+        tenants: Dict[str, Dict[str, Deque[DownloadJob]]],
+        passes: Dict[str, float],
+        now: float,
+    ) -> Tuple[float, DownloadJob]:
+        """
+        从给定的队列状态中取出下一个任务（会修改传入的状态）
+
+        Returns:
+            Tuple[float, DownloadJob]: (出队租户此前的调度进度, 任务)
+        """
+
+        def next_job(users: Dict[str, Deque[DownloadJob]]) -> DownloadJob:
+            # 租户内轮到的用户中排序页数最少的任务
+            return min(
+                next(iter(users.values())),
+                key=lambda job: self._effective_pages(job, now),
+            )
+
+        tenant = min(
+            tenants,
+            key=lambda name: (
+                passes[name],
+                self._effective_pages(next_job(tenants[name]), now),
+            ),
+        )
+        served_pass = passes[tenant]
+        users = tenants[tenant]
+        user_id = next(iter(users))
+        job = next_job(users)
+        jobs = users.pop(user_id)
+        jobs.remove(job)
+        # 该用户还有任务时移到本租户的队尾，实现租户内按用户轮转
+        if jobs:
+            users[user_id] = jobs
+        turns = max(1.0, self.estimated_pages(job) / self.PAGES_PER_TURN)
+        passes[tenant] += turns / self._weight(tenant)
+        if not users:
+            del tenants[tenant]
+            del passes[tenant]
+        return served_pass, job
+
+    def get(self, timeout: Optional[float] = None) -> DownloadJob:
+        """
+        按公平顺序取出下一个任务
+
+        Raises:
+            queue.Empty: 等待timeout秒后仍没有任务
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._size > 0, timeout=timeout):
+                raise queue.Empty
+            served_pass, job = self._pick(self._tenants, self._passes, time.time())
+            self._virtual_time = max(self._virtual_time, served_pass)
+            self._size -= 1
+            return job
+
+    def ordered_jobs(self) -> List[DownloadJob]:
+        """按预计出队顺序返回所有排队中的任务（新任务可能改变之后的顺序）"""
+        with self._condition:
+            tenants = {
+                tenant: {user: deque(jobs) for user, jobs in users.items()}
+                for tenant, users in self._tenants.items()
+            }
+            passes = dict(self._passes)
+            now = time.time()
+            return [self._pick(tenants, passes, now)[1] for _ in range(self._size)]
+
+    def count_user(self, user_id: str) -> int:
+        """用户排队中的任务数（所有租户合计）"""
+        with self._condition:
+            return sum(
+                len(users.get(user_id, ())) for users in self._tenants.values()
+            )
+
+    def qsize(self) -> int:
+        """排队中的任务数"""
+        with self._condition:
+            return self._size
+
+
+class ResourceBudget:
+    """
+    下载任务资源预算（准入控制器）
+    为每个任务分配内存与线程额度，只有剩余额度足够时才允许新任务开始；
+    当前没有任何任务运行时总是放行，避免单个任务的需求超过总预算而永远无法执行
+    """
+
+    def __init__(self, memory_mb: int, threads: int) -> None:
+        """
+        初始化资源预算
+
+        Args:
+            memory_mb: 所有下载任务可使用的内存总额度（MB）
+            threads: 所有下载任务可使用的下载线程总数
+        """
+        self.memory_mb: int = memory_mb
+        self.threads: int = threads
+        self.used_memory_mb: int = 0
+        self.used_threads: int = 0
+        # 已分配的额度 {job_id: (memory_mb, threads)}
+        self.allocations: Dict[str, Tuple[int, int]] = {}
+        self._condition = threading.Condition()
+
+    def _fits(self, memory_mb: int, threads: int) -> bool:
+        if not self.allocations:
+            return True
+        return (
+            self.used_memory_mb + memory_mb <= self.memory_mb
+            and self.used_threads + threads <= self.threads
+        )
+
+    def acquire(
+        self, job_id: str, memory_mb: int, threads: int, timeout: float = 1.0
+    ) -> bool:
+        """
+        为任务申请资源额度，额度不足时最多等待timeout秒
+
+        Args:
+            job_id: 任务标识
+            memory_mb: 申请的内存额度（MB）
+            threads: 申请的线程数
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            bool: 是否申请成功
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._fits(memory_mb, threads), timeout=timeout
+            ):
+                return False
+            self.allocations[job_id] = (memory_mb, threads)
+            self.used_memory_mb += memory_mb
+            self.used_threads += threads
+            return True
+
+    def release_threads(self, job_id: str) -> None:
+        """归还任务的线程额度，内存额度继续保留（用于下载结束但转换尚未完成的任务）"""
+        with self._condition:
+            if job_id not in self.allocations:
+                return
+            memory_mb, threads = self.allocations[job_id]
+            self.used_threads -= threads
+            self.allocations[job_id] = (memory_mb, 0)
+            self._condition.notify_all()
+
+    def release(self, job_id: str) -> None:
+        """归还任务的全部资源额度"""
+        with self._condition:
+            if job_id not in self.allocations:
+                return
+            memory_mb, threads = self.allocations.pop(job_id)
+            self.used_memory_mb -= memory_mb
+            self.used_threads -= threads
+            self._condition.notify_all()
+
+    def usage(self) -> Tuple[int, int, int]:
+        """
+        Returns:
+            Tuple[int, int, int]: (已用内存MB, 已用线程数, 占用资源的任务数)
+        """
+        with self._condition:
+            return self.used_memory_mb, self.used_threads, len(self.allocations)
+
+
+class AdaptiveConcurrency:
+    """
+    单个下载任务的图片并发数控制器（AIMD：加性增、乘性减）
+    每个章节开始下载前根据上一段时间的下载速度与失败率调整图片并发数：
+    出现较多失败时减半；速度随并发增加而提高时加1；增加并发后速度反而下降时退回1
+    """
+
+    # 失败率超过该值时视为被服务器限流，并发数减半
+    ERROR_RATE_THRESHOLD = 0.1
+    # 增加并发后速度下降超过该比例时视为带宽已饱和，退回上一个并发数
+    THROUGHPUT_DROP_RATIO = 0.1
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1) -> None:
+        """
+        Args:
+            initial: 初始并发数
+            maximum: 并发数上限（受资源预算分配的线程数限制）
+            minimum: 并发数下限
+        """
+        self.minimum: int = max(1, minimum)
+        self.maximum: int = max(self.minimum, maximum)
+        self.current: int = min(self.maximum, max(self.minimum, initial))
+        self.peak: int = self.current
+        self.total_bytes: int = 0
+        self.total_images: int = 0
+        self.total_failures: int = 0
+        self.started: float = time.monotonic()
+        # 当前统计窗口
+        self._window_started: float = self.started
+        self._window_bytes: int = 0
+        self._window_images: int = 0
+        self._window_failures: int = 0
+        # 上一个窗口的速度（字节/秒）与上次调整的方向
+        self._last_throughput: Optional[float] = None
+        self._last_step: int = 0
+        self._lock = threading.Lock()
+
+    def record_success(self, size: int) -> None:
+        """记录一张从网络下载完成的图片"""
+        with self._lock:
+            self._window_bytes += size
+            self._window_images += 1
+            self.total_bytes += size
+            self.total_images += 1
+
+    def record_failure(self) -> None:
+        """记录一张下载失败的图片"""
+        with self._lock:
+            self._window_failures += 1
+            self.total_failures += 1
+
+    def adjust(self) -> int:
+        """
+        根据当前窗口的统计调整并发数，样本不足时保持不变
+
+        Returns:
+            int: 调整后的并发数
+        """
+        with self._lock:
+            samples = self._window_images + self._window_failures
+            # 样本太少时速度波动很大，至少要有一轮并发的图片才做判断
+            if samples < max(self.current, 4):
+                return self.current
+
+            now = time.monotonic()
+            throughput = self._window_bytes / max(now - self._window_started, 1e-3)
+            error_rate = self._window_failures / samples
+            if error_rate > self.ERROR_RATE_THRESHOLD:
+                step = max(self.minimum, self.current // 2) - self.current
+            elif (
+                self._last_step > 0
+                and self._last_throughput is not None
+                and throughput < self._last_throughput * (1 - self.THROUGHPUT_DROP_RATIO)
+            ):
+                step = -1
+            elif self._last_step < 0 and self._window_failures:
+                # 刚因失败降低并发且仍有失败时先保持，等待服务器恢复
+                step = 0
+            else:
+                step = 1
+            self.current = min(self.maximum, max(self.minimum, self.current + step))
+            self.peak = max(self.peak, self.current)
+            self._last_step = step
+            self._last_throughput = throughput
+            self._window_started = now
+            self._window_bytes = 0
+            self._window_images = 0
+            self._window_failures = 0
+            return self.current
+
+    def summary(self) -> str:
+        """整个任务的并发与速度统计，用于日志"""
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-3)
+            return (
+                f"图片并发 {self.current}（最高 {self.peak}，上限 {self.maximum}），"
+                f"下载 {self.total_images} 张 / {self.total_bytes / 1024 / 1024:.1f}MB，"
+                f"平均速度 {self.total_bytes / elapsed / 1024:.0f}KB/s，失败 {self.total_failures} 张"
+            )
+
+
+def _resolve_download_path() -> str:
+    """
+    读取 MANGA_DOWNLOAD_PATH 并解析为绝对路径（机器人与命令行维护工具共用）
+
+    Returns:
+        str: 下载目录的绝对路径
+    """
+    download_path = os.getenv("MANGA_DOWNLOAD_PATH", "./downloads")
+    # 处理Linux系统中的波浪号(~)路径，将其扩展为用户主目录
+    if download_path.startswith("~"):
+        download_path = os.path.expanduser(download_path)
+    # 将相对路径转换为绝对路径，确保父级目录引用能正确解析
+    return os.path.abspath(download_path)
+
+
+def _get_dir_size(dir_path: str) -> int:
+    """
+    统计文件夹中所有文件的总字节数
+
+    Args:
+        dir_path: 文件夹路径
+
+    Returns:
+        int: 总字节数
+    """
+    total = 0
+    for root, _, files in os.walk(dir_path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                continue
+    return total
+
+
+class AlbumManifest:
+    """
+    漫画文件夹的页面完成清单
+    每张图片完整写入磁盘后追加一行记录（相对路径与字节数），
+    中断后只有清单中记录且大小一致的图片才被视为已完成，其余文件会在继续下载前删除
+    """
+
+    FILE_NAME = ".pages"
+
+    def __init__(self, album_dir: str) -> None:
+        """
+        Args:
+            album_dir: 漫画文件夹路径
+        """
+        self.album_dir: str = album_dir
+        self.path: str = os.path.join(album_dir, self.FILE_NAME)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, int] = self.load()
+
+    def exists(self) -> bool:
+        """清单文件是否存在"""
+        return os.path.isfile(self.path)
+
+    def load(self) -> Dict[str, int]:
+        """
+        读取清单
+
+        Returns:
+            Dict[str, int]: {相对路径: 文件字节数}
+        """
+        entries: Dict[str, int] = {}
+        if not os.path.isfile(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                # 最后一行可能因中断而不完整，解析失败的行直接忽略
+                rel_path, _, size = line.rstrip("\n").rpartition("\t")
+                if rel_path and size.isdigit():
+                    entries[rel_path] = int(size)
+        return entries
+
+    @property
+    def page_count(self) -> int:
+        """已完成的页数"""
+        return len(self._entries)
+
+    def record(self, file_path: str) -> int:
+        """
+        记录一张已完整下载的图片
+
+        Args:
+            file_path: 图片文件路径
+
+        Returns:
+            int: 图片字节数
+        """
+        rel_path = os.path.relpath(file_path, self.album_dir)
+        size = os.path.getsize(file_path)
+        with self._lock:
+            if self._entries.get(rel_path) == size:
+                return size
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(f"{rel_path}\t{size}\n")
+            self._entries[rel_path] = size
+        return size
+
+    def prune_unverified(self) -> int:
+        """
+        删除清单中没有记录或大小不一致的图片（可能是中断时写了一半的文件），
+        继续下载时jmcomic只会跳过清单确认过的完整图片
+
+        Returns:
+            int: 删除的文件数
+        """
+        removed = 0
+        if not os.path.isdir(self.album_dir):
+            return removed
+        with self._lock:
+            for root, _, files in os.walk(self.album_dir):
+                for file in files:
+                    if not file.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    file_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(file_path, self.album_dir)
+                    expected_size = self._entries.get(rel_path)
+                    if expected_size is None or os.path.getsize(file_path) != expected_size:
+                        os.remove(file_path)
+                        self._entries.pop(rel_path, None)
+                        removed += 1
+        return removed
+
+    def last_modified(self) -> float:
+        """清单最后更新的时间戳，没有清单时返回文件夹的修改时间"""
+        if os.path.isfile(self.path):
+            return os.path.getmtime(self.path)
+        return os.path.getmtime(self.album_dir)
+
+
+class _PrefetchedAlbumClient:
+    """
+    包装jmcomic客户端：请求已预先获取的漫画详情时直接返回该详情，其余调用交给原客户端
+    """
+
+    def __init__(self, client: Any, album: Any) -> None:
+        """
+        Args:
+            client: jmcomic客户端
+            album: 预先获取的漫画详情
+        """
+        self._client = client
+        self._album = album
+
+    def get_album_detail(self, album_id: Any) -> Any:
+        """
+        获取漫画详情，请求的是预先获取的漫画时直接返回，不再发送请求
+
+        Args:
+            album_id: 漫画ID
+
+        Returns:
+            Any: jmcomic漫画详情
+        """
+        if str(album_id) == str(getattr(self._album, "album_id", "")):
+            return self._album
+        return self._client.get_album_detail(album_id)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+
+class _ManifestDownloaderMixin:
+    """
+    记录页面完成清单的下载器（与jmcomic.JmDownloader组合使用，见 _get_manifest_downloader）
+    开始下载前清理上次中断留下的不完整图片，每张图片下载完成后写入清单
+    """
+
+    def __init__(self, option) -> None:
+        super().__init__(option)
+        self.album_dir: Optional[str] = None
+        self.manifest: Optional[AlbumManifest] = None
+        # 本次实际从网络下载的图片数（不含已存在而跳过的图片）
+        self.downloaded_images: int = 0
+
+    def create_client(self):
+        # 使用下载选项上附带的共享客户端（见 MangaBot._get_job_option），避免每个任务重新建立连接
+        client = getattr(self.option, "shared_client", None)
+        if client is None:
+            client = super().create_client()
+        # 入队时已获取过漫画详情的，直接使用该详情
+        prefetched_album = getattr(self.option, "prefetched_album", None)
+        if prefetched_album is not None:
+            client = _PrefetchedAlbumClient(client, prefetched_album)
+        return client
+
+    def before_album(self, album) -> None:
+        # 把漫画详情（页数、章节数等）交给任务，用于估算开始时间
+        album_callback = getattr(self.option, "album_callback", None)
+        if album_callback is not None:
+            album_callback(album)
+        album_dir = getattr(album, "save_path", None) or (
+            self.option.dir_rule.decide_album_root_dir(album)
+        )
+        os.makedirs(album_dir, exist_ok=True)
+        self.album_dir = album_dir
+        self.manifest = AlbumManifest(album_dir)
+        removed = self.manifest.prune_unverified()
+        if self.manifest.page_count or removed:
+            loguru_logger.info(
+                f"继续下载漫画 {album.id}: 已完成 {self.manifest.page_count} 页，"
+                f"清理不完整文件 {removed} 个"
+            )
+        super().before_album(album)
+
+    def before_photo(self, photo) -> None:
+        # jmcomic在每个章节开始时读取图片并发数，在这里按控制器的结果更新
+        controller = getattr(self.option, "concurrency", None)
+        if controller is not None:
+            self.option.download.threading.image = controller.adjust()
+        super().before_photo(photo)
+
+    def download_by_image_detail(self, image) -> None:
+        try:
+            super().download_by_image_detail(image)
+        except Exception:
+            controller = getattr(self.option, "concurrency", None)
+            if controller is not None:
+                controller.record_failure()
+            raise
+
+    def after_image(self, image, img_save_path) -> None:
+        super().after_image(image, img_save_path)
+        size = None
+        if self.manifest is not None:
+            size = self.manifest.record(img_save_path)
+        # 已存在而跳过下载的图片不计入下载速度
+        if image.exists and image.cache:
+            return
+        self.downloaded_images += 1
+        controller = getattr(self.option, "concurrency", None)
+        if controller is not None:
+            controller.record_success(
+                size if size is not None else os.path.getsize(img_save_path)
+            )
+
+
+_manifest_downloader_class: Any = None
+
+
+def _get_manifest_downloader() -> Any:
+    """返回记录页面清单的下载器类，首次调用时导入jmcomic并创建"""
+    global _manifest_downloader_class
+    if _manifest_downloader_class is None:
+        jmcomic = _load_jmcomic()
+        _manifest_downloader_class = type(
+            "ManifestDownloader", (_ManifestDownloaderMixin, jmcomic.JmDownloader), {}
+        )
+    return _manifest_downloader_class
+
+
+class LibraryLayout:
+    """
+    漫画库在磁盘上的目录布局
+    - flat: 所有PDF与漫画文件夹直接放在下载目录下
+    - sharded: 按 漫画ID mod 256 分到 {下载目录}/{三位分片号}/ 子目录中，
+      避免单个目录中文件过多导致目录操作变慢
+    """
+
+    SHARD_COUNT = 256
+    LAYOUTS = ("flat", "sharded")
+
+    def __init__(self, base_dir: str, mode: str = "flat") -> None:
+        """
+        Args:
+            base_dir: 漫画下载目录
+            mode: 目录布局，flat 或 sharded
+        """
+        if mode not in self.LAYOUTS:
+            raise ValueError(f"未知的漫画库目录布局: {mode}")
+        self.base_dir: str = base_dir
+        self.mode: str = mode
+
+    @classmethod
+    def is_shard_name(cls, name: str) -> bool:
+        """目录名是否为分片目录（000-255）"""
+        return len(name) == 3 and name.isdigit() and int(name) < cls.SHARD_COUNT
+
+    def shard_dir(self, manga_id: str) -> str:
+        """
+        漫画ID对应的目录，漫画文件夹与PDF都放在该目录下
+
+        Args:
+            manga_id: 漫画ID
+
+        Returns:
+            str: 目录路径
+        """
+        if self.mode == "flat":
+            return self.base_dir
+        return os.path.join(self.base_dir, f"{int(manga_id) % self.SHARD_COUNT:03d}")
+
+    def pdf_path(self, manga_id: str, folder_name: str) -> str:
+        """漫画文件夹转换后的PDF路径"""
+        return os.path.join(self.shard_dir(manga_id), f"{folder_name}.pdf")
+
+    def scan_dirs(self) -> List[str]:
+        """存放漫画文件的所有目录（只返回已存在的）"""
+        if self.mode == "flat":
+            return [self.base_dir] if os.path.isdir(self.base_dir) else []
+        dirs = []
+        if os.path.isdir(self.base_dir):
+            with os.scandir(self.base_dir) as scanner:
+                for entry in scanner:
+                    if self.is_shard_name(entry.name) and entry.is_dir():
+                        dirs.append(entry.path)
+        return sorted(dirs)
+
+    def misplaced_items(self) -> List[Tuple[str, str]]:
+        """
+        按当前布局放错位置的漫画文件与文件夹（通常是切换布局后尚未迁移的）
+
+        Returns:
+            List[Tuple[str, str]]: (当前路径, 应在的路径) 列表
+        """
+        source_dirs = [self.base_dir] if os.path.isdir(self.base_dir) else []
+        if self.mode == "flat":
+            source_dirs = LibraryLayout(self.base_dir, "sharded").scan_dirs()
+        items = []
+        for source_dir in source_dirs:
+            with os.scandir(source_dir) as scanner:
+                for entry in scanner:
+                    id_match = re.match(r"^(\d+)-", entry.name) or re.match(
+                        r"^(\d+)\.pdf$", entry.name
+                    )
+                    if id_match is None or self.is_shard_name(entry.name):
+                        continue
+                    target_dir = self.shard_dir(id_match.group(1))
+                    if os.path.abspath(target_dir) != os.path.abspath(source_dir):
+                        items.append((entry.path, os.path.join(target_dir, entry.name)))
+        return items
+
+    def migrate(self) -> Tuple[int, int]:
+        """
+        将漫画文件与文件夹移动到当前布局下的位置（一次性迁移）
+        目标位置已存在同名文件时跳过
+
+        Returns:
+            Tuple[int, int]: (已移动数, 跳过数)
+        """
+        moved = skipped = 0
+        for source, target in self.misplaced_items():
+            if os.path.exists(target):
+                skipped += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source, target)
+            moved += 1
+        # 迁回平铺布局后删除已清空的分片目录
+        if self.mode == "flat":
+            for shard_dir in LibraryLayout(self.base_dir, "sharded").scan_dirs():
+                if not os.listdir(shard_dir):
+                    os.rmdir(shard_dir)
+        return moved, skipped
+
+
+class LibraryIndex:
+    """
+    已下载漫画PDF的内存索引
+    启动时用os.scandir按目录布局扫描一次下载目录，之后在下载完成或文件删除时增量更新，
+    各命令按漫画ID直接查找，不再重复读取目录
+    """
+
+    def __init__(self, layout: LibraryLayout) -> None:
+        """
+        Args:
+            layout: 漫画库目录布局
+        """
+        self.layout: LibraryLayout = layout
+        # {manga_id: {文件名: 文件路径}}
+        self._entries: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse_manga_id(file_name: str) -> Optional[str]:
+        """
+        从PDF文件名中解析漫画ID，支持 {id}-{title}.pdf 与 {id}.pdf 两种格式
+
+        Args:
+            file_name: 文件名
+
+        Returns:
+            Optional[str]: 漫画ID，不是漫画PDF时返回None
+        """
+        if not file_name.endswith(".pdf"):
+            return None
+        manga_id = os.path.splitext(file_name)[0].split("-", 1)[0]
+        return manga_id if manga_id.isdigit() else None
+
+    def build(self) -> int:
+        """
+        扫描下载目录，重建索引
+
+        Returns:
+            int: 索引中的PDF文件数
+        """
+        entries: Dict[str, Dict[str, str]] = {}
+        count = 0
+        for scan_dir in self.layout.scan_dirs():
+            with os.scandir(scan_dir) as scanner:
+                for entry in scanner:
+                    manga_id = self.parse_manga_id(entry.name)
+                    if manga_id is None or not entry.is_file():
+                        continue
+                    entries.setdefault(manga_id, {})[entry.name] = entry.path
+                    count += 1
+        with self._lock:
+            self._entries = entries
+        return count
+
+    def add(self, file_path: str) -> None:
+        """将新生成的PDF加入索引"""
+        file_name = os.path.basename(file_path)
+        manga_id = self.parse_manga_id(file_name)
+        if manga_id is None:
+            return
+        with self._lock:
+            self._entries.setdefault(manga_id, {})[file_name] = file_path
+
+    def remove(self, file_path: str) -> None:
+        """将已删除的PDF移出索引"""
+        file_name = os.path.basename(file_path)
+        manga_id = self.parse_manga_id(file_name)
+        if manga_id is None:
+            return
+        with self._lock:
+            files = self._entries.get(manga_id)
+            if files is None:
+                return
+            files.pop(file_name, None)
+            if not files:
+                del self._entries[manga_id]
+
+    def lookup(self, manga_id: str) -> List[Tuple[str, str]]:
+        """
+        按漫画ID查找PDF文件
+
+        Args:
+            manga_id: 漫画ID
+
+        Returns:
+            List[Tuple[str, str]]: 按文件名排序的 (文件名, 文件路径) 列表
+        """
+        with self._lock:
+            return sorted(self._entries.get(manga_id, {}).items())
+
+    def contains(self, manga_id: str) -> bool:
+        """漫画ID是否已有PDF"""
+        with self._lock:
+            return manga_id in self._entries
+
+    def manga_ids(self) -> List[str]:
+        """所有已有PDF的漫画ID"""
+        with self._lock:
+            return list(self._entries)
+
+    def file_names(self) -> List[str]:
+        """所有PDF文件名（已排序）"""
+        with self._lock:
+            return sorted(
+                name for files in self._entries.values() for name in files
+            )
+
+
+class MangaCatalog:
+    """
+    已下载漫画的元数据目录（SQLite）
+    记录漫画ID、标题、作者、页数、文件大小、下载时间、最后发送时间与发送次数，
+    下载完成时写入，启动时根据已有PDF文件补录缺失的记录。
+    关闭后写入直接忽略、查询返回空结果，退出时仍在运行的下载与转换线程不会因连接已关闭而出错
+    """
+
+    def __init__(self, db_path: str) -> None:
+        """
+        打开（必要时创建）元数据目录
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        self.db_path: str = db_path
+        self._lock = threading.Lock()
+        self._closed: bool = False
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS albums (
+                    album_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL DEFAULT '',
+                    author TEXT NOT NULL DEFAULT '',
+                    page_count INTEGER NOT NULL DEFAULT 0,
+                    byte_size INTEGER NOT NULL DEFAULT 0,
+                    file_name TEXT NOT NULL,
+                    downloaded_at REAL NOT NULL,
+                    last_sent_at REAL,
+                    send_count INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_albums_file_name ON albums (file_name)"
+            )
+
+    def reconcile(self, files: List[Tuple[str, str]]) -> Tuple[int, int]:
+        """
+        与下载目录中已有的PDF文件对齐：补录目录中缺少的漫画（首次运行时即全部补录），
+        删除PDF已不存在的记录。补录的标题从文件名 {id}-{title}.pdf 中解析
+
+        Args:
+            files: (文件名, 文件路径) 列表
+
+        Returns:
+            Tuple[int, int]: (新增记录数, 删除记录数)
+        """
+        with self._lock:
+            if self._closed:
+                return 0, 0
+            known = {
+                album_id
+                for (album_id,) in self._conn.execute("SELECT album_id FROM albums")
+            }
+        rows = []
+        present = set()
+        for file_name, file_path in files:
+            manga_id = LibraryIndex.parse_manga_id(file_name)
+            if manga_id is None:
+                continue
+            present.add(manga_id)
+            # 已有记录的漫画不再读取文件信息，启动时只处理新增的文件
+            if manga_id in known:
+                continue
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            name_without_ext = os.path.splitext(file_name)[0]
+            title = name_without_ext.split("-", 1)[1] if "-" in name_without_ext else ""
+            rows.append((manga_id, title, stat.st_size, file_name, stat.st_mtime))
+        stale = [(album_id,) for album_id in known - present]
+        with self._lock:
+            if self._closed:
+                return 0, 0
+            with self._conn:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO albums "
+                    "(album_id, title, byte_size, file_name, downloaded_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                added = self._conn.total_changes - before
+                self._conn.executemany("DELETE FROM albums WHERE album_id = ?", stale)
+        return added, len(stale)
+
+    def record_download(
+        self,
+        album_id: str,
+        title: str,
+        author: str,
+        page_count: int,
+        byte_size: int,
+        file_name: str,
+    ) -> None:
+        """记录（或覆盖）一次完成的下载，发送统计保持不变"""
+        with self._lock:
+            if self._closed:
+                return
+            with self._conn:
+                self._conn.execute(
+                    """
+                    INSERT INTO albums
+                        (album_id, title, author, page_count, byte_size, file_name, downloaded_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(album_id) DO UPDATE SET
+                        title = excluded.title,
+                        author = excluded.author,
+                        page_count = excluded.page_count,
+                        byte_size = excluded.byte_size,
+                        file_name = excluded.file_name,
+                        downloaded_at = excluded.downloaded_at
+                    """,
+                    (album_id, title, author, page_count, byte_size, file_name, time.time()),
+                )
+
+    def record_send(self, album_id: str) -> None:
+        """记录一次发送"""
+        with self._lock:
+            if self._closed:
+                return
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE albums SET last_sent_at = ?, send_count = send_count + 1 "
+                    "WHERE album_id = ?",
+                    (time.time(), album_id),
+                )
+
+    def remove(self, album_id: str) -> None:
+        """删除漫画记录（PDF已被删除时调用）"""
+        with self._lock:
+            if self._closed:
+                return
+            with self._conn:
+                self._conn.execute("DELETE FROM albums WHERE album_id = ?", (album_id,))
+
+    def get(self, album_id: str) -> Optional[Dict[str, Any]]:
+        """
+        按漫画ID查询元数据
+
+        Returns:
+            Optional[Dict[str, Any]]: 元数据字典，不存在时返回None
+        """
+        with self._lock:
+            if self._closed:
+                return None
+            cursor = self._conn.execute(
+                "SELECT * FROM albums WHERE album_id = ?", (album_id,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def total_bytes(self) -> int:
+        """所有已下载漫画PDF的总大小（字节）"""
+        with self._lock:
+            if self._closed:
+                return 0
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(byte_size), 0) FROM albums"
+            ).fetchone()
+        return int(row[0])
+
+    def eviction_candidates(self, policy: str) -> List[Tuple[str, str, int]]:
+        """
+        按淘汰顺序列出漫画
+
+        Args:
+            policy: lru 按最后发送时间（从未发送过的按下载时间）从旧到新，
+                    lfu 按发送次数从少到多，次数相同时按最后使用时间
+
+        Returns:
+            List[Tuple[str, str, int]]: (漫画ID, 文件名, 文件大小) 列表
+        """
+        last_used = "COALESCE(last_sent_at, downloaded_at)"
+        if policy == "lfu":
+            order = f"send_count ASC, {last_used} ASC"
+        else:
+            order = f"{last_used} ASC"
+        with self._lock:
+            if self._closed:
+                return []
+            rows = self._conn.execute(
+                f"SELECT album_id, file_name, byte_size FROM albums ORDER BY {order}"
+            ).fetchall()
+        return [(row[0], row[1], int(row[2])) for row in rows]
+
+    def list_file_names(self) -> List[str]:
+        """所有已下载漫画的文件名（按文件名排序）"""
+        with self._lock:
+            if self._closed:
+                return []
+            rows = self._conn.execute(
+                "SELECT file_name FROM albums ORDER BY file_name"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        """关闭数据库连接，之后的写入直接忽略"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._conn.close()
+
+
+class DownloadJournal:
+    """
+    持久化的下载任务日志（SQLite，WAL模式）
+    任务入队时写入，阶段变化时更新，结束时删除；程序重启后据此恢复未完成的任务。
+    关闭后所有写入直接忽略，退出时仍在运行的下载与转换线程不会因连接已关闭而出错
+    """
+
+    def __init__(self, db_path: str) -> None:
+        """
+        打开（必要时创建）任务日志数据库
+
+        Args:
+            db_path: 数据库文件路径
+        """
+        self.db_path: str = db_path
+        self._lock = threading.Lock()
+        self._closed: bool = False
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS download_jobs (
+                    manga_id TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    resume_count INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS download_job_subscribers (
+                    manga_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    group_id TEXT NOT NULL DEFAULT '',
+                    private INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (manga_id, user_id, group_id, private)
+                )
+                """
+            )
+
+    def add_job(self, job: "DownloadJob") -> None:
+        """记录新入队的任务及其发起者"""
+        with self._lock:
+            if self._closed:
+                return
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO download_jobs "
+                    "(manga_id, stage, created_at, updated_at, resume_count) "
+                    "VALUES (?, ?, ?, ?, 0)",
+                    (job.manga_id, job.stage, job.created_at, time.time()),
+                )
+                self._conn.execute(
+                    "DELETE FROM download_job_subscribers WHERE manga_id = ?",
+                    (job.manga_id,),
+                )
+                for position, (user_id, group_id, private) in enumerate(job.subscribers):
+                    self._insert_subscriber(
+                        job.manga_id, user_id, group_id, private, position
+                    )
+
+    def _insert_subscriber(
+        self,
+        manga_id: str,
+        user_id: str,
+        group_id: Optional[str],
+        private: bool,
+        position: int,
+    ) -> None:
+        self._conn.execute(
+            "INSERT OR IGNORE INTO download_job_subscribers "
+            "(manga_id, user_id, group_id, private, position) VALUES (?, ?, ?, ?, ?)",
+            (manga_id, user_id, group_id or "", int(private), position),
+        )
+
+    def add_subscriber(
+        self, manga_id: str, user_id: str, group_id: Optional[str], private: bool
+    ) -> None:
+        """为已记录的任务追加一个等待者"""
+        with self._lock:
+            if self._closed:
+                return
+            with self._conn:
+                row = self._conn.execute(
+                    "SELECT COUNT(*) FROM download_job_subscribers WHERE manga_id = ?",
+                    (manga_id,),
+                ).fetchone()
+                self._insert_subscriber(manga_id, user_id, group_id, private, row[0])
+
+    def update_stage(self, manga_id: str, stage: str) -> None:
+        """更新任务所处的阶段"""
+        with self._lock:
+            if self._closed:
+                return
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE download_jobs SET stage = ?, updated_at = ? WHERE manga_id = ?",
+                    (stage, time.time(), manga_id),
+                )
+
+    def remove_job(self, manga_id: str) -> None:
+        """任务结束（成功或失败）后删除记录"""
+        with self._lock:
+            if self._closed:
+                return
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM download_jobs WHERE manga_id = ?", (manga_id,)
+                )
+                self._conn.execute(
+                    "DELETE FROM download_job_subscribers WHERE manga_id = ?", (manga_id,)
+                )
+
+    def load_pending(
+        self,
+    ) -> List[Tuple[str, str, float, int, List[Tuple[str, Optional[str], bool]]]]:
+        """
+        读取所有未完成的任务，并将已开始处理（不在排队阶段）的任务的恢复次数加一，
+        一直在排队、从未开始的任务不计入恢复次数
+
+        Returns:
+            List: 按入队时间排序的 (manga_id, stage, created_at, resume_count, subscribers)
+        """
+        pending = []
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT manga_id, stage, created_at, resume_count "
+                "FROM download_jobs ORDER BY created_at"
+            ).fetchall()
+            for manga_id, stage, created_at, resume_count in rows:
+                subscriber_rows = self._conn.execute(
+                    "SELECT user_id, group_id, private FROM download_job_subscribers "
+                    "WHERE manga_id = ? ORDER BY position",
+                    (manga_id,),
+                ).fetchall()
+                subscribers = [
+                    (user_id, group_id or None, bool(private))
+                    for user_id, group_id, private in subscriber_rows
+                ]
+                if stage != DownloadJob.STAGE_QUEUED:
+                    resume_count += 1
+                pending.append((manga_id, stage, created_at, resume_count, subscribers))
+            self._conn.execute(
+                "UPDATE download_jobs SET resume_count = resume_count + 1 "
+                "WHERE stage != ?",
+                (DownloadJob.STAGE_QUEUED,),
+            )
+        return pending
+
+    def close(self) -> None:
+        """关闭数据库连接，之后的写入直接忽略"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._conn.close()
+
+
 class MangaBot:
     # 机器人版本号
     VERSION = "2.3.12"
+    # 发送文件时在 FILE_ACTION_TIMEOUT 之外额外等待发送队列排队的时间（秒）
+    FILE_QUEUE_WAIT_SECONDS = 60
+    # 入队时获取的漫画详情的有效时间（秒），排队更久的任务在下载阶段重新获取
+    PREFETCHED_ALBUM_MAX_AGE_SECONDS = 1800
 
     def _parse_id_list(self, id_string: str) -> List[str]:
         """
@@ -193,6 +2532,65 @@ class MangaBot:
         ids = [id.strip() for id in id_string.split(",") if id.strip()]
         return ids
 
+    def _parse_group_weights(self, weight_string: str) -> Dict[str, int]:
+        """
+        解析群组权重配置，格式为 群号:权重，多个用逗号分隔，非法项忽略
+
+        Args:
+            weight_string: 群组权重配置字符串
+
+        Returns:
+            Dict[str, int]: {group_id: 权重}
+        """
+        weights: Dict[str, int] = {}
+        for item in self._parse_id_list(weight_string):
+            group_id, _, weight = item.partition(":")
+            if group_id.strip().isdigit() and weight.strip().isdigit():
+                weights[group_id.strip()] = max(1, int(weight))
+            else:
+                self.logger.warning(f"忽略非法的群组权重配置: {item}")
+        return weights
+
+    def _get_env_int(self, name: str, default: int, minimum: int = 0) -> int:
+        """
+        读取整数类型的环境变量，非法值回退到默认值
+
+        Args:
+            name: 环境变量名
+            default: 默认值
+            minimum: 允许的最小值，小于该值时取最小值
+
+        Returns:
+            解析后的整数
+        """
+        raw_value = os.getenv(name, "").strip()
+        if not raw_value:
+            return default
+        try:
+            value = int(raw_value)
+        except ValueError:
+            self.logger.warning(f"环境变量 {name}={raw_value} 不是有效整数，使用默认值 {default}")
+            return default
+        return max(value, minimum)
+
+    def _get_env_bool(self, name: str, default: bool) -> bool:
+        """
+        读取布尔类型的环境变量，支持 true/false、1/0、yes/no、on/off
+
+        Args:
+            name: 环境变量名
+            default: 未设置或非法值时的默认值
+
+        Returns:
+            解析后的布尔值
+        """
+        raw_value = os.getenv(name, "").strip().lower()
+        if raw_value in ("1", "true", "yes", "on"):
+            return True
+        if raw_value in ("0", "false", "no", "off"):
+            return False
+        return default
+
     def _check_user_permission(
         self, user_id: str, group_id: Optional[str] = None, private: bool = True
     ) -> bool:
@@ -243,39 +2641,98 @@ class MangaBot:
     def _start_download_queue_processor(self) -> None:
         """
         启动下载队列处理线程
-        该线程将不断从队列中取出下载任务并顺序执行
+        下载与PDF转换分为两个阶段，各自由独立线程处理，通过有界队列衔接，
+        上一个漫画转换PDF的同时，下一个漫画即可开始下载
         """
 
         def process_queue() -> None:
-            """下载队列处理函数，顺序执行队列中的下载任务"""
+            """下载阶段处理函数，执行队列中的下载任务并将结果交给转换阶段"""
             while self.queue_running:
                 try:
-                    # 从队列中获取下载任务，设置超时以便定期检查running标志
-                    task = self.download_queue.get(timeout=1)
-
-                    # 解包任务数据
-                    user_id, manga_id, group_id, private = task
+                    # 取任务与申请资源在同一把锁内完成，多个工作线程之间仍按队列的公平顺序放行
+                    with self.admission_lock:
+                        # 从队列中获取下载任务，设置超时以便定期检查running标志
+                        job = self.download_queue.get(timeout=1)
+
+                        # 启动恢复仍在删除该漫画的旧文件夹时放回队列，
+                        # 不占用资源预算与下载线程，其他漫画可以先开始
+                        with self.jobs_lock:
+                            deferred = job.manga_id in self.deleting_manga_ids
+                        if deferred:
+                            self.download_queue.put(job)
+                        else:
+                            # 漫画库超出容量上限时，先淘汰旧PDF腾出空间
+                            self._ensure_library_space()
+
+                            # 等待资源预算放行后再开始下载
+                            job.threads = min(
+                                int(self.config["JOB_MAX_THREADS"]),
+                                int(self.config["DOWNLOAD_THREAD_BUDGET"]),
+                            )
+                            while not self.resource_budget.acquire(
+                                job.manga_id, int(self.config["JOB_MEMORY_MB"]), job.threads
+                            ):
+                                if not self.queue_running:
+                                    # 已出队的任务只移出登记表，任务日志中的记录保留，下次启动时恢复
+                                    with self.jobs_lock:
+                                        if self.download_jobs.get(job.manga_id) is job:
+                                            del self.download_jobs[job.manga_id]
+                                    self.logger.info(
+                                        f"程序停止，漫画ID {job.manga_id} 的任务留待下次启动继续"
+                                    )
+                                    return
+
+                    if deferred:
+                        # 在锁外短暂等待删除完成，避免反复取出同一个任务空转
+                        self.logger.debug(
+                            f"漫画 {job.manga_id} 的旧文件夹正在清理，放回队列稍后下载"
+                        )
+                        with self.deletion_done:
+                            self.deletion_done.wait_for(
+                                lambda: job.manga_id not in self.deleting_manga_ids,
+                                timeout=1,
+                            )
+                        continue
 
                     # 执行下载任务
-                    self._process_download_task(user_id, manga_id, group_id, private)
-
-                    # 标记任务完成
-                    self.download_queue.task_done()
+                    self._process_download_task(job)
                 except queue.Empty:
                     # 队列为空，继续循环检查running标志
                     continue
                 except Exception as e:
                     self.logger.error(f"处理下载队列任务时出错: {e}")
-                    # 确保即使出错也标记任务完成，避免队列阻塞
+
+        def process_convert_queue() -> None:
+            """转换阶段处理函数，顺序将已下载的漫画转换为PDF"""
+            while self.queue_running:
+                try:
+                    job = self.convert_queue.get(timeout=1)
+                    self._process_convert_task(job)
+                    self.convert_queue.task_done()
+                except queue.Empty:
+                    continue
+                except Exception as e:
+                    self.logger.error(f"处理转换队列任务时出错: {e}")
                     try:
-                        self.download_queue.task_done()
+                        self.convert_queue.task_done()
                     except:
                         pass
 
         # 创建并启动队列处理线程，设置为守护线程
-        queue_thread = threading.Thread(target=process_queue, daemon=True)
-        queue_thread.start()
-        self.logger.info("下载队列处理线程已启动")
+        workers = int(self.config["DOWNLOAD_WORKERS"])
+        for index in range(workers):
+            queue_thread = threading.Thread(
+                target=process_queue, name=f"download-worker-{index}", daemon=True
+            )
+            queue_thread.start()
+        convert_thread = threading.Thread(target=process_convert_queue, daemon=True)
+        convert_thread.start()
+        self.logger.info(
+            f"下载队列处理线程已启动（{workers}个），PDF转换线程已启动 - "
+            f"内存预算: {self.config['DOWNLOAD_MEMORY_BUDGET_MB']}MB, "
+            f"线程预算: {self.config['DOWNLOAD_THREAD_BUDGET']}, "
+            f"单任务: {self.config['JOB_MEMORY_MB']}MB/{self.config['JOB_MAX_THREADS']}线程"
+        )
 
     def __init__(self) -> None:
         """初始化MangaBot机器人，添加跨平台兼容性检查"""
@@ -284,6 +2741,13 @@ class MangaBot:
         # 记录启动信息，包含版本号
         self.logger.info(f"JMComic QQ机器人 版本 {self.VERSION} 启动中...")
 
+        self.logger.info(f"模块加载耗时: {_EAGER_IMPORT_SECONDS * 1000:.0f}ms")
+        # 启动开始时间，首次连接成功时报告启动耗时
+        self.startup_started: Optional[float] = time.perf_counter()
+
+        # 检查运行所需的依赖是否已安装（不在运行中自动安装）
+        self._check_dependencies()
+
         # 检查操作系统兼容性
         self._check_platform_compatibility()
 
@@ -306,17 +2770,108 @@ class MangaBot:
             ws_url = base_ws_url
 
         # 获取下载路径配置
-        download_path = os.getenv("MANGA_DOWNLOAD_PATH", "./downloads")
-        # 处理Linux系统中的波浪号(~)路径，将其扩展为用户主目录
-        if download_path.startswith("~"):
-            download_path = os.path.expanduser(download_path)
-        # 将相对路径转换为绝对路径，确保父级目录引用能正确解析
-        absolute_download_path = os.path.abspath(download_path)
+        absolute_download_path = _resolve_download_path()
 
         self.config: Dict[str, Union[str, int]] = {
             "MANGA_DOWNLOAD_PATH": absolute_download_path,
             "NAPCAT_WS_URL": ws_url,  # 存储完整的WebSocket URL（可能包含token）
             "NAPCAT_TOKEN": token,  # 使用NAPCAT_TOKEN作为配置键
+            # PDF转换模式：stream为逐页流式写入（默认），pillow为旧版一次性保存
+            "PDF_WRITER_MODE": os.getenv("PDF_WRITER_MODE", "stream").strip().lower(),
+            # 流式模式下重新编码页面时使用的JPEG质量
+            "PDF_JPEG_QUALITY": self._get_env_int("PDF_JPEG_QUALITY", 90, minimum=1),
+            # 兼容的JPEG是否直接嵌入PDF而不重新编码
+            "PDF_JPEG_PASSTHROUGH": self._get_env_bool("PDF_JPEG_PASSTHROUGH", True),
+            # 页面处理进程数，0或1表示在当前进程中逐页处理
+            "PDF_CONVERT_WORKERS": self._get_env_int("PDF_CONVERT_WORKERS", 0),
+            # 页面最大宽度（像素），超过时等比缩小，0表示不缩放
+            "PDF_MAX_PAGE_WIDTH": self._get_env_int("PDF_MAX_PAGE_WIDTH", 0),
+            # 同时进行的下载任务数
+            "DOWNLOAD_WORKERS": self._get_env_int("DOWNLOAD_WORKERS", 1, minimum=1),
+            # 所有下载任务的内存总预算（MB）与单个任务预计占用的内存（MB）
+            "DOWNLOAD_MEMORY_BUDGET_MB": self._get_env_int(
+                "DOWNLOAD_MEMORY_BUDGET_MB", 384, minimum=1
+            ),
+            "JOB_MEMORY_MB": self._get_env_int("JOB_MEMORY_MB", 128, minimum=1),
+            # 所有下载任务的下载线程总预算与单个任务可使用的下载线程上限
+            "DOWNLOAD_THREAD_BUDGET": self._get_env_int(
+                "DOWNLOAD_THREAD_BUDGET", 30, minimum=1
+            ),
+            "JOB_MAX_THREADS": self._get_env_int("JOB_MAX_THREADS", 10, minimum=1),
+            # 每个用户最多同时排队的下载任务数，0表示不限制（管理员不受限制）
+            "MAX_QUEUED_PER_USER": self._get_env_int("MAX_QUEUED_PER_USER", 5),
+            # 是否根据下载速度与失败率自动调整每个任务的图片并发数
+            "ADAPTIVE_CONCURRENCY": self._get_env_bool("ADAPTIVE_CONCURRENCY", True),
+            # 下载转换完成后是否自动把PDF发送给所有请求者
+            "AUTO_SEND_ON_COMPLETE": self._get_env_bool("AUTO_SEND_ON_COMPLETE", False),
+            # 是否将下载队列持久化到下载目录下的SQLite数据库，重启后继续未完成的任务
+            "JOB_JOURNAL_ENABLED": self._get_env_bool("JOB_JOURNAL_ENABLED", True),
+            # 单个任务最多被恢复的次数，超过后放弃（防止某个任务反复导致崩溃）
+            "JOB_MAX_RESUMES": self._get_env_int("JOB_MAX_RESUMES", 3, minimum=1),
+            # 中断的漫画文件夹最长保留时间（小时）与总大小上限（MB），超出部分启动时删除
+            "PARTIAL_MAX_AGE_HOURS": self._get_env_int("PARTIAL_MAX_AGE_HOURS", 72),
+            "PARTIAL_MAX_TOTAL_MB": self._get_env_int("PARTIAL_MAX_TOTAL_MB", 2048),
+            # 漫画库PDF总大小上限（MB），0表示不限制；超出时在新任务开始前淘汰旧PDF
+            "LIBRARY_QUOTA_MB": self._get_env_int("LIBRARY_QUOTA_MB", 0),
+            # 每个进行中的任务预留的磁盘空间（MB），淘汰时一并计入
+            "JOB_DISK_RESERVE_MB": self._get_env_int("JOB_DISK_RESERVE_MB", 256),
+            # 淘汰策略：lru 按最后发送时间，lfu 按发送次数
+            "EVICTION_POLICY": os.getenv("EVICTION_POLICY", "lru").strip().lower(),
+            # 漫画库目录布局：flat 全部放在下载目录下，sharded 按漫画ID分到256个子目录
+            "LIBRARY_LAYOUT": os.getenv("LIBRARY_LAYOUT", "flat").strip().lower(),
+            # 启动恢复模式：background 连接后后台进行，sync 启动时同步进行，off 关闭
+            "STARTUP_RECOVERY": os.getenv("STARTUP_RECOVERY", "background").strip().lower(),
+            # 启动恢复时并行扫描目录的线程数（分片布局下有效）
+            "RECOVERY_SCAN_WORKERS": self._get_env_int(
+                "RECOVERY_SCAN_WORKERS", 8, minimum=1
+            ),
+            # 后台清理每秒最多删除的文件数，0表示不限速
+            "RECOVERY_DELETE_FILES_PER_SECOND": self._get_env_int(
+                "RECOVERY_DELETE_FILES_PER_SECOND", 200
+            ),
+            # 事件处理线程数与每个线程的队列长度
+            "EVENT_WORKERS": self._get_env_int("EVENT_WORKERS", 4, minimum=1),
+            "EVENT_QUEUE_SIZE": self._get_env_int("EVENT_QUEUE_SIZE", 100, minimum=1),
+            # 事件队列满时接收线程最长等待时间（秒），超时后丢弃该事件
+            "EVENT_BACKPRESSURE_SECONDS": self._get_env_int(
+                "EVENT_BACKPRESSURE_SECONDS", 2
+            ),
+            # 发送PDF文件的线程数
+            "SEND_WORKERS": self._get_env_int("SEND_WORKERS", 2, minimum=1),
+            # 等待NapCat响应动作（发送消息）的超时时间（秒）
+            "ACTION_TIMEOUT": self._get_env_int("ACTION_TIMEOUT", 10, minimum=1),
+            # 等待NapCat响应文件发送的超时时间（秒），大文件上传需要更长时间
+            "FILE_ACTION_TIMEOUT": self._get_env_int("FILE_ACTION_TIMEOUT", 120, minimum=1),
+            # 发送限流：全局与每个群/私聊每分钟最多发送的消息数，以及允许的突发数量
+            "OUTBOUND_GLOBAL_PER_MINUTE": self._get_env_int("OUTBOUND_GLOBAL_PER_MINUTE", 120),
+            "OUTBOUND_GLOBAL_BURST": self._get_env_int("OUTBOUND_GLOBAL_BURST", 10, minimum=1),
+            "OUTBOUND_TARGET_PER_MINUTE": self._get_env_int("OUTBOUND_TARGET_PER_MINUTE", 20),
+            "OUTBOUND_TARGET_BURST": self._get_env_int("OUTBOUND_TARGET_BURST", 3, minimum=1),
+            # 同一目标的文本消息等待合并的时间（毫秒），0表示不等待
+            "OUTBOUND_COALESCE_MS": self._get_env_int("OUTBOUND_COALESCE_MS", 300),
+            # 被限流或超时时的最大重试次数
+            "OUTBOUND_MAX_RETRIES": self._get_env_int("OUTBOUND_MAX_RETRIES", 3),
+            # 发送线程数（文件上传较慢，多个线程避免阻塞其他目标的消息）
+            "OUTBOUND_SENDERS": self._get_env_int("OUTBOUND_SENDERS", 2, minimum=1),
+            # WebSocket断线重连的首次等待时间与最长等待时间（秒），按带抖动的指数退避增长
+            "RECONNECT_BASE_SECONDS": self._get_env_int("RECONNECT_BASE_SECONDS", 1, minimum=1),
+            "RECONNECT_MAX_SECONDS": self._get_env_int("RECONNECT_MAX_SECONDS", 30, minimum=1),
+            # 断线期间最多缓存的待发送消息数，超出后新消息直接失败
+            "OUTBOUND_BUFFER_LIMIT": self._get_env_int("OUTBOUND_BUFFER_LIMIT", 500, minimum=1),
+            # 去重记录的消息ID数量与有效时间（秒）
+            "EVENT_DEDUP_SIZE": self._get_env_int("EVENT_DEDUP_SIZE", 2048, minimum=1),
+            "EVENT_DEDUP_TTL_SECONDS": self._get_env_int(
+                "EVENT_DEDUP_TTL_SECONDS", 600, minimum=1
+            ),
+            # 命令限流：每个用户、每个群与全局每分钟可处理的命令数与突发数量，0表示不限制
+            "COMMAND_USER_PER_MINUTE": self._get_env_int("COMMAND_USER_PER_MINUTE", 6),
+            "COMMAND_USER_BURST": self._get_env_int("COMMAND_USER_BURST", 3, minimum=1),
+            "COMMAND_GROUP_PER_MINUTE": self._get_env_int("COMMAND_GROUP_PER_MINUTE", 20),
+            "COMMAND_GROUP_BURST": self._get_env_int("COMMAND_GROUP_BURST", 8, minimum=1),
+            "COMMAND_GLOBAL_PER_MINUTE": self._get_env_int("COMMAND_GLOBAL_PER_MINUTE", 60),
+            "COMMAND_GLOBAL_BURST": self._get_env_int("COMMAND_GLOBAL_BURST", 20, minimum=1),
+            # 运行模式：threaded 为多线程WebSocket客户端，asyncio 由事件循环负责连接与事件分发（需要websockets库）
+            "RUNTIME_MODE": os.getenv("RUNTIME_MODE", "threaded").strip().lower(),
         }
 
         # 初始化属性
@@ -325,16 +2880,135 @@ class MangaBot:
         self.downloading_mangas: Dict[str, bool] = (
             {}
         )  # 跟踪正在下载的漫画 {manga_id: True}
-        # 初始化下载队列，用于顺序处理下载任务
-        # 队列中的元素是元组(user_id: str, manga_id: str, group_id: str, private: bool)
-        self.download_queue: queue.Queue = queue.Queue()
+        # 初始化下载队列，各群与各私聊用户之间按权重轮流出队
+        # 队列中的元素是DownloadJob对象
+        # 同一用户的任务按页数短任务优先，等待越久优先度越高
+        self.download_queue = FairDownloadQueue(
+            self._parse_group_weights(os.getenv("GROUP_WEIGHTS", "")),
+            self._get_env_int("SJF_AGING_PAGES_PER_MINUTE", 50),
+        )
+        # 入队后获取漫画页数的线程池
+        self.metadata_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="album-metadata"
+        )
+        # 平均每页的下载耗时（秒），根据已完成的任务更新，用于估算开始时间
+        self.seconds_per_page: float = 1.0
+        # 下载阶段与转换阶段之间的有界交接队列，转换积压时下载阶段会等待
+        self.convert_queue: queue.Queue = queue.Queue(
+            maxsize=self._get_env_int("CONVERT_QUEUE_SIZE", 2, minimum=1)
+        )
         # 下载队列线程控制标志，用于安全地停止队列处理线程
         self.queue_running: bool = True
-        # 跟踪队列中的下载任务
-        # 格式: {manga_id: (user_id, group_id, private)}
-        self.queued_tasks: Dict[str, Tuple[str, Optional[str], bool]] = {}
-        # 启动下载队列处理线程
-        self._start_download_queue_processor()
+        # 跟踪所有未完成的下载任务（包括排队、下载、转换阶段）
+        # 格式: {manga_id: DownloadJob}
+        self.download_jobs: Dict[str, DownloadJob] = {}
+        # 保护任务登记表，保证同一漫画ID只会创建一个下载任务
+        self.jobs_lock = threading.Lock()
+        # 启动恢复正在删除其文件夹的漫画ID，同ID的下载要等删除完成后才能开始
+        self.deleting_manga_ids: Set[str] = set()
+        self.deletion_done = threading.Condition(self.jobs_lock)
+        # 下载任务资源预算，控制并发下载任务的内存与线程占用
+        self.resource_budget = ResourceBudget(
+            int(self.config["DOWNLOAD_MEMORY_BUDGET_MB"]),
+            int(self.config["DOWNLOAD_THREAD_BUDGET"]),
+        )
+        self.admission_lock = threading.Lock()
+        # 正在发送中的PDF引用计数 {pdf_path: count}，淘汰时跳过这些文件
+        # 发送开始与淘汰删除都在library_lock内进行，避免删除正要发送的文件
+        self.sending_files: Dict[str, int] = {}
+        self.library_lock = threading.Lock()
+        # 固定保留、永不淘汰的漫画ID
+        self.pinned_manga_ids: List[str] = self._parse_id_list(
+            os.getenv("PINNED_MANGA_IDS", "")
+        )
+        if self.config["EVICTION_POLICY"] not in ("lru", "lfu"):
+            self.logger.warning(
+                f"未知的淘汰策略 {self.config['EVICTION_POLICY']}，使用 lru"
+            )
+            self.config["EVICTION_POLICY"] = "lru"
+        # 事件分发线程池：WebSocket接收线程只负责解析并分发，命令在这些线程中处理
+        self.event_dispatcher = EventDispatcher(
+            "event",
+            int(self.config["EVENT_WORKERS"]),
+            int(self.config["EVENT_QUEUE_SIZE"]),
+            int(self.config["EVENT_BACKPRESSURE_SECONDS"]),
+        )
+        # PDF发送线程池，发送耗时较长，与命令处理分开，避免阻塞同一线程上的其他会话
+        self.send_dispatcher = EventDispatcher(
+            "send",
+            int(self.config["SEND_WORKERS"]),
+            int(self.config["EVENT_QUEUE_SIZE"]),
+            0,
+        )
+        # 等待NapCat响应的动作 {echo: Future}，收到带echo的响应时完成对应的Future
+        self.pending_actions: Dict[str, concurrent.futures.Future] = {}
+        self.pending_actions_lock = threading.Lock()
+        self.action_counter = itertools.count(1)
+        # 发送队列：所有消息与文件经限流、合并后按目标顺序发送
+        self.outbound = OutboundScheduler(
+            self.call_action,
+            TokenBucket(
+                int(self.config["OUTBOUND_GLOBAL_PER_MINUTE"]) / 60,
+                int(self.config["OUTBOUND_GLOBAL_BURST"]),
+            ),
+            int(self.config["OUTBOUND_TARGET_PER_MINUTE"]) / 60,
+            int(self.config["OUTBOUND_TARGET_BURST"]),
+            int(self.config["OUTBOUND_COALESCE_MS"]) / 1000,
+            int(self.config["OUTBOUND_MAX_RETRIES"]),
+            int(self.config["OUTBOUND_SENDERS"]),
+            buffer_limit=int(self.config["OUTBOUND_BUFFER_LIMIT"]),
+        )
+        # 命令限流器，在handle_event中处理命令之前检查
+        self.command_limiter = CommandRateLimiter(
+            (
+                int(self.config["COMMAND_USER_PER_MINUTE"]) / 60,
+                int(self.config["COMMAND_USER_BURST"]),
+            ),
+            (
+                int(self.config["COMMAND_GROUP_PER_MINUTE"]) / 60,
+                int(self.config["COMMAND_GROUP_BURST"]),
+            ),
+            (
+                int(self.config["COMMAND_GLOBAL_PER_MINUTE"]) / 60,
+                int(self.config["COMMAND_GLOBAL_BURST"]),
+            ),
+        )
+        # WebSocket连接监督线程与连接统计
+        self.connection_thread: Optional[threading.Thread] = None
+        self.connection_lock = threading.Lock()
+        self.connection_stopping: bool = False
+        self.connection_stats: Dict[str, Any] = {
+            "state": "disconnected",
+            "connects": 0,
+            "disconnects": 0,
+            "last_connected_at": None,
+            "last_disconnected_at": None,
+            "downtime_seconds": 0.0,
+            "last_error": None,
+        }
+        # 本次连接建立（on_open）的时间（time.monotonic()），未建立时为None，用于判断连接是否稳定
+        self.connection_opened_at: Optional[float] = None
+        # 最近处理过的消息ID，丢弃重连后重新投递的重复事件
+        self.recent_events = RecentIdCache(
+            int(self.config["EVENT_DEDUP_SIZE"]),
+            int(self.config["EVENT_DEDUP_TTL_SECONDS"]),
+        )
+        # 接收WebSocket消息的线程，在该线程中发送动作时不能等待响应
+        self.receive_thread_id: Optional[int] = None
+        # 各下载任务共享的jmcomic下载选项与客户端 (option.yml修改时间, 选项, 客户端)
+        self.jm_shared: Optional[Tuple[float, Any, Any]] = None
+        self.jm_option_lock = threading.Lock()
+        # asyncio运行模式下的事件循环、WebSocket连接与阻塞任务线程池（见 _run_async）
+        self.async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.async_ws: Any = None
+        self.async_stopping: bool = False
+        # 等待处理的事件数（asyncio模式），超过上限时丢弃新事件
+        self.async_pending_events: int = 0
+        # 各会话待处理的事件队列（asyncio模式），会话处理完后移除
+        self.async_conversations: Dict[str, Deque[Dict[str, Any]]] = {}
+        # PDF页面处理进程池，按需创建
+        self.convert_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self.convert_pool_lock = threading.Lock()
 
         # 初始化黑白名单配置
         self.group_whitelist: List[str] = self._parse_id_list(
@@ -346,6 +3020,12 @@ class MangaBot:
         self.global_blacklist: List[str] = self._parse_id_list(
             os.getenv("GLOBAL_BLACKLIST", "")
         )
+        # 管理员：可以调整群组队列权重，且不受每人排队任务数限制
+        self.admin_ids: List[str] = self._parse_id_list(os.getenv("ADMIN_IDS", ""))
+        self.logger.info(
+            f"管理员: {len(self.admin_ids)}个, 下载队列群组权重: "
+            f"{self.download_queue.weights_snapshot() or '全部为1'}"
+        )
 
         # 记录黑白名单配置信息
         self.logger.info(
@@ -360,54 +3040,411 @@ class MangaBot:
         self.command_parser = CommandParser()
         self.logger.info("命令解析器初始化完成")
 
-        # 清理下载失败的文件
-        self.cleanup_failed_downloads()
+        # 构建已下载漫画的内存索引
+        index_start = time.perf_counter()
+        # 漫画库目录布局，所有漫画文件路径都通过它计算
+        layout_mode = str(self.config["LIBRARY_LAYOUT"])
+        if layout_mode not in LibraryLayout.LAYOUTS:
+            self.logger.warning(f"未知的漫画库目录布局 {layout_mode}，使用 flat")
+            layout_mode = "flat"
+        self.library_layout = LibraryLayout(
+            str(self.config["MANGA_DOWNLOAD_PATH"]), layout_mode
+        )
+        misplaced = self.library_layout.misplaced_items()
+        if misplaced:
+            self.logger.warning(
+                f"有 {len(misplaced)} 个漫画文件不在 {layout_mode} 布局的位置上，将不会被识别，"
+                f"请先运行 python bot.py --migrate-layout {layout_mode} 迁移"
+            )
+        self.library_index = LibraryIndex(self.library_layout)
+        pdf_count = self.library_index.build()
+        self.logger.info(
+            f"漫画库索引构建完成 - PDF文件: {pdf_count} 个, "
+            f"耗时: {time.perf_counter() - index_start:.2f}秒"
+        )
+
+        # 任务日志与元数据目录共用下载目录下的同一个数据库文件
+        db_path = os.path.join(str(self.config["MANGA_DOWNLOAD_PATH"]), ".mangabot.db")
+
+        # 打开漫画元数据目录，并根据已有PDF补录缺失的记录
+        self.catalog: Optional[MangaCatalog] = None
+        try:
+            self.catalog = MangaCatalog(db_path)
+            added, removed = self.catalog.reconcile(
+                [
+                    item
+                    for manga_id in self.library_index.manga_ids()
+                    for item in self.library_index.lookup(manga_id)
+                ]
+            )
+            if added or removed:
+                self.logger.info(
+                    f"漫画元数据目录已与下载目录对齐：补录 {added} 条，删除 {removed} 条"
+                )
+        except sqlite3.Error as e:
+            self.logger.error(f"打开漫画元数据目录失败，列表与查询将直接使用文件索引: {e}")
+            self.catalog = None
+
+        # 打开持久化任务日志，并恢复上次运行未完成的下载任务
+        self.journal: Optional[DownloadJournal] = None
+        if self.config["JOB_JOURNAL_ENABLED"]:
+            try:
+                self.journal = DownloadJournal(db_path)
+                self._resume_journal_jobs()
+            except sqlite3.Error as e:
+                self.logger.error(f"打开下载任务日志失败，本次运行不持久化任务: {e}")
+                self.journal = None
+
+        # 启动恢复：清理下载失败的文件（已恢复任务的文件夹会被保留，继续下载）
+        # 后台模式在连接WebSocket之后进行，见 run()
+        if self.config["STARTUP_RECOVERY"] not in ("background", "sync", "off"):
+            self.logger.warning(
+                f"未知的启动恢复模式 {self.config['STARTUP_RECOVERY']}，使用 background"
+            )
+            self.config["STARTUP_RECOVERY"] = "background"
+        self.deletion_queue: queue.Queue = queue.Queue()
+        self._start_deletion_worker()
+        if self.config["STARTUP_RECOVERY"] != "background":
+            self._start_startup_recovery()
+
+        # 漫画库、元数据目录与任务日志都就绪后再启动下载队列处理线程，
+        # 恢复的任务与重新连接后收到的请求不会访问尚未初始化的属性
+        self._start_download_queue_processor()
+
+        self.logger.info(
+            f"初始化完成，耗时: {(time.perf_counter() - self.startup_started) * 1000:.0f}ms"
+        )
+
+    def _resume_journal_jobs(self) -> None:
+        """
+        从任务日志恢复上次运行未完成的下载任务
+        已存在PDF的任务直接丢弃；恢复次数超过上限的任务通知请求者后放弃。
+        jmcomic默认跳过已存在的图片文件，因此恢复的任务只会下载缺少的页面
+        """
+        if self.journal is None:
+            return
+
+        resumed_count = 0
+        for manga_id, stage, created_at, resume_count, subscribers in (
+            self.journal.load_pending()
+        ):
+            if self.library_index.contains(manga_id):
+                self.logger.info(f"漫画ID {manga_id} 的PDF已存在，移除残留的任务记录")
+                self.journal.remove_job(manga_id)
+                continue
+            if resume_count > int(self.config["JOB_MAX_RESUMES"]):
+                self.logger.warning(
+                    f"漫画ID {manga_id} 已恢复 {resume_count - 1} 次仍未完成，放弃该任务"
+                )
+                self.journal.remove_job(manga_id)
+                continue
+
+            if subscribers:
+                user_id, group_id, private = subscribers[0]
+                job = DownloadJob(user_id, manga_id, group_id, private)
+                for subscriber in subscribers[1:]:
+                    job.add_subscriber(*subscriber)
+            else:
+                job = DownloadJob.without_subscribers(manga_id)
+            job.created_at = created_at
+
+            # 重新入队的任务在日志中恢复为排队阶段，开始下载前再次重启不会重复计入恢复次数
+            self.journal.update_stage(manga_id, DownloadJob.STAGE_QUEUED)
+            self.download_jobs[manga_id] = job
+            self._enqueue_job(job)
+            resumed_count += 1
+            self.logger.info(
+                f"恢复未完成的下载任务: {manga_id}（上次阶段: {stage}，第{resume_count}次恢复）"
+            )
+
+        if resumed_count:
+            self.logger.info(f"共恢复 {resumed_count} 个未完成的下载任务")
+
+    def _start_startup_recovery(self) -> None:
+        """
+        按 STARTUP_RECOVERY 配置启动下载目录的启动恢复（清理失败的下载、继续中断的下载）
+        - background: 机器人开始接收命令后在后台线程中进行，删除操作交给限速的删除线程
+        - sync: 在启动过程中同步完成（旧行为）
+        - off: 不进行启动恢复
+        """
+        mode = str(self.config["STARTUP_RECOVERY"])
+        if mode == "off":
+            self.logger.info("已关闭启动恢复，跳过下载目录清理")
+            return
+        if mode == "sync":
+            self.cleanup_failed_downloads(background=False)
+            return
+        threading.Thread(
+            target=self.cleanup_failed_downloads,
+            kwargs={"background": True},
+            name="startup-recovery",
+            daemon=True,
+        ).start()
+
+    def _scan_recovery_dir(
+        self, scan_dir: str
+    ) -> Tuple[List[Tuple[str, str, str]], List[Tuple[float, str, str]]]:
+        """
+        用os.scandir扫描一个存放漫画文件的目录，找出需要清理的项目与中断的漫画文件夹
+
+        参数:
+            scan_dir: 目录路径
+
+        返回:
+            Tuple[List[Tuple[str, str, str]], List[Tuple[float, str, str]]]:
+                (需要删除的 [(说明, 名称, 路径)], 中断的漫画文件夹 [(清单更新时间, 名称, 路径)])
+        """
+        to_delete: List[Tuple[str, str, str]] = []
+        partial_dirs: List[Tuple[float, str, str]] = []
+        with os.scandir(scan_dir) as scanner:
+            entries = list(scanner)
+        # 同一目录下的文件名集合，用于判断漫画文件夹是否已有对应的PDF
+        names = {entry.name for entry in entries}
+
+        for entry in entries:
+            item = entry.name
+            # 分片目录本身不是漫画文件夹
+            if LibraryLayout.is_shard_name(item):
+                continue
+
+            id_match = _MANGA_ID_PREFIX.match(item)
+            # 属于未完成任务（如重启后恢复的任务）的文件夹和文件保留，继续下载时复用
+            if id_match and id_match.group(1) in self.download_jobs:
+                self.logger.info(f"保留未完成任务的文件: {item}")
+                continue
+
+            # 检查是否为以数字ID开头、还没有对应PDF的漫画文件夹
+            if entry.is_dir():
+                if id_match and f"{item}.pdf" not in names:
+                    # 有页面清单的文件夹是中断的下载，稍后按保留规则处理
+                    manifest = AlbumManifest(entry.path)
+                    if manifest.exists():
+                        partial_dirs.append((manifest.last_modified(), item, entry.path))
+                    else:
+                        # 没有对应的PDF文件，说明下载或转换失败
+                        to_delete.append(("下载失败的漫画文件夹", item, entry.path))
+
+            # 检查是否为文件
+            elif entry.is_file():
+                # 临时文件与以数字开头的非PDF文件（可能是下载失败的文件）
+                if item.endswith(".tmp") or item.endswith(".temp"):
+                    to_delete.append(("临时文件", item, entry.path))
+                elif id_match and not item.endswith(".pdf"):
+                    to_delete.append(("下载失败的文件", item, entry.path))
+        return to_delete, partial_dirs
 
-    def cleanup_failed_downloads(self) -> None:
+    def cleanup_failed_downloads(self, background: bool = False) -> None:
         """
         清理下载目录中下载失败的文件和文件夹
-        - 删除未转换为PDF的漫画文件夹
+        - 带页面清单的中断漫画文件夹在期限与总大小限制内保留，并自动继续下载
+        - 删除其余未转换为PDF的漫画文件夹
         - 删除临时文件
+        分片布局下多个分片目录并行扫描
+
+        参数:
+            background: 为True时删除操作交给限速的删除线程，不阻塞调用者
         """
         download_path = str(self.config["MANGA_DOWNLOAD_PATH"])
         self.logger.info(f"开始清理下载目录: {download_path}")
+        start_time = time.perf_counter()
 
-        if not os.path.exists(download_path):
+        scan_dirs = self.library_layout.scan_dirs()
+        if not scan_dirs:
             self.logger.info("下载目录不存在，跳过清理")
             return
 
-        cleaned_count = 0
+        to_delete: List[Tuple[str, str, str]] = []
+        # 中断的漫画文件夹 [(清单更新时间, 文件夹名, 文件夹路径)]
+        partial_dirs: List[Tuple[float, str, str]] = []
+        scan_workers = min(len(scan_dirs), int(self.config["RECOVERY_SCAN_WORKERS"]))
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=scan_workers, thread_name_prefix="recovery-scan"
+        ) as executor:
+            for dir_delete, dir_partial in executor.map(self._scan_recovery_dir, scan_dirs):
+                to_delete.extend(dir_delete)
+                partial_dirs.extend(dir_partial)
+
+        # 从最近中断的开始保留，超过保留期限或总大小上限的文件夹删除
+        max_age = int(self.config["PARTIAL_MAX_AGE_HOURS"]) * 3600
+        max_total = int(self.config["PARTIAL_MAX_TOTAL_MB"]) * 1024 * 1024
+        kept_size = 0
+        resumed_ids: List[str] = []
+        for modified_at, item, item_path in sorted(partial_dirs, reverse=True):
+            dir_size = _get_dir_size(item_path)
+            expired = time.time() - modified_at > max_age
+            if expired or kept_size + dir_size > max_total:
+                to_delete.append(("超出保留期限或大小上限的中断漫画文件夹", item, item_path))
+                continue
+            kept_size += dir_size
+            resumed_ids.append(_MANGA_ID_PREFIX.match(item).group(1))
+
+        self.logger.info(
+            f"下载目录扫描完成 - 目录: {len(scan_dirs)} 个, 待清理: {len(to_delete)} 个, "
+            f"耗时: {time.perf_counter() - start_time:.2f}秒"
+        )
+
+        if background:
+            for reason, item, item_path in to_delete:
+                self.deletion_queue.put((reason, item, item_path))
+        else:
+            cleaned_count = sum(
+                1 for reason, item, item_path in to_delete
+                if self._delete_recovery_item(reason, item, item_path, throttle=False)
+            )
+            self.logger.info(f"下载目录清理完成，共清理 {cleaned_count} 个项目")
 
-        # 遍历下载目录
-        for item in os.listdir(download_path):
-            item_path = os.path.join(download_path, item)
+        for manga_id in resumed_ids:
+            self._enqueue_partial_album(manga_id)
+        if resumed_ids:
+            self.logger.info(
+                f"保留 {len(resumed_ids)} 个中断的漫画文件夹"
+                f"（{kept_size / 1024 / 1024:.1f}MB），已加入下载队列继续下载"
+            )
 
-            # 检查是否为漫画文件夹（以数字ID开头）
-            if os.path.isdir(item_path):
-                # 检查文件夹名是否以数字开头（漫画ID）
-                if re.match(r"^\d+", item):
-                    # 检查是否有对应的PDF文件
-                    pdf_file = os.path.join(download_path, f"{item}.pdf")
-                    if not os.path.exists(pdf_file):
-                        # 没有对应的PDF文件，说明下载或转换失败
-                        self.logger.info(f"清理下载失败的漫画文件夹: {item}")
-                        shutil.rmtree(item_path)
+    def _start_deletion_worker(self) -> None:
+        """启动后台删除线程，按 RECOVERY_DELETE_FILES_PER_SECOND 限速删除启动恢复找出的项目"""
+
+        def process_deletion_queue() -> None:
+            cleaned_count = 0
+            while self.queue_running:
+                try:
+                    reason, item, item_path = self.deletion_queue.get(timeout=1)
+                except queue.Empty:
+                    if cleaned_count:
+                        self.logger.info(f"后台清理完成，共清理 {cleaned_count} 个项目")
+                        cleaned_count = 0
+                    continue
+                try:
+                    if self._delete_recovery_item(reason, item, item_path, throttle=True):
                         cleaned_count += 1
+                except Exception as e:
+                    self.logger.error(f"后台清理 {item} 时出错: {e}")
+                finally:
+                    self.deletion_queue.task_done()
 
-            # 检查是否为文件
-            elif os.path.isfile(item_path):
-                # 检查是否为临时文件
-                if item.endswith(".tmp") or item.endswith(".temp"):
-                    self.logger.info(f"清理临时文件: {item}")
-                    os.remove(item_path)
-                    cleaned_count += 1
-                # 检查是否为以数字开头的非PDF文件（可能是下载失败的文件）
-                elif re.match(r"^\d+", item) and not item.endswith(".pdf"):
-                    self.logger.info(f"清理下载失败的文件: {item}")
-                    os.remove(item_path)
-                    cleaned_count += 1
+        threading.Thread(
+            target=process_deletion_queue, name="recovery-deleter", daemon=True
+        ).start()
+
+    def _delete_recovery_item(
+        self, reason: str, item: str, item_path: str, throttle: bool
+    ) -> bool:
+        """
+        删除启动恢复找出的一个文件或文件夹，期间被重新请求下载的漫画跳过
+
+        参数:
+            reason: 删除原因（用于日志）
+            item: 文件或文件夹名
+            item_path: 路径
+            throttle: 是否按配置限速逐个删除文件
 
-        self.logger.info(f"下载目录清理完成，共清理 {cleaned_count} 个项目")
+        返回:
+            bool: 是否已删除
+        """
+        manga_id = _MANGA_ID_PREFIX.match(item)
+        manga_id = manga_id.group(1) if manga_id else None
+        with self.jobs_lock:
+            if manga_id and manga_id in self.download_jobs:
+                self.logger.info(f"漫画已重新加入下载任务，跳过清理: {item}")
+                return False
+            # 删除期间重新请求的同ID任务出队时会被放回队列，不会写入正在删除的文件夹
+            if manga_id:
+                self.deleting_manga_ids.add(manga_id)
+        try:
+            return self._remove_recovery_path(reason, item, item_path, throttle)
+        finally:
+            if manga_id:
+                with self.deletion_done:
+                    self.deleting_manga_ids.discard(manga_id)
+                    self.deletion_done.notify_all()
+
+    def _remove_recovery_path(
+        self, reason: str, item: str, item_path: str, throttle: bool
+    ) -> bool:
+        """删除启动恢复找出的文件或文件夹，参数与返回值同 _delete_recovery_item"""
+        if not os.path.lexists(item_path):
+            return False
+
+        self.logger.info(f"清理{reason}: {item}")
+        rate = int(self.config["RECOVERY_DELETE_FILES_PER_SECOND"]) if throttle else 0
+        if not os.path.isdir(item_path):
+            os.remove(item_path)
+            if rate:
+                time.sleep(1 / rate)
+            return True
+        if not rate:
+            shutil.rmtree(item_path)
+            return True
+        # 自底向上逐个删除文件，限制每秒删除的文件数，避免大量删除占满磁盘IO
+        for root, dirs, files in os.walk(item_path, topdown=False):
+            for file_name in files:
+                os.remove(os.path.join(root, file_name))
+                time.sleep(1 / rate)
+            for dir_name in dirs:
+                os.rmdir(os.path.join(root, dir_name))
+        os.rmdir(item_path)
+        return True
+
+    def _enqueue_partial_album(self, manga_id: str) -> None:
+        """
+        将中断的漫画加入下载队列继续下载，该任务没有请求者，完成时不发送通知
+        之后有用户请求同一漫画时会加入该任务的通知列表
+
+        参数:
+            manga_id: 漫画ID
+        """
+        with self.jobs_lock:
+            if manga_id in self.download_jobs:
+                return
+            job = DownloadJob.without_subscribers(manga_id)
+            self.download_jobs[manga_id] = job
+            if self.journal is not None:
+                try:
+                    self.journal.add_job(job)
+                except sqlite3.Error as e:
+                    self.logger.warning(f"写入任务日志失败: {e}")
+        self._enqueue_job(job)
+        self.logger.info(f"中断的漫画 {manga_id} 已加入下载队列继续下载")
+
+    def _check_dependencies(self) -> None:
+        """检查运行所需的第三方库是否已安装，缺少时提示安装命令并退出"""
+        import importlib.util
+
+        missing = [
+            package
+            for module, package in REQUIRED_MODULES.items()
+            if importlib.util.find_spec(module) is None
+        ]
+        if missing:
+            self.logger.critical(
+                f"缺少依赖: {', '.join(missing)}，请先运行 pip install -r requirements.txt"
+            )
+            sys.exit(1)
+
+    def _warm_up_imports(self) -> None:
+        """在后台预先导入jmcomic与PIL，并在日志中报告导入耗时"""
+        try:
+            import_started = time.perf_counter()
+            _get_manifest_downloader()
+            jmcomic_seconds = time.perf_counter() - import_started
+
+            import_started = time.perf_counter()
+            from PIL import Image  # noqa: F401
+
+            pil_seconds = time.perf_counter() - import_started
+            self.logger.info(
+                f"后台预热完成 - jmcomic: {jmcomic_seconds * 1000:.0f}ms, "
+                f"PIL: {pil_seconds * 1000:.0f}ms"
+            )
+        except Exception as e:
+            self.logger.error(f"后台预热模块失败: {e}")
+            return
+
+        # 预先创建共享客户端（域名探测、登录等只在这里进行一次）
+        try:
+            self._get_shared_jm_option()
+        except Exception as e:
+            self.logger.warning(f"预先创建jmcomic共享客户端失败，将在首个下载任务时重试: {e}")
 
     def _check_platform_compatibility(self) -> None:
         """检查操作系统兼容性，确保在Linux和Windows上都能正常运行"""
@@ -554,8 +3591,21 @@ class MangaBot:
         message: str,
         group_id: Optional[str] = None,
         private: bool = True,
-    ) -> None:
-        """发送消息函数"""
+        wait: bool = False,
+    ) -> ActionResult:
+        """
+        发送消息函数，消息进入发送队列，经限流与合并后发送
+
+        参数:
+            user_id: 用户ID
+            message: 消息内容
+            group_id: 群ID（群聊时提供）
+            private: 是否为私聊
+            wait: 是否等待NapCat的执行结果，为False时加入队列后立即返回
+
+        返回:
+            ActionResult: wait为True时为NapCat的执行结果，否则为是否已加入队列
+        """
         try:
             payload: Dict[str, Any]
             if private:
@@ -571,22 +3621,148 @@ class MangaBot:
                     "params": {"group_id": group_id, "message": message},
                 }
 
-            # 如果配置了Token，添加到请求中
-            if self.config["NAPCAT_TOKEN"]:
-                payload["params"]["access_token"] = self.config["NAPCAT_TOKEN"]
+            self.logger.info(
+                f"准备发送 - 用户:{user_id}, 类型:{'私聊' if private else '群聊'}"
+            )
+            future = self.outbound.submit(
+                self._outbound_target(user_id, group_id, private),
+                payload["action"],
+                payload["params"],
+                text=message,
+            )
+
+            def log_result(done: concurrent.futures.Future) -> None:
+                result = done.result()
+                if result:
+                    self.logger.info(
+                        f"发送成功: {message[:20]}...（{result.latency * 1000:.0f}ms）"
+                    )
+                else:
+                    self.logger.warning(f"消息发送失败: {result.message}")
 
-            # 通过WebSocket发送消息
-            if self.ws and self.ws.sock and self.ws.sock.connected:
-                message_json: str = json.dumps(payload)
-                self.logger.info(
-                    f"准备发送 - 用户:{user_id}, 类型:{'私聊' if private else '群聊'}"
-                )
-                self.ws.send(message_json)
-                self.logger.info(f"发送成功: {message[:20]}...")
-            else:
-                self.logger.warning(f"WebSocket连接未建立，消息发送失败")
+            future.add_done_callback(log_result)
+            if wait:
+                return future.result()
+            return ActionResult(True, message="已加入发送队列")
         except Exception as e:
             self.logger.error(f"发送消息失败: {e}")
+            return ActionResult(False, message=str(e))
+
+    @staticmethod
+    def _outbound_target(user_id: str, group_id: Optional[str], private: bool) -> str:
+        """发送目标键：私聊为 private:{用户ID}，群聊为 group:{群号}"""
+        return f"private:{user_id}" if private else f"group:{group_id}"
+
+    def call_action(
+        self,
+        action: str,
+        params: Dict[str, Any],
+        timeout: Optional[float] = None,
+    ) -> ActionResult:
+        """
+        发送一个OneBot动作，并等待NapCat带相同echo的响应
+
+        参数:
+            action: 动作名称，如 send_private_msg
+            params: 动作参数（配置了Token时自动加入access_token）
+            timeout: 等待响应的超时时间（秒），默认使用 ACTION_TIMEOUT
+
+        返回:
+            ActionResult: 执行结果；在接收线程中调用时不等待响应，发送成功即返回成功
+        """
+        if timeout is None:
+            timeout = int(self.config["ACTION_TIMEOUT"])
+        if self.config["NAPCAT_TOKEN"]:
+            params["access_token"] = self.config["NAPCAT_TOKEN"]
+        if not self._ws_connected():
+            return ActionResult(False, message="WebSocket连接未建立")
+
+        echo = f"mangabot-{next(self.action_counter)}"
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        wait = not self._on_receive_thread()
+        if wait:
+            with self.pending_actions_lock:
+                self.pending_actions[echo] = future
+
+        started = time.perf_counter()
+        try:
+            self._ws_send(json.dumps({"action": action, "params": params, "echo": echo}))
+            if not wait:
+                return ActionResult(True, message="未等待响应")
+            response = future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            return ActionResult(
+                False, message=f"等待响应超时（{timeout}秒）", latency=time.perf_counter() - started
+            )
+        except Exception as e:
+            return ActionResult(False, message=str(e), latency=time.perf_counter() - started)
+        finally:
+            with self.pending_actions_lock:
+                self.pending_actions.pop(echo, None)
+
+        latency = time.perf_counter() - started
+        retcode = response.get("retcode")
+        ok = response.get("status") == "ok" or retcode == 0
+        return ActionResult(
+            ok,
+            retcode=retcode,
+            message="" if ok else str(response.get("wording") or response.get("msg") or ""),
+            data=response.get("data"),
+            latency=latency,
+        )
+
+    def _resolve_action(self, response: Dict[str, Any]) -> None:
+        """收到带echo的响应时完成对应的等待"""
+        with self.pending_actions_lock:
+            future = self.pending_actions.pop(str(response.get("echo")), None)
+        if future is not None and not future.done():
+            future.set_result(response)
+
+    def _fail_pending_actions(self, reason: str) -> None:
+        """连接断开时让所有等待中的动作立即失败，不必等到超时"""
+        with self.pending_actions_lock:
+            pending = list(self.pending_actions.values())
+            self.pending_actions.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(ConnectionError(reason))
+
+    def _on_receive_thread(self) -> bool:
+        """当前是否在接收WebSocket消息的线程（或asyncio事件循环）中"""
+        if self.async_loop is not None:
+            try:
+                return asyncio.get_running_loop() is self.async_loop
+            except RuntimeError:
+                return False
+        return threading.get_ident() == self.receive_thread_id
+
+    def _ws_connected(self) -> bool:
+        """当前运行模式下的WebSocket连接是否可用"""
+        if self.async_loop is not None:
+            return self.async_ws is not None
+        return bool(self.ws and self.ws.sock and self.ws.sock.connected)
+
+    def _ws_send(self, message_json: str) -> None:
+        """
+        通过当前运行模式下的WebSocket连接发送一条消息
+        asyncio模式下从工作线程调用时交给事件循环发送并等待完成
+
+        参数:
+            message_json: 已序列化的JSON字符串
+        """
+        if self.async_loop is None:
+            self.ws.send(message_json)
+            return
+        future = asyncio.run_coroutine_threadsafe(
+            self.async_ws.send(message_json), self.async_loop
+        )
+        try:
+            in_loop = asyncio.get_running_loop() is self.async_loop
+        except RuntimeError:
+            in_loop = False
+        # 在事件循环线程中调用时不能阻塞等待，发送结果由事件循环处理
+        if not in_loop:
+            future.result(timeout=30)
 
     def send_file(
         self,
@@ -594,7 +3770,7 @@ class MangaBot:
         file_path: str,
         group_id: Optional[str] = None,
         private: bool = True,
-    ) -> None:
+    ) -> bool:
         """发送文件函数
 
         Args:
@@ -604,7 +3780,7 @@ class MangaBot:
             private: 是否为私聊
 
         Returns:
-            None
+            bool: NapCat是否确认发送成功
         """
         try:
             # 敏感信息只在DEBUG级别记录
@@ -617,7 +3793,7 @@ class MangaBot:
                 self.logger.error(f"文件不存在: {os.path.basename(file_path)}")
                 error_msg = f"❌ 文件不存在哦~，请让我下载之后再发送(｡•﹃•｡)"
                 self.send_message(user_id, error_msg, group_id, private)
-                return
+                return False
 
             # 检查文件是否可读
             if not os.access(file_path, os.R_OK):
@@ -625,7 +3801,7 @@ class MangaBot:
                 self.logger.error(f"文件不可读: {os.path.basename(file_path)}")
                 error_msg = f"❌ 文件不可读，叫主人帮我检查一下吧∑(O_O；)"
                 self.send_message(user_id, error_msg, group_id, private)
-                return
+                return False
 
             # 获取文件名
             file_name = os.path.basename(file_path)
@@ -655,101 +3831,244 @@ class MangaBot:
                     "params": {"group_id": group_id, "message": message_segments},
                 }
 
-            if self.config["NAPCAT_TOKEN"]:
-                payload["params"]["access_token"] = self.config["NAPCAT_TOKEN"]
-
-            if self.ws and self.ws.sock and self.ws.sock.connected:
-                message_json = json.dumps(payload)
-                self.logger.debug(f"发送消息段数组文件: {message_json}")
-                self.ws.send(message_json)
-                # 只记录文件名而非敏感的路径信息
-                self.logger.info(f"文件发送请求已发送: {file_name}")
-                # 等待一小段时间让API请求有机会返回结果
-                time.sleep(1)
-            else:
-                self.logger.warning("WebSocket连接未建立，文件发送失败")
-                raise Exception("WebSocket连接未建立")
+            self.logger.debug(f"发送消息段数组文件: {payload}")
+            # 经发送队列发送，并等待NapCat确认文件已发送（上传大文件需要较长时间）
+            file_timeout = int(self.config["FILE_ACTION_TIMEOUT"])
+            future = self.outbound.submit(
+                self._outbound_target(user_id, group_id, private),
+                payload["action"],
+                payload["params"],
+                timeout=file_timeout,
+            )
+            try:
+                # 额外留出在发送队列中排队（限流、等待重新连接）的时间，断线过久时不再一直等待
+                result = future.result(timeout=file_timeout + self.FILE_QUEUE_WAIT_SECONDS)
+            except concurrent.futures.TimeoutError:
+                # 仍在排队的文件从队列中移除，避免报告失败后又发送出去
+                self.outbound.cancel(future, "发送队列等待超时")
+                raise Exception("发送队列等待超时，连接可能已断开，请稍后再试")
+            if not result:
+                raise Exception(result.message or f"NapCat返回错误码 {result.retcode}")
+            # 只记录文件名而非敏感的路径信息
+            self.logger.info(f"文件发送成功: {file_name}（{result.latency:.1f}秒）")
+            return True
 
         except Exception as e:
             self.logger.error(f"发送文件失败: {e}")
             error_msg = f"❌ 发送文件失败: {str(e)}\n快让主人帮我检查一下ヽ(ﾟДﾟ)ﾉ"
             self.send_message(user_id, error_msg, group_id, private)
+            return False
 
     def on_message(self, ws, message):
         # WebSocket消息处理函数
         try:
             self.logger.info(f"收到WebSocket消息: {message[:100]}...")
             data = json.loads(message)
-            # 处理接收到的消息
-            self.handle_event(data)
+            self.receive_thread_id = threading.get_ident()
+            # 动作响应直接完成对应的等待
+            if "echo" in data and "post_type" not in data:
+                self._resolve_action(data)
+                return
+            # 元事件（心跳等）直接在接收线程处理，其余事件按会话分发到事件处理线程
+            if data.get("post_type") == "meta_event":
+                self.handle_event(data)
+                return
+            if self._is_duplicate_event(data):
+                return
+            self.event_dispatcher.submit(
+                self._conversation_key(data), self.handle_event, data
+            )
         except Exception as e:
             self.logger.error(f"处理WebSocket消息出错: {e}")
 
+    def _is_duplicate_event(self, data: Dict[str, Any]) -> bool:
+        """
+        按message_id判断事件是否为重连后重复投递的事件
+
+        参数:
+            data: OneBot事件
+
+        返回:
+            bool: 是否为重复事件（没有message_id的事件不去重）
+        """
+        message_id = data.get("message_id")
+        if message_id is None:
+            return False
+        if self.recent_events.check_and_add(f"{data.get('self_id')}:{message_id}"):
+            self.logger.info(
+                f"丢弃重复事件 - 消息ID: {message_id}, "
+                f"累计命中 {self.recent_events.hits} 次"
+            )
+            return True
+        return False
+
+    @staticmethod
+    def _conversation_key(data: Dict[str, Any]) -> str:
+        """
+        事件所属的会话键，同一会话的事件按顺序处理
+
+        参数:
+            data: OneBot事件
+
+        返回:
+            str: 群消息为 group:{群号}，其余为 private:{用户ID}
+        """
+        group_id = data.get("group_id")
+        if group_id:
+            return f"group:{group_id}"
+        return f"private:{data.get('user_id')}"
+
     def on_close(self, ws, close_status_code, close_msg):
         # WebSocket连接关闭处理
         self.logger.info(f"WebSocket连接已关闭: {close_status_code} - {close_msg}")
+        self._set_connection_state("disconnected", f"{close_status_code} - {close_msg}")
 
     def on_error(self, ws, error):
         # WebSocket连接错误处理
         self.logger.error(f"WebSocket连接错误: {error}")
+        with self.connection_lock:
+            self.connection_stats["last_error"] = str(error)
 
     def on_open(self, ws):
         # WebSocket连接打开处理
         self.logger.info("WebSocket连接已打开")
+        with self.connection_lock:
+            self.connection_opened_at = time.monotonic()
+        self._set_connection_state("connected")
+        if self.startup_started is not None:
+            self.logger.info(
+                f"启动完成，从启动到连接NapCat耗时: "
+                f"{(time.perf_counter() - self.startup_started) * 1000:.0f}ms"
+            )
+            self.startup_started = None
 
     def connect_websocket(self):
-        # 连接WebSocket的函数
-        try:
-            # 记录连接信息时不显示token，保护安全
-            ws_url_display = self.config["NAPCAT_WS_URL"]
-            if "token=" in ws_url_display:
-                # 隐藏token值，只显示部分信息
-                parts = ws_url_display.split("token=")
-                ws_url_display = f"{parts[0]}token=****"
-
-            self.logger.info(f"正在连接WebSocket: {ws_url_display}")
-            self.ws = websocket.WebSocketApp(
-                self.config["NAPCAT_WS_URL"],  # 这里使用完整的URL，可能已包含token
-                on_open=self.on_open,
-                on_message=self.on_message,
-                on_error=self.on_error,
-                on_close=self.on_close,
-                # 可选：添加额外的HTTP头进行token认证
-                header={
-                    "Authorization": (
-                        f'Bearer {self.config["NAPCAT_TOKEN"]}'
-                        if self.config["NAPCAT_TOKEN"]
-                        else None
-                    )
-                },
+        """
+        启动WebSocket连接监督线程（只会启动一个）
+        监督线程负责建立连接，断开后按带抖动的指数退避重新连接，
+        同一时间只存在一个WebSocketApp连接
+        """
+        with self.connection_lock:
+            if self.connection_thread is not None and self.connection_thread.is_alive():
+                return
+            self.connection_thread = threading.Thread(
+                target=self._supervise_connection, name="ws-supervisor", daemon=True
             )
+            self.connection_thread.start()
+
+    def _supervise_connection(self) -> None:
+        """连接监督循环：建立连接并阻塞到断开，然后退避后重连"""
+        # 记录连接信息时不显示token，保护安全
+        ws_url_display = str(self.config["NAPCAT_WS_URL"])
+        if "token=" in ws_url_display:
+            # 隐藏token值，只显示部分信息
+            parts = ws_url_display.split("token=")
+            ws_url_display = f"{parts[0]}token=****"
+
+        attempt = 0
+        while not self.connection_stopping:
+            self._set_connection_state("connecting")
+            with self.connection_lock:
+                self.connection_opened_at = None
+            try:
+                self.logger.info(f"正在连接WebSocket: {ws_url_display}")
+                self.ws = websocket.WebSocketApp(
+                    self.config["NAPCAT_WS_URL"],  # 这里使用完整的URL，可能已包含token
+                    on_open=self.on_open,
+                    on_message=self.on_message,
+                    on_error=self.on_error,
+                    on_close=self.on_close,
+                    # 可选：添加额外的HTTP头进行token认证
+                    header={
+                        "Authorization": (
+                            f'Bearer {self.config["NAPCAT_TOKEN"]}'
+                            if self.config["NAPCAT_TOKEN"]
+                            else None
+                        )
+                    },
+                )
+                # 阻塞到连接断开；重连由本循环负责，不使用run_forever自带的重连
+                self.ws.run_forever(ping_interval=30, ping_timeout=10)
+            except Exception as e:
+                self.logger.error(f"连接WebSocket失败: {e}")
+                with self.connection_lock:
+                    self.connection_stats["last_error"] = str(e)
+            self._set_connection_state("disconnected")
+
+            if self.connection_stopping:
+                break
+            # 连接稳定运行过一段时间后断开的，从最短等待时间重新开始退避
+            if self._connection_was_stable():
+                attempt = 0
+            delay = _backoff_delay(
+                attempt,
+                base=int(self.config["RECONNECT_BASE_SECONDS"]),
+                maximum=int(self.config["RECONNECT_MAX_SECONDS"]),
+            )
+            attempt += 1
+            self.logger.info(f"{delay:.1f}秒后重新连接WebSocket（第{attempt}次）")
+            time.sleep(delay)
 
-            # 启动WebSocket线程，添加重连选项
-            threading.Thread(
-                target=lambda: self.ws.run_forever(
-                    ping_interval=30, ping_timeout=10, reconnect=5
-                ),
-                daemon=True,
-            ).start()
-            self.logger.info("WebSocket连接启动成功，将自动尝试重连")
-        except Exception as e:
-            self.logger.error(f"连接WebSocket失败: {e}")
+    def _connection_was_stable(self) -> bool:
+        """
+        刚断开的连接是否已建立并稳定运行超过 RECONNECT_MAX_SECONDS
+        从连接建立（on_open）时开始计算，连接过程本身耗时较长不算作稳定运行
 
-    def websocket_reconnect_manager(self):
-        # WebSocket重连管理线程
-        while True:
-            time.sleep(10)  # 每10秒检查一次连接状态
+        返回:
+            bool: 是否应从最短等待时间重新开始退避
+        """
+        with self.connection_lock:
+            opened_at = self.connection_opened_at
+        return opened_at is not None and (
+            time.monotonic() - opened_at > int(self.config["RECONNECT_MAX_SECONDS"])
+        )
 
-            if self.ws and (not self.ws.sock or not self.ws.sock.connected):
-                self.logger.info("检测到WebSocket未连接，尝试重新连接...")
-                try:
-                    # 关闭现有连接
-                    if self.ws:
-                        self.ws.close()
-                    # 重新连接
-                    self.connect_websocket()
-                except Exception as e:
-                    self.logger.error(f"重连WebSocket失败: {e}")
+    def _set_connection_state(self, state: str, error: Optional[str] = None) -> None:
+        """
+        更新连接状态与统计，并在连接建立/断开时恢复/暂停发送队列
+
+        参数:
+            state: connecting、connected 或 disconnected
+            error: 断开原因
+        """
+        stats = self.connection_stats
+        now = time.time()
+        with self.connection_lock:
+            previous = stats["state"]
+            if previous == state:
+                return
+            stats["state"] = state
+            if state == "connected":
+                stats["connects"] += 1
+                stats["last_connected_at"] = now
+                if stats["last_disconnected_at"]:
+                    stats["downtime_seconds"] += now - stats["last_disconnected_at"]
+            elif state == "disconnected" and previous == "connected":
+                stats["disconnects"] += 1
+                stats["last_disconnected_at"] = now
+            if error:
+                stats["last_error"] = error
+
+        if state == "connected":
+            pending = self.outbound.pending_count()
+            self.outbound.set_connected(True)
+            if pending:
+                self.logger.info(f"连接已恢复，发送断线期间缓存的 {pending} 条消息")
+        elif state == "disconnected":
+            self.outbound.set_connected(False)
+            self._fail_pending_actions("WebSocket连接已断开")
+
+    def _connection_summary(self) -> str:
+        """连接状态的简短描述（用于进度显示）"""
+        stats = self.connection_stats
+        state_labels = {"connected": "已连接", "connecting": "连接中", "disconnected": "已断开"}
+        summary = f"{state_labels.get(stats['state'], stats['state'])}"
+        if stats["state"] == "connected" and stats["last_connected_at"]:
+            summary += f" {(time.time() - stats['last_connected_at']) / 60:.0f}分钟"
+        summary += f"，重连 {max(0, stats['connects'] - 1)} 次"
+        if stats["downtime_seconds"]:
+            summary += f"，累计断线 {stats['downtime_seconds']:.0f}秒"
+        return summary
 
     def handle_event(self, data):
         """事件处理函数"""
@@ -874,6 +4193,44 @@ class MangaBot:
             self.logger.info(f"收到群消息并被@ - 群{group_id} 用户{user_id}: {message}")
             self.handle_command(user_id, message, group_id=group_id, private=False)
 
+    def _check_command_rate(
+        self, user_id: str, group_id: Optional[str], private: bool
+    ) -> bool:
+        """
+        检查命令是否超出用户、群或全局的频率限制，管理员不受限制
+        被限流时给该用户发送一次简短提示
+
+        Args:
+            user_id: 用户ID
+            group_id: 群组ID（群聊时提供）
+            private: 是否为私聊
+
+        Returns:
+            bool: 是否允许处理该命令
+        """
+        if user_id in self.admin_ids:
+            return True
+        result = self.command_limiter.check(user_id, group_id)
+        if result is None:
+            return True
+        scope, wait, notify = result
+        self.logger.warning(
+            f"命令被限流（{scope}）- 群{group_id or '-'} 用户{user_id}，需等待 {wait:.0f} 秒"
+        )
+        if notify:
+            reasons = {
+                CommandRateLimiter.SCOPE_USER: "你的操作太频繁啦",
+                CommandRateLimiter.SCOPE_GROUP: "本群的请求太多啦",
+                CommandRateLimiter.SCOPE_GLOBAL: "机器人现在太忙啦",
+            }
+            self.send_message(
+                user_id,
+                f"⏳ {reasons[scope]}，请 {max(1, round(wait))} 秒后再试~",
+                group_id,
+                private,
+            )
+        return False
+
     def handle_command(self, user_id, message, group_id=None, private=True):
         """
         处理用户命令的函数，使用命令解析器进行标准化处理
@@ -908,6 +4265,12 @@ class MangaBot:
             f"[命令ID:{command_id}] 处理命令 - 用户{user_id}: 标准化命令='{cmd}', 参数='{args}', 私聊={private}"
         )
 
+        # 只有识别出的命令才计入限流，问候语与闲聊不消耗额度
+        if cmd not in ("welcome", "unknown") and not self._check_command_rate(
+            user_id, group_id, private
+        ):
+            return
+
         # 验证命令参数
         if not self.command_parser.validate_params(cmd, args):
             error_msg = self.command_parser.get_error_message(cmd)
@@ -936,6 +4299,12 @@ class MangaBot:
         # 下载进度查询命令
         elif cmd == "progress":
             self.show_download_progress(user_id, group_id or "", private)
+        # 管理员调整群组的下载队列权重
+        elif cmd == "weight":
+            self.set_group_weight(user_id, args, group_id, private)
+        # 管理员查看运行状态
+        elif cmd == "status":
+            self.show_runtime_status(user_id, group_id, private)
         # 测试命令，显示当前SELF_ID状态
         elif cmd == "test_id":
             # 测试命令，显示机器人当前的SELF_ID状态
@@ -997,16 +4366,13 @@ class MangaBot:
                 )
                 return
 
-            # 查找所有PDF格式的文件
-            pdf_files = []
-            for file_name in os.listdir(self.config["MANGA_DOWNLOAD_PATH"]):
-                if file_name.endswith(".pdf"):
-                    # 提取文件名（不含扩展名）
-                    name_without_ext = os.path.splitext(file_name)[0]
-                    pdf_files.append(name_without_ext)
-
-            # 根据漫画ID进行排序
-            pdf_files.sort()
+            # 从元数据目录获取所有PDF文件名（不含扩展名），已按名称排序
+            file_names = (
+                self.catalog.list_file_names()
+                if self.catalog is not None
+                else self.library_index.file_names()
+            )
+            pdf_files = [os.path.splitext(file_name)[0] for file_name in file_names]
 
             # 构建回复消息
             if not pdf_files:
@@ -1065,22 +4431,19 @@ class MangaBot:
                 self.send_message(user_id, response, group_id, private)
                 return
 
-            # 查找是否存在对应的PDF文件
-            found = False
-            found_files = []
-
-            # 遍历所有PDF文件
-            for file_name in os.listdir(self.config["MANGA_DOWNLOAD_PATH"]):
-                if file_name.endswith(".pdf"):
-                    # 检查文件名是否包含该漫画ID
-                    name_without_ext = os.path.splitext(file_name)[0]
-                    # 检查文件名是否以ID开头或包含ID-格式
-                    if (
-                        name_without_ext.startswith(manga_id + "-")
-                        or name_without_ext == manga_id
-                    ):
-                        found = True
-                        found_files.append(name_without_ext)
+            # 优先从元数据目录查询，没有目录时使用文件索引
+            album_info = (
+                self.catalog.get(manga_id) if self.catalog is not None else None
+            )
+            found_files = (
+                [os.path.splitext(album_info["file_name"])[0]]
+                if album_info
+                else [
+                    os.path.splitext(file_name)[0]
+                    for file_name, _ in self.library_index.lookup(manga_id)
+                ]
+            )
+            found = bool(found_files)
 
             # 构建回复消息
             if found:
@@ -1088,6 +4451,8 @@ class MangaBot:
                 response += "找到以下文件：\n"
                 for i, file_name in enumerate(found_files, 1):
                     response += f"{i}. {file_name}\n"
+                if album_info:
+                    response += self._format_album_info(album_info)
             else:
                 response = f"❌（｀Δ´）！ 漫画ID {manga_id} 还没有下载！"
 
@@ -1101,6 +4466,29 @@ class MangaBot:
                 private,
             )
 
+    def _format_album_info(self, album_info: Dict[str, Any]) -> str:
+        """
+        将元数据目录中的漫画信息格式化为回复文本
+
+        参数:
+            album_info: MangaCatalog.get 返回的元数据字典
+
+        返回:
+            str: 多行文本
+        """
+        lines = []
+        if album_info["author"]:
+            lines.append(f"✍️ 作者: {album_info['author']}")
+        if album_info["page_count"]:
+            lines.append(f"📄 页数: {album_info['page_count']}")
+        lines.append(f"💾 大小: {album_info['byte_size'] / 1024 / 1024:.1f}MB")
+        lines.append(
+            "🕒 下载时间: "
+            + time.strftime("%Y-%m-%d %H:%M", time.localtime(album_info["downloaded_at"]))
+        )
+        lines.append(f"📤 发送次数: {album_info['send_count']}")
+        return "\n" + "\n".join(lines) + "\n"
+
     def send_help(self, user_id, group_id, private):
         # 发送帮助信息
         help_text = f"📚 本小姐的帮助 📚(版本{self.VERSION})\n\n"
@@ -1116,7 +4504,9 @@ class MangaBot:
         help_text += "- 查询漫画 <漫画ID>：查询指定ID的漫画是否已下载\n"
         help_text += "- 漫画列表：查询已下载的所有漫画\n"
         help_text += "- 下载进度：查看当前漫画下载队列的状况\n"
-        help_text += "- 漫画版本：显示机器人当前版本信息\n\n"
+        help_text += "- 漫画版本：显示机器人当前版本信息\n"
+        help_text += "- 队列权重 <群号> <权重>：（管理员）调整该群任务的出队频率\n"
+        help_text += "- 运行状态：（管理员）查看资源占用、连接与去重统计\n\n"
         help_text += "⚠️ 注意事项：\n"
         help_text += "- 命令与漫画ID之间记得加空格\n"
         help_text += "- 请确保输入正确的漫画ID\n"
@@ -1140,293 +4530,979 @@ class MangaBot:
         )
         self.send_message(user_id, version_text, group_id, private)
 
-    def show_download_progress(
-        self, user_id: str, group_id: Optional[str], private: bool
-    ) -> None:
+    def _queue_position(self, job: DownloadJob) -> int:
+        """
+        任务在下载队列中的预计位置（从1开始），不在队列中时返回0
+
+        Args:
+            job: 下载任务
+
+        Returns:
+            int: 排队位置
+        """
+        for position, queued_job in enumerate(self.download_queue.ordered_jobs(), 1):
+            if queued_job is job:
+                return position
+        return 0
+
+    def set_group_weight(
+        self, user_id: str, args: str, group_id: Optional[str], private: bool
+    ) -> None:
+        """
+        管理员设置群组的下载队列权重，权重越大该群的任务出队越频繁（仅在本次运行中生效）
+
+        Args:
+            user_id: 用户ID
+            args: "群号 权重"
+            group_id: 群组ID（群聊时提供）
+            private: 是否为私聊
+        """
+        if user_id not in self.admin_ids:
+            self.send_message(user_id, "❌ 只有管理员可以调整队列权重哦", group_id, private)
+            return
+        target_group, weight_text = args.split()
+        weight = max(1, int(weight_text))
+        self.download_queue.set_weight(target_group, weight)
+        current_weights = self.download_queue.weights_snapshot()
+        self.logger.info(
+            f"管理员{user_id} 将群 {target_group} 的队列权重设置为 {weight}，"
+            f"当前生效的群组权重: {current_weights or '全部为1'}"
+        )
+        response = f"✅ 群 {target_group} 的下载队列权重已设置为 {weight}"
+        # 群号不在白名单中时该群无法使用机器人，权重不会生效，提示管理员检查群号
+        if self.group_whitelist and target_group not in self.group_whitelist:
+            response += "\n⚠️ 该群不在群组白名单中，请确认群号是否正确"
+        response += "\n📋 当前群组权重: " + (
+            "，".join(f"{gid}×{w}" for gid, w in sorted(current_weights.items()))
+            or "全部为1"
+        )
+        self.send_message(user_id, response, group_id, private)
+
+    def show_runtime_status(
+        self, user_id: str, group_id: Optional[str], private: bool
+    ) -> None:
+        """
+        管理员查看运行状态：资源预算占用、WebSocket连接统计、重复事件统计与被限流最多的用户/群
+        这些运维信息不在面向所有用户的下载进度中显示
+
+        Args:
+            user_id: 用户ID
+            group_id: 群组ID（群聊时提供）
+            private: 是否为私聊
+        """
+        if user_id not in self.admin_ids:
+            self.send_message(user_id, "❌ 只有管理员可以查看运行状态哦", group_id, private)
+            return
+        used_memory_mb, used_threads, _ = self.resource_budget.usage()
+        response = "🛠️ 运行状态\n\n"
+        response += (
+            f"⚙️ 资源占用: 内存 {used_memory_mb}/{self.config['DOWNLOAD_MEMORY_BUDGET_MB']}MB, "
+            f"下载线程 {used_threads}/{self.config['DOWNLOAD_THREAD_BUDGET']}\n"
+        )
+        response += f"🔌 连接状态: {self._connection_summary()}\n"
+        response += (
+            f"🧹 重复事件: 丢弃 {self.recent_events.hits} 个 / "
+            f"共 {self.recent_events.hits + self.recent_events.misses} 个\n"
+        )
+        response += (
+            f"🚦 命令限流: {self.command_limiter.summary()}，"
+            f"最多: {self.command_limiter.details()}\n"
+        )
+        self.logger.info(f"管理员{user_id} 查看运行状态:\n{response}")
+        self.send_message(user_id, response, group_id, private)
+
+    def show_download_progress(
+        self, user_id: str, group_id: Optional[str], private: bool
+    ) -> None:
+        """
+        显示当前下载队列的进度信息
+
+        此方法从下载队列状态管理字典中获取信息，并以结构化格式展示给用户，
+        包括正在下载的漫画列表、等待下载的漫画列表以及总任务数。
+
+        Args:
+            user_id: 用户ID，用于发送回复消息
+            group_id: 群组ID，如果是群聊则提供，私聊时为None
+            private: 是否为私聊消息
+
+        Returns:
+            None: 此方法不返回值，直接通过send_message发送消息给用户
+
+        Raises:
+            Exception: 当处理过程中出现任何错误时，会记录错误并向用户发送友好提示
+        """
+        self.logger.info(f"显示下载进度请求 - 用户{user_id}")
+
+        try:
+            jobs: List[DownloadJob] = list(self.download_jobs.values())
+            # 正在处理（下载、等待转换、转换）的任务
+            active_jobs: List[DownloadJob] = [
+                job for job in jobs if job.stage != DownloadJob.STAGE_QUEUED
+            ]
+            # 队列中待下载的任务，按预计出队顺序排列
+            queued_jobs: List[DownloadJob] = self.download_queue.ordered_jobs()
+
+            # 构建响应消息
+            response: str = "📊 当前下载队列状态 📊\n\n"
+
+            # 添加正在处理的信息，包括每个任务所处的阶段
+            if active_jobs:
+                response += f"⏳ 正在处理: {len(active_jobs)} 个漫画\n"
+                for job in active_jobs:
+                    waiting = (
+                        f"，{len(job.subscribers)}处等待"
+                        if len(job.subscribers) > 1
+                        else ""
+                    )
+                    response += f"  • {job.manga_id}（{job.stage_label}{waiting}）\n"
+            else:
+                response += "✅ 当前没有正在下载的漫画\n"
+
+            response += "\n"
+
+            # 添加队列等待信息：只标出查询者自己的任务及其预计开始时间，不显示其他任务的请求者
+            if queued_jobs:
+                response += f"📋 队列等待: {len(queued_jobs)} 个漫画\n"
+                start_estimates = self._estimate_start_times()
+                for position, job in enumerate(queued_jobs, 1):
+                    pages = f"{job.pages}页" if job.pages else "页数未知"
+                    if any(sub_user_id == user_id for sub_user_id, _, _ in job.subscribers):
+                        wait = self._format_wait(start_estimates.get(job.manga_id, 0.0))
+                        response += f"  {position}. {job.manga_id}（{pages}，{wait}）← 你\n"
+                    else:
+                        response += f"  {position}. {job.manga_id}（{pages}）\n"
+            else:
+                response += "✅ 下载队列为空\n"
+
+            response += "\n"
+            response += f"🚦 命令限流: {self.command_limiter.summary()}\n"
+            response += f"📝 总任务数: {len(active_jobs) + len(queued_jobs)}\n"
+            response += "\n💡 提示: 各群与各用户的任务轮流开始，页数少的漫画优先，资源允许时会同时下载多个漫画，请耐心等待"
+
+            # 发送响应消息
+            self.send_message(user_id, response, group_id, private)
+
+        except Exception as e:
+            self.logger.error(f"显示下载进度时出错: {e}")
+            error_msg = "❌ 查询下载进度失败：请稍后再试"
+            self.send_message(user_id, error_msg, group_id, private)
+
+    def handle_manga_download(
+        self, user_id: str, manga_id: str, group_id: str, private: bool
+    ) -> None:
+        """
+        处理漫画下载请求
+        检查漫画是否已存在，然后将下载任务添加到队列中
+
+        参数:
+            user_id: 用户ID，请求下载的用户
+            manga_id: 漫画ID (由CommandParser验证)
+            group_id: 群ID，请求来源的群组
+            private: 是否为私聊，决定消息发送的方式
+        """
+        self.logger.info(f"处理漫画下载请求 - 用户{user_id}, 漫画ID: {manga_id}")
+
+        # 在下载前先检查漫画是否已存在
+        try:
+            # 检查下载目录是否存在
+            if not os.path.exists(self.config["MANGA_DOWNLOAD_PATH"]):
+                # 目录不存在，需要创建并继续下载
+                os.makedirs(self.config["MANGA_DOWNLOAD_PATH"], exist_ok=True)
+                self.logger.info(f"创建下载目录: {self.config['MANGA_DOWNLOAD_PATH']}")
+            else:
+                # 从漫画库索引查找对应的PDF文件
+                found_files = [
+                    os.path.splitext(file_name)[0]
+                    for file_name, _ in self.library_index.lookup(manga_id)
+                ]
+                found = bool(found_files)
+
+                # 如果已存在，则通知用户
+                if found:
+                    response = f"✅૮₍ ˶•‸•˶₎ა 漫画ID {manga_id} 已经下载过了！\n\n"
+                    response += "找到以下文件：\n"
+                    for i, file_name in enumerate(found_files, 1):
+                        response += f"{i}. {file_name}\n"
+                    response += "\n你可以使用 '发送 {manga_id}' 命令获取该漫画哦~"
+                    self.send_message(user_id, response, group_id, private)
+                    return
+        except Exception as e:
+            self.logger.error(f"检查漫画是否已下载时出错: {e}")
+            # 检查出错时继续下载，避免因检查失败而影响用户体验
+
+        # 将下载任务添加到队列（download_manga方法现在会将任务添加到队列中）
+        job, created = self.download_manga(user_id, manga_id, group_id, private)
+
+        # 发送开始下载的消息
+        if job is None:
+            response = (
+                f"⏳ 你已经有 {self.config['MAX_QUEUED_PER_USER']} 个漫画在排队啦，"
+                f"等前面的下载完再来吧~"
+            )
+        elif created:
+            position = self._queue_position(job)
+            response = f"开始下载漫画ID：{manga_id}啦~，请稍候..."
+            if position > 1:
+                wait_seconds = self._estimate_start_times().get(manga_id, 0.0)
+                response += (
+                    f"\n📋 当前排在第 {position} 位，{self._format_wait(wait_seconds)}"
+                )
+        else:
+            response = (
+                f"⏳ 漫画ID {manga_id} 已经在处理啦（{job.stage_label}），"
+                f"完成后会一起通知你~"
+            )
+        self.send_message(user_id, response, group_id, private)
+
+    def _process_download_task(self, job: DownloadJob) -> None:
+        """
+        处理队列中的下载任务（下载阶段）
+        下载完成后收集图片文件，并将任务交给转换阶段，不在此线程中转换PDF，
+        这样转换期间下载线程可以立即开始处理下一个漫画
+
+        参数:
+            job: 下载任务对象
+
+        异常:
+            所有下载相关的异常都会被捕获并记录，确保队列继续处理其他任务
+        """
+        manga_id = job.manga_id
+        handed_off = False
+        # 任务在下载阶段结束时发送给所有请求者的消息
+        final_message: Optional[str] = None
+        # 下载漫画函数
+        try:
+            # 标记该漫画正在下载中
+            self.downloading_mangas[manga_id] = True
+            job.download_started = time.time()
+            self._set_job_stage(job, DownloadJob.STAGE_DOWNLOADING)
+
+            # 使用jmcomic库下载漫画
+            self.logger.info(f"开始下载漫画ID: {manga_id}")
+            jmcomic = _load_jmcomic()
+            # 基于共享的下载选项创建本任务的选项（共用同一个客户端与连接池）
+            option = self._get_job_option()
+            # 确保使用环境变量中的下载路径（分片布局下为该漫画所在的分片目录）
+            base_dir = self.library_layout.shard_dir(manga_id)
+            os.makedirs(base_dir, exist_ok=True)
+
+            # 设置目录命名规则，将漫画ID和名称组合在同一个文件夹名中
+            # 使用f-string格式的规则，这样会创建 {base_dir}/{album_id}-{album_title}/{photo_title} 的目录结构
+            # 在jmcomic v2.5.36+版本支持这种语法
+            new_rule = "Bd / {Aid}-{Atitle}"
+            from jmcomic.jm_option import DirRule
+
+            # 创建新的DirRule对象并替换原有的
+            option.dir_rule = DirRule(new_rule, base_dir=base_dir)
+
+            # 按资源预算限制本任务的下载线程：章节并发数 × 每章图片并发数 不超过分配的线程数
+            photo_threads = max(
+                1, min(int(option.download.threading.photo or 1), job.threads)
+            )
+            option.download.threading.photo = photo_threads
+            max_image_threads = max(1, job.threads // photo_threads)
+            if self.config["ADAPTIVE_CONCURRENCY"]:
+                # 从option.yml中的图片并发数开始，按实际速度与失败率在资源预算内调整
+                option.concurrency = AdaptiveConcurrency(
+                    int(option.download.threading.image or 1), max_image_threads
+                )
+                option.download.threading.image = option.concurrency.current
+            else:
+                option.download.threading.image = max_image_threads
+            self.logger.info(
+                f"漫画 {manga_id} 下载并发: 章节 {photo_threads} × "
+                f"图片 {option.download.threading.image}"
+                f"{'（自适应）' if self.config['ADAPTIVE_CONCURRENCY'] else ''}"
+            )
+
+            # 入队时已获取的漫画详情直接交给下载器；下载器拿到详情后同步页数与章节数到任务
+            if (
+                job.album is not None
+                and time.time() - job.album_fetched_at > self.PREFETCHED_ALBUM_MAX_AGE_SECONDS
+            ):
+                self.logger.info(f"漫画 {manga_id} 入队时获取的详情已过期，重新获取")
+                job.album = None
+            option.prefetched_album = job.album
+            option.album_callback = lambda album: self._apply_album_metadata(job, album)
+            try:
+                album, downloader = jmcomic.download_album(
+                    manga_id, option=option, downloader=_get_manifest_downloader()
+                )
+            finally:
+                job.album = None
+                if getattr(option, "concurrency", None) is not None:
+                    self.logger.info(f"漫画 {manga_id} 下载统计: {option.concurrency.summary()}")
+            job.title = str(getattr(album, "name", "") or "")
+            job.author = str(getattr(album, "author", "") or "")
+
+            # 优先使用下载器记录的漫画文件夹，找不到时再按漫画ID查找
+            manga_dir = getattr(downloader, "album_dir", None)
+            # 直接在该漫画所在的目录下查找
+            download_path = self.library_layout.shard_dir(manga_id)
+            if not manga_dir and os.path.exists(download_path):
+                with os.scandir(download_path) as scanner:
+                    for entry in scanner:
+                        # 检查是否是目录且以漫画ID开头
+                        if entry.name.startswith(f"{manga_id}-") and entry.is_dir():
+                            manga_dir = entry.path
+                            break
+
+            if not manga_dir or not os.path.exists(manga_dir):
+                response = f"✅（｀Δ´）！ 漫画ID {manga_id} 下载完成！\n未找到漫画文件夹，无法转换为PDF\n\n⚠️ 注意：当前版本只支持发送PDF格式的漫画文件，请确保漫画成功转换为PDF后再尝试发送"
+                final_message = response
+                return
+
+            # 收集所有图片文件
+            image_files = []
+
+            for root, _, files in os.walk(manga_dir):
+                for file in files:
+                    if file.lower().endswith(IMAGE_EXTENSIONS):
+                        image_files.append(os.path.join(root, file))
+
+            # 按文件名排序
+            image_files.sort()
+
+            if not image_files:
+                self.logger.warning(f"在漫画文件夹中未找到图片文件: {manga_dir}")
+                response = f"✅（｀Δ´）！ 漫画ID {manga_id} 下载完成！\n未找到图片文件，无法转换为PDF\n\n⚠️ 注意：当前版本只支持发送PDF格式的漫画文件"
+                final_message = response
+                return
+
+            self.logger.info(
+                f"找到 {len(image_files)} 个图片文件，漫画 {manga_id} 进入PDF转换队列"
+            )
+            job.manga_dir = manga_dir
+            job.image_files = image_files
+            self._update_download_speed(job, getattr(downloader, "downloaded_images", 0))
+            self._set_job_stage(job, DownloadJob.STAGE_WAITING_CONVERT)
+            # 下载结束即归还线程额度，内存额度保留到转换完成
+            self.resource_budget.release_threads(manga_id)
+            # 转换队列已满时在此等待，避免已下载未转换的漫画无限堆积
+            self.convert_queue.put(job)
+            handed_off = True
+        except Exception as e:
+            self.logger.error(f"下载漫画出错: {e}")
+            final_message = f"❌ 下载失败：{str(e)}\n\n快让主人帮我检查一下∑(O_O；)"
+        finally:
+            # 未交给转换阶段的任务到此结束
+            if not handed_off:
+                self._finish_job(job, final_message)
+
+    def _process_convert_task(self, job: DownloadJob) -> None:
+        """
+        处理转换队列中的任务（转换阶段）
+        将下载阶段收集到的图片转换为PDF，成功后删除原漫画文件夹并通知用户
+
+        参数:
+            job: 已完成下载阶段的任务对象
+        """
+        manga_id = job.manga_id
+        final_message: Optional[str] = None
+        pdf_path: Optional[str] = None
+        converted = False
+        try:
+            self._set_job_stage(job, DownloadJob.STAGE_CONVERTING)
+            manga_dir = str(job.manga_dir)
+            # 从manga_dir路径中提取文件夹名称
+            folder_name = os.path.basename(manga_dir)
+            pdf_path = self.library_layout.pdf_path(manga_id, folder_name)
+
+            # 转换为PDF
+            try:
+                self._convert_images_to_pdf(manga_id, job.image_files, pdf_path)
+                self.logger.info(f"成功将漫画 {manga_id} 转换为PDF: {pdf_path}")
+                self.library_index.add(pdf_path)
+                if self.catalog is not None:
+                    try:
+                        self.catalog.record_download(
+                            manga_id,
+                            job.title or folder_name.split("-", 1)[-1],
+                            job.author,
+                            len(job.image_files),
+                            os.path.getsize(pdf_path),
+                            os.path.basename(pdf_path),
+                        )
+                    except sqlite3.Error as e:
+                        self.logger.warning(f"写入漫画元数据目录失败: {e}")
+
+                # 删除原漫画文件夹
+                self.logger.info(f"删除原漫画文件夹: {manga_dir}")
+                shutil.rmtree(manga_dir)
+
+                response = f"✅ദ്ദി˶>ω<)✧ 漫画ID {manga_id} 下载并转换为PDF完成！\n\n友情提示：输入'发送 {manga_id}'可以将PDF发送给您"
+                converted = True
+            except Exception as pdf_error:
+                self.logger.error(f"转换为PDF失败: {pdf_error}")
+                response = f"✅（｀Δ´）！ 漫画ID {manga_id} 下载完成，但转换为PDF失败: {str(pdf_error)}\n\n⚠️ 注意：当前版本只支持发送PDF格式的漫画文件，请确保漫画成功转换为PDF后再尝试发送"
+
+            final_message = response
+        except Exception as e:
+            self.logger.error(f"处理漫画 {manga_id} 转换任务出错: {e}")
+            final_message = f"❌ 转换失败：{str(e)}\n\n快让主人帮我检查一下∑(O_O；)"
+        finally:
+            self._finish_job(job, final_message)
+
+        # 配置了完成后自动发送时，把PDF交给发送线程池发给每个请求者，转换线程不等待发送完成
+        if converted and pdf_path and self.config["AUTO_SEND_ON_COMPLETE"]:
+            for user_id, group_id, private in list(job.subscribers):
+                # 每次发送登记一次发送中，防止被容量淘汰删除，发送结束后由发送线程释放
+                with self.library_lock:
+                    if not os.path.exists(pdf_path):
+                        self.logger.warning(f"自动发送前PDF已被删除: {pdf_path}")
+                        return
+                    self.sending_files[pdf_path] = self.sending_files.get(pdf_path, 0) + 1
+                conversation_key = f"group:{group_id}" if not private else f"private:{user_id}"
+                if not self.send_dispatcher.submit(
+                    conversation_key,
+                    self._auto_send_file,
+                    user_id,
+                    manga_id,
+                    pdf_path,
+                    group_id,
+                    private,
+                ):
+                    self._release_sending_file(pdf_path)
+                    self.logger.warning(f"发送任务太多，跳过自动发送漫画 {manga_id} 给用户{user_id}")
+
+    def _auto_send_file(
+        self,
+        user_id: str,
+        manga_id: str,
+        pdf_path: str,
+        group_id: Optional[str],
+        private: bool,
+    ) -> None:
+        """
+        在发送线程中自动发送下载完成的PDF，成功后更新发送记录，结束后释放发送中计数
+
+        参数:
+            user_id: 用户ID
+            manga_id: 漫画ID
+            pdf_path: PDF文件路径
+            group_id: 群组ID（群聊时提供）
+            private: 是否为私聊
+        """
+        try:
+            # 与手动发送一样计入发送记录，LRU/LFU淘汰才不会优先删除被请求最多的漫画
+            if self.send_file(user_id, pdf_path, group_id, private) and self.catalog is not None:
+                try:
+                    self.catalog.record_send(manga_id)
+                except sqlite3.Error as e:
+                    self.logger.warning(f"更新漫画发送记录失败: {e}")
+        except Exception as e:
+            self.logger.error(f"自动发送PDF出错: {e}")
+        finally:
+            self._release_sending_file(pdf_path)
+
+    def _release_sending_file(self, pdf_path: str) -> None:
+        """
+        PDF发送结束后减少发送中计数，计数归零后该文件可以被容量淘汰
+
+        参数:
+            pdf_path: PDF文件路径
+        """
+        with self.library_lock:
+            remaining = self.sending_files.get(pdf_path, 1) - 1
+            if remaining > 0:
+                self.sending_files[pdf_path] = remaining
+            else:
+                self.sending_files.pop(pdf_path, None)
+
+    def _get_shared_jm_option(self) -> Tuple[Any, Any]:
+        """
+        返回共享的jmcomic下载选项与客户端，首次调用或option.yml修改后重新创建
+        客户端改用会话型postman，在各任务之间复用连接与Cookie
+
+        返回:
+            Tuple[Any, Any]: (下载选项, 客户端)
         """
-        显示当前下载队列的进度信息
+        option_path = "option.yml"
+        mtime = os.path.getmtime(option_path)
+        with self.jm_option_lock:
+            if self.jm_shared is not None and self.jm_shared[0] == mtime:
+                return self.jm_shared[1], self.jm_shared[2]
+
+            jmcomic = _load_jmcomic()
+            started = time.perf_counter()
+            option = jmcomic.create_option_by_file(option_path)
+            # 非会话型postman每个请求都新建连接，换成对应的会话型postman
+            postman = option.client.postman
+            session_types = {"curl_cffi": "curl_cffi_session", "requests": "requests-session"}
+            if postman.type in session_types:
+                postman.type = session_types[postman.type]
+            client = option.build_jm_client()
+            self._bound_jm_connection_pool(client)
+            reloaded = self.jm_shared is not None
+            self.jm_shared = (mtime, option, client)
+            self.logger.info(
+                f"{'option.yml 已修改，重新' if reloaded else ''}创建jmcomic共享客户端 - "
+                f"postman: {postman.type}, 耗时: {time.perf_counter() - started:.2f}秒"
+            )
+            return option, client
 
-        此方法从下载队列状态管理字典中获取信息，并以结构化格式展示给用户，
-        包括正在下载的漫画列表、等待下载的漫画列表以及总任务数。
+    def _bound_jm_connection_pool(self, client: Any) -> None:
+        """
+        限制共享客户端的连接池大小
+        requests会话挂载固定大小的连接池；curl_cffi会话每个下载线程使用各自的连接，
+        总数已受 DOWNLOAD_THREAD_BUDGET 限制
+        """
+        session = getattr(getattr(client, "postman", None), "session", None)
+        if session is None or not hasattr(session, "mount"):
+            return
+        try:
+            from requests.adapters import HTTPAdapter
 
-        Args:
-            user_id: 用户ID，用于发送回复消息
-            group_id: 群组ID，如果是群聊则提供，私聊时为None
-            private: 是否为私聊消息
+            pool_size = int(self.config["DOWNLOAD_THREAD_BUDGET"])
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        except Exception as e:
+            self.logger.warning(f"设置jmcomic连接池大小失败: {e}")
 
-        Returns:
-            None: 此方法不返回值，直接通过send_message发送消息给用户
+    def _get_job_option(self) -> Any:
+        """
+        为单个下载任务复制共享的下载选项，任务可以修改目录规则与并发数而不影响其他任务，
+        复制出的选项通过 shared_client 属性使用共享客户端
 
-        Raises:
-            Exception: 当处理过程中出现任何错误时，会记录错误并向用户发送友好提示
+        返回:
+            Any: 本任务的jmcomic下载选项
         """
-        self.logger.info(f"显示下载进度请求 - 用户{user_id}")
+        shared_option, client = self._get_shared_jm_option()
+        option = shared_option.copy_option()
+        # copy_option 与原选项共用download配置字典，深拷贝后再修改并发数
+        option.download = type(shared_option.download)(
+            copy.deepcopy(shared_option.download.src_dict)
+        )
+        option.shared_client = client
+        return option
 
-        try:
-            # 获取正在下载的漫画列表
-            downloading_mangas: List[str] = list(self.downloading_mangas.keys())
-            # 获取队列中待下载的漫画列表
-            queued_mangas: List[str] = list(self.queued_tasks.keys())
+    def _ensure_library_space(self) -> None:
+        """
+        保证漫画库PDF总大小加上进行中任务的预留空间不超过容量上限
+        按淘汰策略依次删除PDF，跳过固定保留与正在发送的文件
+        """
+        quota = int(self.config["LIBRARY_QUOTA_MB"]) * 1024 * 1024
+        if quota <= 0:
+            return
 
-            # 构建响应消息
-            response: str = "📊 当前下载队列状态 📊\n\n"
+        # 已在进行中的任务与即将开始的任务各预留一份空间
+        _, _, active_jobs = self.resource_budget.usage()
+        reserve = int(self.config["JOB_DISK_RESERVE_MB"]) * 1024 * 1024 * (active_jobs + 1)
+        policy = str(self.config["EVICTION_POLICY"])
 
-            # 添加正在下载的信息
-            if downloading_mangas:
-                response += f"⏳ 正在下载: {len(downloading_mangas)} 个漫画\n"
-                for manga_id in downloading_mangas:
-                    response += f"  • {manga_id}\n"
-            else:
-                response += "✅ 当前没有正在下载的漫画\n"
+        if self.catalog is not None:
+            try:
+                used = self.catalog.total_bytes()
+                candidates = self.catalog.eviction_candidates(policy)
+            except sqlite3.Error as e:
+                self.logger.warning(f"读取漫画元数据目录失败，本次跳过淘汰: {e}")
+                return
+            candidates = [
+                (manga_id, os.path.join(self.library_layout.shard_dir(manga_id), file_name), size)
+                for manga_id, file_name, size in candidates
+            ]
+        else:
+            # 没有元数据目录时按文件修改时间从旧到新淘汰
+            candidates = []
+            for manga_id in self.library_index.manga_ids():
+                for _, file_path in self.library_index.lookup(manga_id):
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    candidates.append((stat.st_mtime, manga_id, file_path, stat.st_size))
+            candidates.sort()
+            used = sum(item[3] for item in candidates)
+            candidates = [item[1:] for item in candidates]
+
+        if used + reserve <= quota:
+            return
 
-            response += "\n"
+        self.logger.info(
+            f"漫画库已用 {used / 1024 / 1024:.1f}MB，预留 {reserve / 1024 / 1024:.0f}MB，"
+            f"超出上限 {quota / 1024 / 1024:.0f}MB，按 {policy} 策略淘汰"
+        )
+        evicted = 0
+        for manga_id, file_path, size in candidates:
+            if used + reserve <= quota:
+                break
+            if manga_id in self.pinned_manga_ids:
+                continue
+            with self.library_lock:
+                if self.sending_files.get(file_path):
+                    continue
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    self.logger.warning(f"淘汰PDF失败: {file_path}, 错误: {e}")
+                    continue
+                self.library_index.remove(file_path)
+            if self.catalog is not None and not self.library_index.contains(manga_id):
+                try:
+                    self.catalog.remove(manga_id)
+                except sqlite3.Error as e:
+                    self.logger.warning(f"删除漫画元数据失败: {e}")
+            used -= size
+            evicted += 1
+            self.logger.info(f"已淘汰漫画 {manga_id}: {file_path}（{size / 1024 / 1024:.1f}MB）")
+
+        if used + reserve > quota:
+            self.logger.warning(
+                f"淘汰 {evicted} 个PDF后漫画库仍超出上限（已用 {used / 1024 / 1024:.1f}MB），"
+                f"剩余文件均为固定保留或正在发送"
+            )
 
-            # 添加队列等待信息
-            if queued_mangas:
-                response += f"📋 队列等待: {len(queued_mangas)} 个漫画\n"
-                for manga_id in queued_mangas:
-                    response += f"  • {manga_id}\n"
-            else:
-                response += "✅ 下载队列为空\n"
+    def _set_job_stage(self, job: DownloadJob, stage: str) -> None:
+        """
+        更新任务阶段，并同步到持久化日志
 
-            response += "\n"
-            response += f"📝 总任务数: {len(downloading_mangas) + len(queued_mangas)}\n"
-            response += "\n💡 提示: 下载任务将按顺序执行，请耐心等待"
+        参数:
+            job: 下载任务对象
+            stage: DownloadJob.STAGE_* 之一
+        """
+        job.stage = stage
+        if self.journal is not None:
+            try:
+                self.journal.update_stage(job.manga_id, stage)
+            except sqlite3.Error as e:
+                self.logger.warning(f"更新任务日志失败: {e}")
 
-            # 发送响应消息
-            self.send_message(user_id, response, group_id, private)
+    def _notify_job_subscribers(self, job: DownloadJob, message: str) -> None:
+        """
+        向等待该任务的所有请求者发送消息
 
-        except Exception as e:
-            self.logger.error(f"显示下载进度时出错: {e}")
-            error_msg = "❌ 查询下载进度失败：请稍后再试"
-            self.send_message(user_id, error_msg, group_id, private)
+        参数:
+            job: 下载任务对象
+            message: 消息内容
+        """
+        for user_id, group_id, private in list(job.subscribers):
+            self.send_message(user_id, message, group_id, private)
 
-    def handle_manga_download(
-        self, user_id: str, manga_id: str, group_id: str, private: bool
-    ) -> None:
+    def _enqueue_job(self, job: DownloadJob) -> None:
         """
-        处理漫画下载请求
-        检查漫画是否已存在，然后将下载任务添加到队列中
+        将任务加入下载队列，并在后台获取漫画的章节数与页数，用于短任务优先排序与估算开始时间
 
         参数:
-            user_id: 用户ID，请求下载的用户
-            manga_id: 漫画ID (由CommandParser验证)
-            group_id: 群ID，请求来源的群组
-            private: 是否为私聊，决定消息发送的方式
+            job: 下载任务对象
         """
-        self.logger.info(f"处理漫画下载请求 - 用户{user_id}, 漫画ID: {manga_id}")
-
-        # 在下载前先检查漫画是否已存在
+        self.download_queue.put(job)
         try:
-            # 检查下载目录是否存在
-            if not os.path.exists(self.config["MANGA_DOWNLOAD_PATH"]):
-                # 目录不存在，需要创建并继续下载
-                os.makedirs(self.config["MANGA_DOWNLOAD_PATH"], exist_ok=True)
-                self.logger.info(f"创建下载目录: {self.config['MANGA_DOWNLOAD_PATH']}")
-            else:
-                # 查找是否存在对应的PDF文件
-                found = False
-                found_files = []
-
-                # 遍历所有PDF文件
-                for file_name in os.listdir(self.config["MANGA_DOWNLOAD_PATH"]):
-                    if file_name.endswith(".pdf"):
-                        # 检查文件名是否包含该漫画ID
-                        name_without_ext = os.path.splitext(file_name)[0]
-                        # 检查文件名是否以ID开头或包含ID-格式
-                        if (
-                            name_without_ext.startswith(manga_id + "-")
-                            or name_without_ext == manga_id
-                        ):
-                            found = True
-                            found_files.append(name_without_ext)
+            self.metadata_pool.submit(self._fetch_album_metadata, job)
+        except RuntimeError:
+            # 关闭过程中线程池已停止，按未知页数排序
+            pass
 
-                # 如果已存在，则通知用户
-                if found:
-                    response = f"✅૮₍ ˶•‸•˶₎ა 漫画ID {manga_id} 已经下载过了！\n\n"
-                    response += "找到以下文件：\n"
-                    for i, file_name in enumerate(found_files, 1):
-                        response += f"{i}. {file_name}\n"
-                    response += "\n你可以使用 '发送 {manga_id}' 命令获取该漫画哦~"
-                    self.send_message(user_id, response, group_id, private)
-                    return
+    def _fetch_album_metadata(self, job: DownloadJob) -> None:
+        """
+        获取漫画详情，填充任务的章节数、页数、标题与作者，失败时按未知页数排序
+
+        参数:
+            job: 下载任务对象
+        """
+        if job.stage != DownloadJob.STAGE_QUEUED:
+            return
+        try:
+            _, client = self._get_shared_jm_option()
+            album = client.get_album_detail(job.manga_id)
         except Exception as e:
-            self.logger.error(f"检查漫画是否已下载时出错: {e}")
-            # 检查出错时继续下载，避免因检查失败而影响用户体验
+            self.logger.warning(f"获取漫画 {job.manga_id} 的详情失败，按未知页数排队: {e}")
+            return
+        self._apply_album_metadata(job, album)
+        # 仍在排队时保留详情，下载阶段直接使用（已开始下载的任务会自行获取）
+        if job.stage == DownloadJob.STAGE_QUEUED:
+            job.album = album
+            job.album_fetched_at = time.time()
+        self.logger.info(
+            f"漫画 {job.manga_id} 详情: {job.chapters} 章, {job.pages or '未知'} 页"
+        )
 
-        # 发送开始下载的消息
-        response = f"开始下载漫画ID：{manga_id}啦~，请稍候..."
-        self.send_message(user_id, response, group_id, private)
+    @staticmethod
+    def _apply_album_metadata(job: DownloadJob, album: Any) -> None:
+        """
+        用漫画详情填充任务的章节数、页数、标题与作者
 
-        # 将下载任务添加到队列（download_manga方法现在会将任务添加到队列中）
-        self.download_manga(user_id, manga_id, group_id, private)
+        参数:
+            job: 下载任务对象
+            album: jmcomic漫画详情
+        """
+        job.chapters = len(album)
+        job.pages = int(getattr(album, "page_count", 0) or 0) or job.pages
+        job.title = job.title or str(getattr(album, "name", "") or "")
+        job.author = job.author or str(getattr(album, "author", "") or "")
 
-    def _process_download_task(
-        self, user_id: str, manga_id: str, group_id: str, private: bool
-    ) -> None:
+    def _update_download_speed(self, job: DownloadJob, downloaded_images: int) -> None:
         """
-        处理队列中的下载任务
-        实际执行漫画下载的方法，确保下载任务按顺序执行，避免并发下载导致的资源竞争
+        根据刚完成的下载更新平均每页下载耗时（指数滑动平均）
 
         参数:
-            user_id: 用户ID，用于回复下载状态
-            manga_id: 漫画ID，指定要下载的漫画
-            group_id: 群ID，用于在群聊中发送消息
-            private: 是否为私聊，决定消息发送的目标
-
-        异常:
-            所有下载相关的异常都会被捕获并记录，确保队列继续处理其他任务
+            job: 刚完成下载阶段的任务
+            downloaded_images: 本次实际下载的图片数
         """
-        # 下载漫画函数
-        try:
-            # 从队列任务跟踪中移除（已开始处理）
-            if manga_id in self.queued_tasks:
-                del self.queued_tasks[manga_id]
-            # 标记该漫画正在下载中
-            self.downloading_mangas[manga_id] = True
+        if job.download_started is None or downloaded_images <= 0:
+            return
+        seconds_per_page = (time.time() - job.download_started) / downloaded_images
+        self.seconds_per_page = 0.7 * self.seconds_per_page + 0.3 * seconds_per_page
 
-            # 使用jmcomic库下载漫画
-            self.logger.info("开始下载漫画ID: %s", manga_id)
-            # 从配置文件创建下载选项对象（使用相对路径）
-            option = jmcomic.create_option_by_file("option.yml")
-            # 确保使用环境变量中的下载路径
-            option.dir_rule.base_dir = self.config["MANGA_DOWNLOAD_PATH"]
+    def _estimate_start_times(self) -> Dict[str, float]:
+        """
+        估算排队中的任务还需等待多久开始下载
+        按队列的出队顺序，将任务依次分配给最早空闲的下载线程，任务耗时按 页数 × 平均每页耗时 估算
 
-            # 设置目录命名规则，将漫画ID和名称组合在同一个文件夹名中
-            # 使用f-string格式的规则，这样会创建 {base_dir}/{album_id}-{album_title}/{photo_title} 的目录结构
-            # 在jmcomic v2.5.36+版本支持这种语法
-            new_rule = "Bd / {Aid}-{Atitle}"
-            from jmcomic.jm_option import DirRule
+        返回:
+            Dict[str, float]: {manga_id: 预计等待秒数}
+        """
+        now = time.time()
+        slots = [0.0] * int(self.config["DOWNLOAD_WORKERS"])
+        downloading = [
+            job
+            for job in list(self.download_jobs.values())
+            if job.stage == DownloadJob.STAGE_DOWNLOADING and job.download_started
+        ]
+        for index, job in enumerate(downloading[: len(slots)]):
+            duration = FairDownloadQueue.estimated_pages(job) * self.seconds_per_page
+            slots[index] = max(0.0, job.download_started + duration - now)
+
+        estimates: Dict[str, float] = {}
+        for job in self.download_queue.ordered_jobs():
+            index = min(range(len(slots)), key=slots.__getitem__)
+            estimates[job.manga_id] = slots[index]
+            slots[index] += FairDownloadQueue.estimated_pages(job) * self.seconds_per_page
+        return estimates
+
+    @staticmethod
+    def _format_wait(seconds: float) -> str:
+        """将等待秒数格式化为简短的中文描述"""
+        if seconds < 60:
+            return "即将开始"
+        if seconds < 3600:
+            return f"约{int(seconds // 60)}分钟后开始"
+        return f"约{seconds / 3600:.1f}小时后开始"
+
+    def _finish_job(self, job: DownloadJob, message: Optional[str] = None) -> None:
+        """
+        结束下载任务，移除正在下载的标记与任务跟踪记录，然后通知所有请求者
+        先从登记表移除再通知，之后的同ID请求会新建任务，不会出现加入后收不到通知的情况
 
-            # 创建新的DirRule对象并替换原有的
-            option.dir_rule = DirRule(new_rule, base_dir=option.dir_rule.base_dir)
-
-            jmcomic.download_album(manga_id, option=option)
-
-            # 查找漫画文件夹 - 简化逻辑，只检查是否以漫画ID开头
-            manga_dir = None
-            # 直接在基础下载目录下查找
-            download_path = str(self.config["MANGA_DOWNLOAD_PATH"])
-            if os.path.exists(download_path):
-                for dir_name in os.listdir(download_path):
-                    dir_path = os.path.join(download_path, dir_name)
-                    # 检查是否是目录且以漫画ID开头
-                    if os.path.isdir(dir_path) and dir_name.startswith(f"{manga_id}-"):
-                        manga_dir = dir_path
-                        break
+        参数:
+            job: 已结束（成功或失败）的任务对象
+            message: 发送给所有请求者的结果消息，为None时不发送
+        """
+        # 下载完成或失败后，归还资源额度并移除正在下载的标记
+        self.resource_budget.release(job.manga_id)
+        with self.jobs_lock:
+            if job.manga_id in self.downloading_mangas:
+                del self.downloading_mangas[job.manga_id]
+            if self.download_jobs.get(job.manga_id) is job:
+                del self.download_jobs[job.manga_id]
+                if self.journal is not None:
+                    try:
+                        self.journal.remove_job(job.manga_id)
+                    except sqlite3.Error as e:
+                        self.logger.warning(f"删除任务日志记录失败: {e}")
 
-            # 如果在基础目录没找到，再尝试递归查找（兼容可能的其他情况）
-            if not manga_dir:
-                for root, dirs, files in os.walk(download_path):
-                    for dir_name in dirs:
-                        if dir_name.startswith(f"{manga_id}-"):
-                            manga_dir = os.path.join(root, dir_name)
-                            break
-                    if manga_dir:
-                        break
+        if message is not None:
+            self._notify_job_subscribers(job, message)
 
-            if manga_dir and os.path.exists(manga_dir):
-                # 从manga_dir路径中提取文件夹名称
-                folder_name = os.path.basename(manga_dir)
-                pdf_path = os.path.join(download_path, f"{folder_name}.pdf")
-                import shutil
-                import sys
+    def _get_convert_pool(self) -> "concurrent.futures.ProcessPoolExecutor":
+        """
+        获取PDF页面处理进程池，首次使用时创建，之后所有转换任务共用
 
-                # 安装必要地依赖（如果没有的话）
-                try:
-                    from PIL import Image
-                except ImportError:
-                    self.logger.info("正在安装PIL库...")
-                    import subprocess
+        Returns:
+            ProcessPoolExecutor: 页面处理进程池
+        """
+        with self.convert_pool_lock:
+            if self.convert_pool is None:
+                workers = int(self.config["PDF_CONVERT_WORKERS"])
+                self.convert_pool = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=workers
+                )
+                self.logger.info(f"PDF页面处理进程池已创建，进程数: {workers}")
+            return self.convert_pool
 
-                    subprocess.check_call(
-                        [sys.executable, "-m", "pip", "install", "Pillow"]
-                    )
-                    from PIL import Image
+    def _iter_prepared_pages(
+        self, image_files: List[str]
+    ) -> Iterator[Tuple[bytes, int, int, str, bool]]:
+        """
+        按原始顺序逐页产出处理好的PDF页面数据
 
-                # 收集所有图片文件
-                image_extensions = [".jpg", ".jpeg", ".png", ".gif", ".webp"]
-                image_files = []
+        PDF_CONVERT_WORKERS大于1时，页面的解码、模式转换、缩放与编码在进程池中并行执行，
+        同时只保留有限数量的未消费结果，保证内存占用仍然有界
 
-                for root, _, files in os.walk(manga_dir):
-                    for file in files:
-                        if any(file.lower().endswith(ext) for ext in image_extensions):
-                            image_files.append(os.path.join(root, file))
+        Args:
+            image_files: 已排序的图片路径列表
 
-                # 按文件名排序
-                image_files.sort()
+        Yields:
+            Tuple[bytes, int, int, str, bool]: _prepare_pdf_page的返回值
+        """
+        quality = int(self.config["PDF_JPEG_QUALITY"])
+        passthrough = bool(self.config["PDF_JPEG_PASSTHROUGH"])
+        max_width = int(self.config["PDF_MAX_PAGE_WIDTH"])
+        workers = int(self.config["PDF_CONVERT_WORKERS"])
+
+        if workers <= 1:
+            for img_path in image_files:
+                yield _prepare_pdf_page(img_path, quality, passthrough, max_width)
+            return
 
-                if not image_files:
-                    self.logger.warning(f"在漫画文件夹中未找到图片文件: {manga_dir}")
-                    response = f"✅（｀Δ´）！ 漫画ID {manga_id} 下载完成！\n未找到图片文件，无法转换为PDF\n\n⚠️ 注意：当前版本只支持发送PDF格式的漫画文件"
-                    self.send_message(user_id, response, group_id, private)
-                    return
+        pool = self._get_convert_pool()
+        # 预取窗口：每个进程最多领先两页，避免结果在内存中堆积
+        window_size = workers * 2
+        pending: Deque[concurrent.futures.Future] = deque()
+        next_index = 0
+        try:
+            while next_index < len(image_files) or pending:
+                while next_index < len(image_files) and len(pending) < window_size:
+                    pending.append(
+                        pool.submit(
+                            _prepare_pdf_page,
+                            image_files[next_index],
+                            quality,
+                            passthrough,
+                            max_width,
+                        )
+                    )
+                    next_index += 1
+                yield pending.popleft().result()
+        except concurrent.futures.BrokenExecutor:
+            # 工作进程异常退出（如被OOM终止），丢弃进程池以便下次重新创建
+            with self.convert_pool_lock:
+                self.convert_pool = None
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
 
-                self.logger.info(f"找到 {len(image_files)} 个图片文件，开始转换为PDF")
+    def _convert_images_to_pdf(
+        self, manga_id: str, image_files: List[str], pdf_path: str
+    ) -> Dict[str, Any]:
+        """
+        将图片列表转换为PDF，并统计耗时与峰值内存
 
-                # 转换为PDF
-                try:
-                    # 打开第一张图片作为PDF的第一页
-                    first_image = Image.open(image_files[0])
-                    # 确保图片为RGB模式
-                    if first_image.mode == "RGBA":
-                        first_image = first_image.convert("RGB")
-
-                    # 准备其他图片
-                    other_images = []
-                    for img_path in image_files[1:]:
-                        img = Image.open(img_path)
-                        # 确保图片为RGB模式
-                        if img.mode == "RGBA":
-                            img = img.convert("RGB")
-                        other_images.append(img)
-
-                    # 保存为PDF
-                    first_image.save(
-                        pdf_path, save_all=True, append_images=other_images
-                    )
-                    self.logger.info(f"成功将漫画 {manga_id} 转换为PDF: {pdf_path}")
+        stream模式下逐页打开、编码、写入并立即释放图片，内存占用不随页数增长；
+        pillow模式保留旧版行为，一次性打开所有图片后保存
 
-                    # 删除原漫画文件夹
-                    self.logger.info(f"删除原漫画文件夹: {manga_dir}")
-                    shutil.rmtree(manga_dir)
+        参数:
+            manga_id: 漫画ID，仅用于日志
+            image_files: 已排序的图片路径列表
+            pdf_path: 输出PDF路径
 
-                    response = f"✅ദ്ദി˶>ω<)✧ 漫画ID {manga_id} 下载并转换为PDF完成！\n\n友情提示：输入'发送 {manga_id}'可以将PDF发送给您"
-                except Exception as pdf_error:
-                    self.logger.error(f"转换为PDF失败: {pdf_error}")
-                    response = f"✅（｀Δ´）！ 漫画ID {manga_id} 下载完成，但转换为PDF失败: {str(pdf_error)}\n\n⚠️ 注意：当前版本只支持发送PDF格式的漫画文件，请确保漫画成功转换为PDF后再尝试发送"
-            else:
-                response = f"✅（｀Δ´）！ 漫画ID {manga_id} 下载完成！\n未找到漫画文件夹，无法转换为PDF\n\n⚠️ 注意：当前版本只支持发送PDF格式的漫画文件，请确保漫画成功转换为PDF后再尝试发送"
+        返回:
+            Dict[str, Any]: 转换统计信息 {pages, seconds, peak_rss}
+        """
+        from PIL import Image
+
+        start_time = time.perf_counter()
+        start_rss = _get_process_rss()
+        peak_rss = start_rss
+        # 直接嵌入（未重新编码）的JPEG页数
+        passthrough_pages = 0
+
+        if self.config["PDF_WRITER_MODE"] == "pillow":
+            # 旧版模式：所有页面同时驻留内存
+            first_image = Image.open(image_files[0])
+            if first_image.mode == "RGBA":
+                first_image = first_image.convert("RGB")
+            other_images = []
+            for img_path in image_files[1:]:
+                img = Image.open(img_path)
+                if img.mode == "RGBA":
+                    img = img.convert("RGB")
+                other_images.append(img)
+            first_image.save(pdf_path, save_all=True, append_images=other_images)
+            peak_rss = _get_process_rss()
+        else:
+            with StreamingPdfWriter(pdf_path) as writer:
+                for prepared_page in self._iter_prepared_pages(image_files):
+                    jpeg_data, width, height, color_space, embedded = prepared_page
+                    del prepared_page
+                    writer.add_jpeg_page(jpeg_data, width, height, color_space)
+                    del jpeg_data
+                    if embedded:
+                        passthrough_pages += 1
+
+                    current_rss = _get_process_rss()
+                    if current_rss is not None and (
+                        peak_rss is None or current_rss > peak_rss
+                    ):
+                        peak_rss = current_rss
 
-            self.send_message(user_id, response, group_id, private)
-        except Exception as e:
-            self.logger.error(f"下载漫画出错: {e}")
-            error_msg = f"❌ 下载失败：{str(e)}\n\n快让主人帮我检查一下∑(O_O；)"
-            self.send_message(user_id, error_msg, group_id, private)
-        finally:
-            # 下载完成或失败后，移除正在下载的标记
-            if manga_id in self.downloading_mangas:
-                del self.downloading_mangas[manga_id]
+        elapsed = time.perf_counter() - start_time
+        workers = int(self.config["PDF_CONVERT_WORKERS"])
+        peak_display = f"{peak_rss / 1024 / 1024:.1f}MB" if peak_rss else "未知"
+        self.logger.info(
+            f"漫画 {manga_id} PDF转换完成 - 模式: {self.config['PDF_WRITER_MODE']}, "
+            f"转换进程数: {workers if workers > 1 else 1}, "
+            f"页数: {len(image_files)}, 直通嵌入: {passthrough_pages}, "
+            f"耗时: {elapsed:.2f}秒, 峰值内存: {peak_display}"
+        )
+        return {
+            "pages": len(image_files),
+            "passthrough_pages": passthrough_pages,
+            "seconds": elapsed,
+            "peak_rss": peak_rss,
+        }
 
     def download_manga(
         self, user_id: str, manga_id: str, group_id: str, private: bool
-    ) -> None:
+    ) -> Tuple[Optional[DownloadJob], bool]:
         """
         下载漫画的兼容方法
         保持向后兼容，实际操作是将任务添加到下载队列，而不是直接执行下载
-        这样可以确保所有下载任务按顺序执行，避免资源冲突和混乱
+        同一漫画ID已在队列中或正在处理时不会重复下载，而是把请求者加入该任务的通知列表
 
         参数:
             user_id: 用户ID，用于回复下载状态
             manga_id: 漫画ID，指定要下载的漫画
             group_id: 群ID，用于在群聊中发送消息
             private: 是否为私聊，决定消息发送的目标
+
+        返回:
+            Tuple[Optional[DownloadJob], bool]: (对应的下载任务, 是否新建了任务)，
+            用户排队任务数已达上限时任务为None
         """
-        # 记录任务到状态跟踪字典
-        self.queued_tasks[manga_id] = (user_id, group_id, private)
+        with self.jobs_lock:
+            existing_job = self.download_jobs.get(manga_id)
+            if existing_job is not None:
+                if (
+                    existing_job.add_subscriber(user_id, group_id, private)
+                    and self.journal is not None
+                ):
+                    try:
+                        self.journal.add_subscriber(manga_id, user_id, group_id, private)
+                    except sqlite3.Error as e:
+                        self.logger.warning(f"写入任务日志失败: {e}")
+                self.logger.info(
+                    f"漫画ID {manga_id} 已有下载任务（{existing_job.stage_label}），"
+                    f"合并请求 - 用户{user_id}, 当前等待者: {len(existing_job.subscribers)}"
+                )
+                return existing_job, False
+
+            max_queued = int(self.config["MAX_QUEUED_PER_USER"])
+            if (
+                max_queued
+                and user_id not in self.admin_ids
+                and self.download_queue.count_user(user_id) >= max_queued
+            ):
+                self.logger.info(
+                    f"用户{user_id} 排队任务数已达上限 {max_queued}，拒绝漫画ID {manga_id}"
+                )
+                return None, False
+
+            job = DownloadJob(user_id, manga_id, group_id, private)
+            # 记录任务到状态跟踪字典，并写入持久化日志
+            self.download_jobs[manga_id] = job
+            if self.journal is not None:
+                try:
+                    self.journal.add_job(job)
+                except sqlite3.Error as e:
+                    self.logger.warning(f"写入任务日志失败: {e}")
         # 将下载任务添加到队列
-        self.download_queue.put((user_id, manga_id, group_id, private))
+        self._enqueue_job(job)
         self.logger.info(f"漫画ID {manga_id} 的下载任务已添加到队列")
+        return job, True
 
     def handle_manga_send(self, user_id, manga_id, group_id, private):
         """
@@ -1444,10 +5520,14 @@ class MangaBot:
         response = f"ฅ( ̳• ·̫ • ̳ฅ)正在查找并准备发送漫画ID：{manga_id}，请稍候..."
         self.send_message(user_id, response, group_id, private)
 
-        # 在新线程中处理文件发送，避免阻塞
-        threading.Thread(
-            target=self.send_manga_files, args=(user_id, manga_id, group_id, private)
-        ).start()
+        # 交给发送线程池处理，避免阻塞命令处理
+        conversation_key = f"group:{group_id}" if not private else f"private:{user_id}"
+        if not self.send_dispatcher.submit(
+            conversation_key, self.send_manga_files, user_id, manga_id, group_id, private
+        ):
+            self.send_message(
+                user_id, "❌ 当前发送任务太多啦，请稍后再试(｡•́︿•̀｡)", group_id, private
+            )
 
     def send_manga_files(self, user_id, manga_id, group_id, private):
         # 发送漫画文件函数 - 只发送PDF文件
@@ -1458,24 +5538,45 @@ class MangaBot:
                 self.send_message(user_id, response, group_id, private)
                 return
 
-            # 检查是否有PDF文件，查找以漫画ID开头的PDF文件
+            # 从漫画库索引查找该漫画的PDF文件，找到后登记为发送中，防止被淘汰
             pdf_path = None
-            download_path = str(self.config["MANGA_DOWNLOAD_PATH"])
-            if os.path.exists(download_path):
-                for file_name in os.listdir(download_path):
-                    if file_name.startswith(f"{manga_id}-") and file_name.endswith(
-                        ".pdf"
-                    ):
-                        pdf_path = os.path.join(download_path, file_name)
+            with self.library_lock:
+                for _, file_path in self.library_index.lookup(manga_id):
+                    if os.path.exists(file_path):
+                        pdf_path = file_path
+                        self.sending_files[pdf_path] = (
+                            self.sending_files.get(pdf_path, 0) + 1
+                        )
                         break
+                    # 文件已在索引之外被删除，同步移出索引与元数据目录
+                    self.logger.info(f"PDF文件已不存在，移出索引: {file_path}")
+                    self.library_index.remove(file_path)
+                    if self.catalog is not None and not self.library_index.contains(
+                        manga_id
+                    ):
+                        try:
+                            self.catalog.remove(manga_id)
+                        except sqlite3.Error as e:
+                            self.logger.warning(f"删除漫画元数据失败: {e}")
 
-            if pdf_path and os.path.exists(pdf_path):
+            if pdf_path:
                 # 发送PDF文件
                 self.logger.info(f"找到PDF文件: {pdf_path}")
-                self.send_message(
-                    user_id, f"找到漫画PDF文件，开始发送...", group_id, private
-                )
-                self.send_file(user_id, pdf_path, group_id, private)
+                try:
+                    self.send_message(
+                        user_id, f"找到漫画PDF文件，开始发送...", group_id, private
+                    )
+                    sent = self.send_file(user_id, pdf_path, group_id, private)
+                finally:
+                    self._release_sending_file(pdf_path)
+                # 发送失败时send_file已通知用户失败原因
+                if not sent:
+                    return
+                if self.catalog is not None:
+                    try:
+                        self.catalog.record_send(manga_id)
+                    except sqlite3.Error as e:
+                        self.logger.warning(f"更新漫画发送记录失败: {e}")
                 self.send_message(
                     user_id, "✅ฅ( ̳• ·̫ • ̳ฅ) 漫画PDF发送完成！", group_id, private
                 )
@@ -1495,16 +5596,154 @@ class MangaBot:
         # 运行机器人主函数
         self.logger.info("JMComic下载机器人启动中...")
 
+        if self.config["RUNTIME_MODE"] == "asyncio":
+            asyncio.run(self._run_async())
+            return
+        if self.config["RUNTIME_MODE"] != "threaded":
+            self.logger.warning(
+                f"未知的运行模式 {self.config['RUNTIME_MODE']}，使用 threaded"
+            )
+
         # 连接WebSocket
         self.connect_websocket()
 
-        # 启动WebSocket重连管理线程
-        threading.Thread(target=self.websocket_reconnect_manager, daemon=True).start()
+        # 连接后在后台预热jmcomic与PIL，首个下载任务不必等待导入
+        threading.Thread(
+            target=self._warm_up_imports, name="import-warm-up", daemon=True
+        ).start()
+
+        # 已开始接收命令后再在后台进行启动恢复
+        if self.config["STARTUP_RECOVERY"] == "background":
+            self._start_startup_recovery()
 
         # 保持主程序运行
         while True:
             time.sleep(1)
 
+    async def _run_async(self) -> None:
+        """
+        asyncio运行模式：WebSocket连接、接收消息、按会话排队分发、重连计时与实际的消息写出都在事件循环中进行。
+        命令处理函数仍是同步实现（会扫描目录、读写数据库、等待发送结果），在 EVENT_WORKERS 个线程的线程池中执行；
+        发送队列（限流、合并、重试）仍由 OUTBOUND_SENDERS 个发送线程调度，最终交给事件循环写出。
+        线程数固定，不随会话数增加；下载与PDF转换仍由下载队列线程处理
+        """
+        try:
+            from websockets.asyncio.client import connect as ws_connect
+
+            header_argument = "additional_headers"
+        except ImportError:
+            try:
+                from websockets import connect as ws_connect  # type: ignore[no-redef]
+
+                header_argument = "extra_headers"
+            except ImportError:
+                self.logger.critical(
+                    "RUNTIME_MODE=asyncio 需要安装websockets库: pip install websockets"
+                )
+                return
+
+        self.async_loop = asyncio.get_running_loop()
+        self.async_loop.set_default_executor(
+            concurrent.futures.ThreadPoolExecutor(
+                max_workers=int(self.config["EVENT_WORKERS"]),
+                thread_name_prefix="async-handler",
+            )
+        )
+
+        # 后台预热与启动恢复同样交给线程池，不阻塞事件循环
+        self.async_loop.run_in_executor(None, self._warm_up_imports)
+        if self.config["STARTUP_RECOVERY"] == "background":
+            self.async_loop.run_in_executor(None, self._start_startup_recovery)
+
+        headers = {}
+        if self.config["NAPCAT_TOKEN"]:
+            headers["Authorization"] = f'Bearer {self.config["NAPCAT_TOKEN"]}'
+
+        attempt = 0
+        while not self.async_stopping:
+            self._set_connection_state("connecting")
+            with self.connection_lock:
+                self.connection_opened_at = None
+            try:
+                self.logger.info("正在连接WebSocket（asyncio模式）...")
+                async with ws_connect(
+                    str(self.config["NAPCAT_WS_URL"]), **{header_argument: headers}
+                ) as ws:
+                    self.async_ws = ws
+                    self.on_open(ws)
+                    async for message in ws:
+                        self._on_async_message(message)
+                self.on_close(None, None, "连接已关闭")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.on_error(None, e)
+            finally:
+                self.async_ws = None
+                self._set_connection_state("disconnected")
+
+            if self.async_stopping:
+                break
+            # 连接稳定运行过一段时间后断开的，从最短等待时间重新开始退避
+            if self._connection_was_stable():
+                attempt = 0
+            delay = _backoff_delay(
+                attempt,
+                base=int(self.config["RECONNECT_BASE_SECONDS"]),
+                maximum=int(self.config["RECONNECT_MAX_SECONDS"]),
+            )
+            attempt += 1
+            self.logger.info(f"{delay:.1f}秒后重新连接WebSocket（第{attempt}次）")
+            await asyncio.sleep(delay)
+
+    def _on_async_message(self, message: Union[str, bytes]) -> None:
+        """
+        asyncio模式下的消息处理：元事件直接处理，其余事件进入所属会话的队列，
+        每个会话同一时间只有一个处理任务，保证会话内按顺序处理
+        """
+        try:
+            data = json.loads(message)
+        except ValueError as e:
+            self.logger.error(f"处理WebSocket消息出错: {e}")
+            return
+        if "echo" in data and "post_type" not in data:
+            self._resolve_action(data)
+            return
+        if data.get("post_type") == "meta_event":
+            self.handle_event(data)
+            return
+        if self._is_duplicate_event(data):
+            return
+
+        limit = int(self.config["EVENT_WORKERS"]) * int(self.config["EVENT_QUEUE_SIZE"])
+        if self.async_pending_events >= limit:
+            self.logger.warning(
+                f"事件积压已达上限 {limit}，丢弃事件 - 会话: {self._conversation_key(data)}"
+            )
+            return
+        self.async_pending_events += 1
+
+        key = self._conversation_key(data)
+        pending = self.async_conversations.get(key)
+        if pending is not None:
+            pending.append(data)
+            return
+        self.async_conversations[key] = deque([data])
+        self.async_loop.create_task(self._drain_conversation(key))
+
+    async def _drain_conversation(self, key: str) -> None:
+        """依次处理一个会话中排队的事件，处理完后移除该会话"""
+        pending = self.async_conversations[key]
+        while pending:
+            data = pending.popleft()
+            try:
+                await self.async_loop.run_in_executor(None, self.handle_event, data)
+            except Exception as e:
+                self.logger.error(f"处理事件时出错: {e}")
+            finally:
+                self.async_pending_events -= 1
+        del self.async_conversations[key]
+
     def handle_safe_close(self) -> None:
         """安全关闭机器人，确保所有资源都被正确释放"""
         signal.signal(signal.SIGINT, self._safe_sigint_handler)
@@ -1565,7 +5804,13 @@ class MangaBot:
         try:
             self.logger.info("开始关闭JMComic下载机器人资源...")
 
-            # 1. 关闭WebSocket连接
+            # 1. 关闭WebSocket连接（先停止监督线程的重连）
+            self.connection_stopping = True
+            if self.async_loop is not None:
+                self.async_stopping = True
+                if self.async_ws is not None:
+                    self.logger.info("关闭WebSocket连接...")
+                    asyncio.run_coroutine_threadsafe(self.async_ws.close(), self.async_loop)
             if self.ws is not None:
                 try:
                     if self.ws.sock and self.ws.sock.connected:
@@ -1578,10 +5823,33 @@ class MangaBot:
                     self.logger.error(f"关闭WebSocket连接时出错: {ws_error}")
                     raise ws_error  # Fail Fast：重新抛出异常，让调用者知道关闭过程失败
 
+            # 停止事件分发与发送线程池
+            self.event_dispatcher.stop()
+            self.send_dispatcher.stop()
+            self.outbound.stop()
+
             # 2. 停止下载队列线程
             self.logger.info("停止下载队列处理线程...")
             self.queue_running = False
             self.logger.info("下载队列线程已设置为停止状态")
+            # 停止获取漫画页数的线程池，尚未开始的请求直接取消
+            self.metadata_pool.shutdown(wait=False, cancel_futures=True)
+
+            # 关闭PDF页面处理进程池
+            if self.convert_pool is not None:
+                self.logger.info("关闭PDF页面处理进程池...")
+                self.convert_pool.shutdown(wait=False, cancel_futures=True)
+                self.convert_pool = None
+
+            # 关闭漫画元数据目录
+            # 仍在运行的下载与转换线程之后的写入会被忽略，因此不置为None
+            if self.catalog is not None:
+                self.catalog.close()
+
+            # 关闭下载任务日志（未完成的任务保留在日志中，下次启动时恢复）
+            # 仍在运行的下载与转换线程之后的写入会被忽略，因此不置为None
+            if self.journal is not None:
+                self.journal.close()
 
             # 3. 清理下载状态
             if self.downloading_mangas:
@@ -1606,8 +5874,47 @@ class MangaBot:
             raise  # Fail Fast：重新抛出异常，让调用者知道关闭过程失败
 
 
+def _run_cli(argv: List[str]) -> int:
+    """
+    命令行维护工具，目前支持迁移漫画库目录布局：
+        python bot.py --migrate-layout sharded
+
+    参数:
+        argv: 命令行参数（不含程序名）
+
+    返回:
+        int: 退出码
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="JMComic下载机器人维护工具")
+    parser.add_argument(
+        "--migrate-layout",
+        choices=LibraryLayout.LAYOUTS,
+        required=True,
+        help="将下载目录中的PDF与漫画文件夹迁移到指定的目录布局（运行前请先停止机器人）",
+    )
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    download_path = _resolve_download_path()
+    layout = LibraryLayout(download_path, args.migrate_layout)
+    loguru_logger.info(f"开始迁移漫画库到 {args.migrate_layout} 布局: {download_path}")
+    moved, skipped = layout.migrate()
+    loguru_logger.info(f"迁移完成 - 已移动: {moved} 个, 目标已存在而跳过: {skipped} 个")
+    if args.migrate_layout != os.getenv("LIBRARY_LAYOUT", "flat").strip().lower():
+        loguru_logger.warning(
+            f"请在 .env 中设置 LIBRARY_LAYOUT={args.migrate_layout} 后再启动机器人"
+        )
+    return 0
+
+
 # 如果直接运行此文件
 if __name__ == "__main__":
+    # 带参数运行时作为维护工具，不启动机器人
+    if len(sys.argv) > 1:
+        sys.exit(_run_cli(sys.argv[1:]))
+
     # 创建机器人实例
     bot = MangaBot()
     # 设置安全关闭机制，确保程序可以正确响应Ctrl+C信号
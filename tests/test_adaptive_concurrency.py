@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from bot import AdaptiveConcurrency
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def _window(controller, clock, images, failures=0, size=100_000, seconds=1.0):
+    for _ in range(images):
+        controller.record_success(size)
+    for _ in range(failures):
+        controller.record_failure()
+    clock[0] += seconds
+    return controller.adjust()
+
+
+def test_keeps_concurrency_until_enough_samples(clock):
+    controller = AdaptiveConcurrency(initial=5, maximum=10)
+    assert _window(controller, clock, images=3) == 5
+
+
+def test_increases_while_throughput_improves_up_to_maximum(clock):
+    controller = AdaptiveConcurrency(initial=5, maximum=7)
+    assert _window(controller, clock, images=10) == 6
+    assert _window(controller, clock, images=12) == 7
+    assert _window(controller, clock, images=14) == 7
+    assert controller.peak == 7
+
+
+def test_steps_back_when_more_concurrency_makes_it_slower(clock):
+    controller = AdaptiveConcurrency(initial=5, maximum=10)
+    assert _window(controller, clock, images=10) == 6
+    assert _window(controller, clock, images=6) == 5
+
+
+def test_halves_on_failures_and_holds_while_they_continue(clock):
+    controller = AdaptiveConcurrency(initial=8, maximum=10)
+    assert _window(controller, clock, images=8, failures=4) == 4
+    assert _window(controller, clock, images=9, failures=1) == 4
+    assert _window(controller, clock, images=10) == 5
+
+
+def test_never_drops_below_minimum(clock):
+    controller = AdaptiveConcurrency(initial=1, maximum=10)
+    assert _window(controller, clock, images=0, failures=4) == 1
@@ -0,0 +1,31 @@
+from bot import AlbumManifest
+
+
+def test_resume_keeps_only_pages_recorded_with_matching_size(tmp_path):
+    chapter = tmp_path / "1"
+    chapter.mkdir()
+    complete = chapter / "00001.jpg"
+    complete.write_bytes(b"x" * 100)
+    truncated = chapter / "00002.jpg"
+    truncated.write_bytes(b"x" * 100)
+    unrecorded = chapter / "00003.jpg"
+    unrecorded.write_bytes(b"x" * 10)
+
+    manifest = AlbumManifest(str(tmp_path))
+    manifest.record(str(complete))
+    manifest.record(str(truncated))
+    # 中断时文件只写了一半
+    truncated.write_bytes(b"x" * 40)
+
+    resumed = AlbumManifest(str(tmp_path))
+    assert resumed.page_count == 2
+    assert resumed.prune_unverified() == 2
+    assert complete.exists()
+    assert not truncated.exists()
+    assert not unrecorded.exists()
+    assert resumed.page_count == 1
+
+
+def test_incomplete_last_line_is_ignored(tmp_path):
+    (tmp_path / AlbumManifest.FILE_NAME).write_text("1/00001.jpg\t100\n1/00002.jp", "utf-8")
+    assert AlbumManifest(str(tmp_path)).load() == {"1/00001.jpg": 100}
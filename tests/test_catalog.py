@@ -0,0 +1,77 @@
+import os
+import time
+
+from bot import MangaCatalog
+
+
+def _catalog(tmp_path):
+    return MangaCatalog(str(tmp_path / ".mangabot.db"))
+
+
+def test_reconcile_backfills_existing_pdfs_and_drops_missing_ones(tmp_path):
+    catalog = _catalog(tmp_path)
+    catalog.record_download("999", "已删除", "", 10, 100, "999-已删除.pdf")
+    pdf_path = tmp_path / "123-标题.pdf"
+    pdf_path.write_bytes(b"x" * 42)
+
+    assert catalog.reconcile([(pdf_path.name, str(pdf_path))]) == (1, 1)
+    assert catalog.get("999") is None
+    row = catalog.get("123")
+    assert (row["title"], row["byte_size"], row["send_count"]) == ("标题", 42, 0)
+    # 已有记录的漫画不再重复补录
+    assert catalog.reconcile([(pdf_path.name, str(pdf_path))]) == (0, 0)
+
+
+def test_redownload_keeps_send_statistics(tmp_path):
+    catalog = _catalog(tmp_path)
+    catalog.record_download("1", "旧标题", "", 10, 100, "1-旧标题.pdf")
+    catalog.record_send("1")
+    catalog.record_download("1", "新标题", "作者", 12, 120, "1-新标题.pdf")
+
+    row = catalog.get("1")
+    assert (row["title"], row["author"], row["send_count"]) == ("新标题", "作者", 1)
+    assert catalog.total_bytes() == 120
+    assert catalog.list_file_names() == ["1-新标题.pdf"]
+
+
+def test_calls_after_close_are_ignored(tmp_path):
+    catalog = _catalog(tmp_path)
+    catalog.record_download("1", "标题", "", 10, 100, "1-标题.pdf")
+    catalog.close()
+
+    catalog.record_send("1")
+    catalog.remove("1")
+    assert catalog.get("1") is None
+    assert catalog.eviction_candidates("lru") == []
+    assert os.path.exists(catalog.db_path)
+    assert _catalog(tmp_path).get("1")["send_count"] == 0
+
+
+def _catalog_with_history(tmp_path, monkeypatch):
+    """
+    三部漫画：1 最早下载、发送过两次；2 从未发送；3 最晚下载、最近发送过一次
+    """
+    clock = iter([100.0, 200.0, 300.0, 400.0, 500.0, 600.0])
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    catalog = _catalog(tmp_path)
+    catalog.record_download("1", "", "", 1, 10, "1.pdf")
+    catalog.record_download("2", "", "", 1, 20, "2.pdf")
+    catalog.record_download("3", "", "", 1, 30, "3.pdf")
+    catalog.record_send("1")
+    catalog.record_send("1")
+    catalog.record_send("3")
+    return catalog
+
+
+def test_lru_evicts_least_recently_used_first(tmp_path, monkeypatch):
+    catalog = _catalog_with_history(tmp_path, monkeypatch)
+    assert [row[0] for row in catalog.eviction_candidates("lru")] == ["2", "1", "3"]
+
+
+def test_lfu_evicts_least_sent_first(tmp_path, monkeypatch):
+    catalog = _catalog_with_history(tmp_path, monkeypatch)
+    assert catalog.eviction_candidates("lfu") == [
+        ("2", "2.pdf", 20),
+        ("3", "3.pdf", 30),
+        ("1", "1.pdf", 10),
+    ]
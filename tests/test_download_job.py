@@ -0,0 +1,22 @@
+from bot import DownloadJob
+
+
+def test_add_subscriber_notifies_each_private_user_and_group_once():
+    job = DownloadJob("10", "123", "900", False)
+
+    assert not job.add_subscriber("11", "900", False)
+    assert job.add_subscriber("11", None, True)
+    assert not job.add_subscriber("11", None, True)
+    assert job.add_subscriber("12", "901", False)
+
+    assert job.subscribers == [
+        ("10", "900", False),
+        ("11", None, True),
+        ("12", "901", False),
+    ]
+
+
+def test_job_without_subscribers_sends_no_notifications():
+    job = DownloadJob.without_subscribers("123")
+    assert job.subscribers == []
+    assert job.stage == DownloadJob.STAGE_QUEUED
@@ -0,0 +1,128 @@
+import queue
+import time
+
+import pytest
+
+from bot import DownloadJob, FairDownloadQueue, _PrefetchedAlbumClient
+
+
+def _job(manga_id, user_id="10", group_id=None, pages=None, created_at=None):
+    job = DownloadJob(user_id, manga_id, group_id, group_id is None)
+    job.pages = pages
+    job.created_at = time.time() if created_at is None else created_at
+    return job
+
+
+def _drain(download_queue):
+    order = []
+    while download_queue.qsize():
+        order.append(download_queue.get(timeout=0).manga_id)
+    return order
+
+
+def test_tenants_take_turns_instead_of_first_come_first_served():
+    download_queue = FairDownloadQueue()
+    now = time.time()
+    for manga_id in ("a1", "a2", "a3"):
+        download_queue.put(_job(manga_id, group_id="1", pages=100, created_at=now))
+    download_queue.put(_job("b1", group_id="2", pages=100, created_at=now))
+    download_queue.put(_job("p1", user_id="20", pages=100, created_at=now))
+
+    assert _drain(download_queue) == ["a1", "b1", "p1", "a2", "a3"]
+
+
+def test_users_in_one_group_take_turns():
+    download_queue = FairDownloadQueue()
+    now = time.time()
+    download_queue.put(_job("u1-1", user_id="11", group_id="1", pages=100, created_at=now))
+    download_queue.put(_job("u1-2", user_id="11", group_id="1", pages=100, created_at=now))
+    download_queue.put(_job("u2-1", user_id="12", group_id="1", pages=100, created_at=now))
+
+    assert download_queue.count_user("11") == 2
+    assert _drain(download_queue) == ["u1-1", "u2-1", "u1-2"]
+
+
+def test_group_weight_gives_proportional_share():
+    download_queue = FairDownloadQueue(weights={"1": 2})
+    now = time.time()
+    for index in range(6):
+        download_queue.put(_job(f"a{index}", group_id="1", pages=100, created_at=now))
+        download_queue.put(_job(f"b{index}", group_id="2", pages=100, created_at=now))
+
+    first_six = _drain(download_queue)[:6]
+    assert sum(manga_id.startswith("a") for manga_id in first_six) == 4
+
+
+def test_new_tenant_does_not_catch_up_on_time_before_it_joined():
+    download_queue = FairDownloadQueue()
+    now = time.time()
+    for index in range(6):
+        download_queue.put(_job(f"a{index}", group_id="1", pages=100, created_at=now))
+    assert [download_queue.get(timeout=0).manga_id for _ in range(3)] == ["a0", "a1", "a2"]
+
+    for index in range(3):
+        download_queue.put(_job(f"b{index}", group_id="2", pages=100, created_at=now))
+
+    assert _drain(download_queue)[:4] == ["b0", "a3", "b1", "a4"]
+
+
+def test_resumed_jobs_without_requester_use_the_system_tenant():
+    job = DownloadJob.without_subscribers("1")
+    assert FairDownloadQueue.tenant_of(job) == FairDownloadQueue.SYSTEM_TENANT
+    assert FairDownloadQueue.tenant_of(_job("2", group_id="5")) == "group:5"
+    assert FairDownloadQueue.tenant_of(_job("3", user_id="7")) == "private:7"
+
+
+def test_ordered_jobs_predicts_dequeue_order_without_removing():
+    download_queue = FairDownloadQueue()
+    now = time.time()
+    for manga_id, group_id in (("a1", "1"), ("a2", "1"), ("b1", "2")):
+        download_queue.put(_job(manga_id, group_id=group_id, pages=100, created_at=now))
+
+    predicted = [job.manga_id for job in download_queue.ordered_jobs()]
+    assert download_queue.qsize() == 3
+    assert predicted == _drain(download_queue)
+
+
+def test_get_times_out_on_empty_queue():
+    with pytest.raises(queue.Empty):
+        FairDownloadQueue().get(timeout=0)
+
+
+def test_each_user_gets_shortest_album_first():
+    download_queue = FairDownloadQueue()
+    now = time.time()
+    for manga_id, pages in (("long", 300), ("short", 50), ("medium", 120), ("unknown", None)):
+        download_queue.put(_job(manga_id, pages=pages, created_at=now))
+
+    assert _drain(download_queue) == ["short", "medium", "unknown", "long"]
+
+
+def test_waiting_time_ages_long_albums_ahead_of_new_short_ones():
+    download_queue = FairDownloadQueue(aging_pages_per_minute=50)
+    now = time.time()
+    download_queue.put(_job("old-long", pages=600, created_at=now - 10 * 60))
+    download_queue.put(_job("new-short", pages=150, created_at=now))
+
+    assert _drain(download_queue) == ["old-long", "new-short"]
+
+
+def test_prefetched_album_is_served_without_a_second_request():
+    class Album:
+        album_id = "123"
+
+    class Client:
+        requests = []
+        domain = "example.org"
+
+        def get_album_detail(self, album_id):
+            self.requests.append(album_id)
+            return f"fetched {album_id}"
+
+    album = Album()
+    client = _PrefetchedAlbumClient(Client(), album)
+
+    assert client.get_album_detail(123) is album
+    assert client.get_album_detail("456") == "fetched 456"
+    assert Client.requests == ["456"]
+    assert client.domain == "example.org"
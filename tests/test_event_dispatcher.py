@@ -0,0 +1,36 @@
+import threading
+
+from bot import EventDispatcher
+
+
+def test_same_conversation_runs_in_submission_order():
+    dispatcher = EventDispatcher("test", workers=4, queue_size=100, backpressure_seconds=1)
+    results = []
+    done = threading.Event()
+    for index in range(50):
+        assert dispatcher.submit("group:1", results.append, index)
+    assert dispatcher.submit("group:1", lambda: done.set())
+
+    assert done.wait(5)
+    assert results == list(range(50))
+    dispatcher.stop()
+
+
+def test_full_queue_drops_after_backpressure_timeout():
+    dispatcher = EventDispatcher("test", workers=1, queue_size=1, backpressure_seconds=0.05)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block() -> None:
+        started.set()
+        release.wait(5)
+
+    assert dispatcher.submit("private:1", block)
+    assert started.wait(5)
+    assert dispatcher.submit("private:1", lambda: None)
+    assert not dispatcher.submit("private:1", lambda: None)
+    assert (dispatcher.submitted, dispatcher.dropped, dispatcher.delayed) == (2, 1, 1)
+
+    release.set()
+    dispatcher.stop()
+    assert not dispatcher.submit("private:1", lambda: None)
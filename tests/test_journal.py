@@ -0,0 +1,59 @@
+from bot import DownloadJob, DownloadJournal
+
+
+def _journal(tmp_path):
+    return DownloadJournal(str(tmp_path / ".mangabot.db"))
+
+
+def test_pending_jobs_survive_reopen_with_subscribers_in_order(tmp_path):
+    journal = _journal(tmp_path)
+    job = DownloadJob("10", "123", "900", False)
+    journal.add_job(job)
+    journal.add_subscriber("123", "11", None, True)
+    journal.close()
+
+    pending = _journal(tmp_path).load_pending()
+
+    subscribers = [("10", "900", False), ("11", None, True)]
+    assert pending == [("123", DownloadJob.STAGE_QUEUED, job.created_at, 0, subscribers)]
+
+
+def test_only_started_jobs_count_as_resumed(tmp_path):
+    journal = _journal(tmp_path)
+    journal.add_job(DownloadJob("10", "1", None, True))
+    journal.add_job(DownloadJob("10", "2", None, True))
+    journal.update_stage("2", DownloadJob.STAGE_DOWNLOADING)
+
+    first = {row[0]: row[3] for row in journal.load_pending()}
+    second = {row[0]: row[3] for row in journal.load_pending()}
+
+    assert first == {"1": 0, "2": 1}
+    assert second == {"1": 0, "2": 2}
+
+
+def test_requeued_job_is_not_counted_again(tmp_path):
+    journal = _journal(tmp_path)
+    journal.add_job(DownloadJob("10", "1", None, True))
+    journal.update_stage("1", DownloadJob.STAGE_CONVERTING)
+    assert journal.load_pending()[0][3] == 1
+
+    journal.update_stage("1", DownloadJob.STAGE_QUEUED)
+    assert journal.load_pending()[0][3] == 1
+
+
+def test_finished_jobs_are_removed(tmp_path):
+    journal = _journal(tmp_path)
+    journal.add_job(DownloadJob("10", "1", None, True))
+    journal.remove_job("1")
+    assert journal.load_pending() == []
+
+
+def test_writes_after_close_are_ignored(tmp_path):
+    journal = _journal(tmp_path)
+    journal.close()
+    journal.add_job(DownloadJob("10", "1", None, True))
+    journal.update_stage("1", DownloadJob.STAGE_DOWNLOADING)
+    journal.remove_job("1")
+    journal.close()
+
+    assert _journal(tmp_path).load_pending() == []
@@ -0,0 +1,27 @@
+from bot import LibraryIndex, LibraryLayout
+
+
+def test_parse_manga_id_accepts_both_pdf_name_formats():
+    assert LibraryIndex.parse_manga_id("123-标题.pdf") == "123"
+    assert LibraryIndex.parse_manga_id("123.pdf") == "123"
+    assert LibraryIndex.parse_manga_id("abc-标题.pdf") is None
+    assert LibraryIndex.parse_manga_id("123-标题") is None
+
+
+def test_build_then_incremental_add_and_remove(tmp_path):
+    (tmp_path / "123-标题.pdf").write_bytes(b"%PDF")
+    (tmp_path / "123-标题").mkdir()
+    (tmp_path / "notes.txt").write_text("")
+    index = LibraryIndex(LibraryLayout(str(tmp_path)))
+
+    assert index.build() == 1
+    assert index.lookup("123") == [("123-标题.pdf", str(tmp_path / "123-标题.pdf"))]
+
+    new_pdf = str(tmp_path / "456.pdf")
+    index.add(new_pdf)
+    assert index.contains("456")
+    assert index.file_names() == ["123-标题.pdf", "456.pdf"]
+
+    index.remove(new_pdf)
+    assert not index.contains("456")
+    assert sorted(index.manga_ids()) == ["123"]
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from bot import LibraryIndex, LibraryLayout, _resolve_download_path
+
+
+def _make_flat_library(base):
+    (base / "300-标题.pdf").write_bytes(b"%PDF")
+    (base / "300-标题").mkdir()
+    (base / "300-标题" / "00001.jpg").write_bytes(b"jpg")
+    (base / "45.pdf").write_bytes(b"%PDF")
+    (base / ".mangabot.db").write_bytes(b"")
+
+
+def test_sharded_paths_use_id_mod_256():
+    layout = LibraryLayout("/library", "sharded")
+    assert layout.shard_dir("300") == os.path.join("/library", "044")
+    assert layout.pdf_path("45", "45-标题") == os.path.join("/library", "045", "45-标题.pdf")
+    assert LibraryLayout("/library").shard_dir("300") == "/library"
+
+
+def test_unknown_layout_is_rejected():
+    with pytest.raises(ValueError):
+        LibraryLayout("/library", "nested")
+
+
+def test_migrate_to_sharded_and_back(tmp_path):
+    _make_flat_library(tmp_path)
+    sharded = LibraryLayout(str(tmp_path), "sharded")
+    assert len(sharded.misplaced_items()) == 3
+
+    assert sharded.migrate() == (3, 0)
+    assert (tmp_path / "044" / "300-标题.pdf").exists()
+    assert (tmp_path / "044" / "300-标题" / "00001.jpg").exists()
+    assert (tmp_path / "045" / "45.pdf").exists()
+    assert (tmp_path / ".mangabot.db").exists()
+    assert sharded.misplaced_items() == []
+    index = LibraryIndex(sharded)
+    assert index.build() == 2
+
+    flat = LibraryLayout(str(tmp_path), "flat")
+    assert flat.migrate() == (3, 0)
+    assert sorted(os.listdir(tmp_path)) == [".mangabot.db", "300-标题", "300-标题.pdf", "45.pdf"]
+
+
+def test_migrate_skips_existing_targets(tmp_path):
+    _make_flat_library(tmp_path)
+    (tmp_path / "045").mkdir()
+    (tmp_path / "045" / "45.pdf").write_bytes(b"%PDF-existing")
+
+    assert LibraryLayout(str(tmp_path), "sharded").migrate() == (2, 1)
+    assert (tmp_path / "45.pdf").exists()
+    assert (tmp_path / "045" / "45.pdf").read_bytes() == b"%PDF-existing"
+
+
+def test_download_path_expands_home_directory(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("MANGA_DOWNLOAD_PATH", "~/manga")
+    assert _resolve_download_path() == str(tmp_path / "manga")
@@ -0,0 +1,113 @@
+import threading
+
+import pytest
+
+import bot
+from bot import ActionResult, OutboundScheduler, TokenBucket
+
+
+class FakeNapCat:
+    """按顺序返回预设结果的发送函数，记录每次发送的动作"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, action, params, timeout):
+        with self._lock:
+            self.calls.append((action, params))
+            return self.results.pop(0) if self.results else ActionResult(True)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bot, "_backoff_delay", lambda attempt, **kwargs: 0.0)
+
+
+def _scheduler(send_action, max_retries=3):
+    return OutboundScheduler(
+        send_action,
+        TokenBucket(0, 1),
+        target_rate=0,
+        target_burst=1,
+        coalesce_seconds=0,
+        max_retries=max_retries,
+        senders=1,
+    )
+
+
+def _send_text(scheduler, target, text):
+    return scheduler.submit(
+        target, "send_private_msg", {"user_id": "1", "message": text}, text=text
+    )
+
+
+def test_adjacent_texts_to_one_target_are_sent_as_one_message():
+    napcat = FakeNapCat()
+    scheduler = _scheduler(napcat)
+    futures = [_send_text(scheduler, "private:1", text) for text in ("一", "二", "三")]
+    other = _send_text(scheduler, "private:2", "四")
+    scheduler.set_connected(True)
+
+    assert all(future.result(5) for future in futures + [other])
+    messages = sorted(params["message"] for _, params in napcat.calls)
+    assert messages == ["一\n\n二\n\n三", "四"]
+    assert scheduler.coalesced == 2
+    scheduler.stop()
+
+
+@pytest.mark.parametrize("message", ["发送过于频繁", "rate limit exceeded", "WebSocket连接未建立"])
+def test_rate_limited_or_unsent_messages_are_retried(message):
+    napcat = FakeNapCat(ActionResult(False, message=message))
+    scheduler = _scheduler(napcat)
+    scheduler.set_connected(True)
+
+    assert _send_text(scheduler, "private:1", "你好").result(5)
+    assert len(napcat.calls) == 2
+    assert scheduler.retried == 1
+    scheduler.stop()
+
+
+def test_timed_out_message_is_not_retried():
+    napcat = FakeNapCat(ActionResult(False, message="等待NapCat响应超时"))
+    scheduler = _scheduler(napcat)
+    scheduler.set_connected(True)
+
+    result = _send_text(scheduler, "private:1", "你好").result(5)
+    assert not result
+    assert len(napcat.calls) == 1
+    scheduler.stop()
+
+
+def test_retries_stop_at_max_retries():
+    napcat = FakeNapCat(*[ActionResult(False, message="风控") for _ in range(5)])
+    scheduler = _scheduler(napcat, max_retries=2)
+    scheduler.set_connected(True)
+
+    assert not _send_text(scheduler, "private:1", "你好").result(5)
+    assert len(napcat.calls) == 3
+    scheduler.stop()
+
+
+def test_cancel_removes_queued_message_before_it_is_sent():
+    napcat = FakeNapCat()
+    scheduler = _scheduler(napcat)
+    future = scheduler.submit("group:1", "send_group_msg", {"group_id": "1"})
+
+    assert scheduler.cancel(future, "等待发送超时")
+    assert future.result(0).message == "等待发送超时"
+    assert scheduler.pending_count() == 0
+    assert not scheduler.cancel(future, "再次取消")
+
+    scheduler.set_connected(True)
+    assert _send_text(scheduler, "group:1", "之后的消息").result(5)
+    assert [action for action, _ in napcat.calls] == ["send_private_msg"]
+    scheduler.stop()
+
+
+def test_stop_fails_messages_still_queued():
+    scheduler = _scheduler(FakeNapCat())
+    future = _send_text(scheduler, "private:1", "你好")
+    scheduler.stop()
+    assert future.result(0).message == "发送队列已停止"
@@ -0,0 +1,106 @@
+import io
+import re
+
+import pytest
+from PIL import Image
+
+from bot import StreamingPdfWriter, _prepare_pdf_page, _read_jpeg_info
+
+
+def _jpeg_bytes(size=(40, 30), mode="RGB", **save_options) -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, size, "white" if mode == "RGB" else 255).save(
+        buffer, format="JPEG", **save_options
+    )
+    return buffer.getvalue()
+
+
+def _check_xref(pdf: bytes) -> int:
+    """校验交叉引用表中每个偏移量都指向对应的对象，返回对象数量"""
+    xref_offset = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", pdf).group(1))
+    assert pdf[xref_offset:].startswith(b"xref\n")
+    lines = pdf[xref_offset:].split(b"\n")
+    size = int(lines[1].split()[1])
+    for obj_id in range(1, size):
+        offset = int(lines[2 + obj_id].split()[0])
+        assert pdf[offset:].startswith(f"{obj_id} 0 obj\n".encode("ascii"))
+    return size
+
+
+def test_writes_valid_pdf_with_one_page_per_image(tmp_path):
+    pdf_path = tmp_path / "album.pdf"
+    with StreamingPdfWriter(str(pdf_path)) as writer:
+        writer.add_jpeg_page(_jpeg_bytes((40, 30)), 40, 30, "DeviceRGB")
+        writer.add_jpeg_page(_jpeg_bytes((20, 50)), 20, 50, "DeviceRGB")
+        assert writer.page_count == 2
+
+    pdf = pdf_path.read_bytes()
+    assert pdf.startswith(b"%PDF-1.4\n")
+    assert b"/Type /Pages /Kids [5 0 R 8 0 R] /Count 2" in pdf
+    assert b"/MediaBox [0 0 40 30]" in pdf
+    assert b"/MediaBox [0 0 20 50]" in pdf
+    # Catalog、Pages 与每页3个对象
+    assert _check_xref(pdf) == 3 + 2 * 3
+    assert not (tmp_path / "album.pdf.tmp").exists()
+
+
+def test_close_without_pages_raises_and_removes_temp_file(tmp_path):
+    pdf_path = tmp_path / "empty.pdf"
+    writer = StreamingPdfWriter(str(pdf_path))
+    with pytest.raises(ValueError):
+        writer.close()
+    assert not pdf_path.exists()
+    assert not (tmp_path / "empty.pdf.tmp").exists()
+
+
+def test_exception_inside_context_leaves_no_partial_pdf(tmp_path):
+    pdf_path = tmp_path / "broken.pdf"
+    with pytest.raises(RuntimeError):
+        with StreamingPdfWriter(str(pdf_path)) as writer:
+            writer.add_jpeg_page(_jpeg_bytes(), 40, 30, "DeviceRGB")
+            raise RuntimeError("页面处理失败")
+    assert not pdf_path.exists()
+    assert not (tmp_path / "broken.pdf.tmp").exists()
+
+
+def test_read_jpeg_info_accepts_baseline_progressive_and_grayscale():
+    assert _read_jpeg_info(_jpeg_bytes((40, 30))) == (40, 30, 3)
+    assert _read_jpeg_info(_jpeg_bytes((40, 30), progressive=True)) == (40, 30, 3)
+    assert _read_jpeg_info(_jpeg_bytes((16, 8), mode="L")) == (16, 8, 1)
+
+
+def test_read_jpeg_info_rejects_cmyk_and_non_jpeg_data():
+    assert _read_jpeg_info(_jpeg_bytes(mode="CMYK")) is None
+    assert _read_jpeg_info(b"\x89PNG\r\n\x1a\n") is None
+    assert _read_jpeg_info(b"\xff\xd8") is None
+
+
+def test_prepare_pdf_page_embeds_compatible_jpeg_unchanged(tmp_path):
+    jpeg_data = _jpeg_bytes((40, 30))
+    img_path = tmp_path / "001.jpg"
+    img_path.write_bytes(jpeg_data)
+
+    data, width, height, color_space, passthrough = _prepare_pdf_page(str(img_path), 90)
+
+    assert passthrough
+    assert data == jpeg_data
+    assert (width, height, color_space) == (40, 30, "DeviceRGB")
+
+
+def test_prepare_pdf_page_reencodes_png_cmyk_and_oversized_pages(tmp_path):
+    png_path = tmp_path / "001.png"
+    Image.new("RGBA", (40, 30)).save(png_path)
+    cmyk_path = tmp_path / "002.jpg"
+    cmyk_path.write_bytes(_jpeg_bytes(mode="CMYK"))
+    wide_path = tmp_path / "003.jpg"
+    wide_path.write_bytes(_jpeg_bytes((200, 100)))
+
+    for img_path in (png_path, cmyk_path):
+        data, _, _, color_space, passthrough = _prepare_pdf_page(str(img_path), 90)
+        assert not passthrough
+        assert color_space == "DeviceRGB"
+        assert _read_jpeg_info(data) is not None
+
+    _, width, height, _, passthrough = _prepare_pdf_page(str(wide_path), 90, max_width=50)
+    assert not passthrough
+    assert (width, height) == (50, 25)
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from bot import CommandRateLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_token_bucket_allows_burst_then_refills_at_rate(clock):
+    bucket = TokenBucket(rate=0.5, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.wait_time() == pytest.approx(2.0)
+
+    clock[0] += 2
+    assert bucket.try_acquire()
+    assert not bucket.is_full()
+    clock[0] += 100
+    assert bucket.is_full()
+
+
+def test_token_bucket_with_zero_rate_never_limits():
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert all(bucket.try_acquire() for _ in range(100))
+    assert bucket.wait_time() == 0
+
+
+def _limiter(user=(1 / 60, 2), group=(1 / 60, 3), global_limit=(0, 0)):
+    return CommandRateLimiter(user, group, global_limit)
+
+
+def test_user_is_throttled_after_burst_and_notified_once(clock):
+    limiter = _limiter()
+    assert limiter.check("1") is None
+    assert limiter.check("1") is None
+
+    scope, wait, notify = limiter.check("1")
+    assert (scope, notify) == (CommandRateLimiter.SCOPE_USER, True)
+    assert wait == pytest.approx(60)
+    assert limiter.check("1")[2] is False
+
+    clock[0] += 60
+    assert limiter.check("1") is None
+    clock[0] += 60
+    assert limiter.check("1") is None
+    # 放行过一次之后再被限流时重新提示
+    assert limiter.check("1")[2] is True
+
+
+def test_group_limit_is_shared_and_throttled_commands_cost_nothing(clock):
+    limiter = _limiter()
+    assert limiter.check("1", "900") is None
+    assert limiter.check("2", "900") is None
+    assert limiter.check("3", "900") is None
+    assert limiter.check("4", "900")[0] == CommandRateLimiter.SCOPE_GROUP
+    # 被群限流的命令没有消耗用户4的令牌，私聊仍可使用
+    assert limiter.check("4") is None
+    assert limiter.check("4") is None
+
+
+def test_summary_hides_who_was_throttled_and_details_lists_them(clock):
+    limiter = _limiter(user=(1 / 60, 1))
+    limiter.check("12345")
+    limiter.check("12345")
+    limiter.check("12345")
+
+    assert "12345" not in limiter.summary()
+    assert "限流 2 个" in limiter.summary()
+    assert limiter.details() == "用户12345×2"
+
+
+def test_throttle_statistics_stay_bounded(clock, monkeypatch):
+    monkeypatch.setattr(CommandRateLimiter, "MAX_THROTTLED_KEYS", 10)
+    limiter = _limiter(user=(1 / 60, 1))
+    for user_id in range(30):
+        limiter.check(str(user_id))
+        limiter.check(str(user_id))
+
+    assert len(limiter.throttled_keys) <= 10
+    assert limiter.throttled[CommandRateLimiter.SCOPE_USER] == 30
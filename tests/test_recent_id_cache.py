@@ -0,0 +1,31 @@
+import time
+
+from bot import RecentIdCache
+
+
+def test_repeated_ids_are_reported_as_duplicates():
+    cache = RecentIdCache(capacity=10, ttl_seconds=60)
+    assert not cache.check_and_add("1")
+    assert cache.check_and_add("1")
+    assert not cache.check_and_add("2")
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_oldest_ids_are_evicted_beyond_capacity():
+    cache = RecentIdCache(capacity=2, ttl_seconds=60)
+    for key in ("1", "2", "3"):
+        cache.check_and_add(key)
+    assert len(cache) == 2
+    assert not cache.check_and_add("1")
+
+
+def test_ids_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = RecentIdCache(capacity=10, ttl_seconds=60)
+    cache.check_and_add("1")
+
+    now[0] += 30
+    assert cache.check_and_add("1")
+    now[0] += 31
+    assert not cache.check_and_add("1")
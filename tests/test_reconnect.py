@@ -0,0 +1,25 @@
+import threading
+import time
+
+from bot import MangaBot, _backoff_delay
+
+
+def test_backoff_grows_exponentially_with_jitter_and_cap():
+    for attempt, expected in [(0, 1), (1, 2), (3, 8), (10, 30), (100, 30)]:
+        delay = _backoff_delay(attempt, base=1, maximum=30)
+        assert expected * 0.5 <= delay <= expected
+
+
+def _bot_with_connection(opened_at):
+    mangabot = MangaBot.__new__(MangaBot)
+    mangabot.config = {"RECONNECT_MAX_SECONDS": 30}
+    mangabot.connection_lock = threading.Lock()
+    mangabot.connection_opened_at = opened_at
+    return mangabot
+
+
+def test_backoff_resets_only_after_connection_stayed_open():
+    assert _bot_with_connection(time.monotonic() - 60)._connection_was_stable()
+    # 连接刚建立就断开，或从未建立成功，都继续退避
+    assert not _bot_with_connection(time.monotonic() - 1)._connection_was_stable()
+    assert not _bot_with_connection(None)._connection_was_stable()
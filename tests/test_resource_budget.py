@@ -0,0 +1,28 @@
+from bot import ResourceBudget
+
+
+def test_admits_jobs_until_memory_or_threads_run_out():
+    budget = ResourceBudget(memory_mb=256, threads=20)
+    assert budget.acquire("1", 128, 10, timeout=0)
+    assert budget.acquire("2", 128, 10, timeout=0)
+    assert not budget.acquire("3", 128, 10, timeout=0)
+    assert budget.usage() == (256, 20, 2)
+
+    budget.release("1")
+    assert budget.acquire("3", 128, 10, timeout=0)
+
+
+def test_release_threads_keeps_memory_reserved_until_conversion_finishes():
+    budget = ResourceBudget(memory_mb=256, threads=10)
+    assert budget.acquire("1", 128, 10, timeout=0)
+    budget.release_threads("1")
+    assert budget.usage() == (128, 0, 1)
+
+    assert budget.acquire("2", 128, 10, timeout=0)
+    assert not budget.acquire("3", 1, 0, timeout=0)
+
+
+def test_oversized_job_runs_alone_when_nothing_else_is_running():
+    budget = ResourceBudget(memory_mb=64, threads=2)
+    assert budget.acquire("1", 512, 10, timeout=0)
+    assert not budget.acquire("2", 1, 1, timeout=0)